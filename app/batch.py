@@ -0,0 +1,37 @@
+# app/batch.py
+"""
+Per-schema work for /generate-ideas/batch. Runs inside worker processes, so everything crossing the
+process boundary is plain data: raw column dicts in, JSON bytes out.
+"""
+import json
+from typing import Any, List
+from pydantic import TypeAdapter, ValidationError
+from .data_models import ColumnDefinition, SuggestionOptions
+from .suggestion_engine import generate_suggestions_json
+
+_COLUMN_LIST = TypeAdapter(List[ColumnDefinition])
+
+
+def batch_item_error(message: str) -> bytes:
+    """JSON object for a batch item that could not be processed."""
+    return json.dumps({"status": "error", "error": message}, separators=(",", ":")).encode("utf-8")
+
+
+def run_batch_item(raw_columns: Any, options: SuggestionOptions) -> bytes:
+    """
+    Validates one schema of a batch and generates its suggestions. Never raises: a bad schema yields
+    an error object, so it cannot fail the rest of the batch.
+    Returns {"status": "ok", "result": <suggestion output>} or {"status": "error", "error": "..."} as JSON bytes.
+    """
+    try:
+        columns = _COLUMN_LIST.validate_python(raw_columns)
+    except ValidationError as e:
+        first = e.errors()[0]
+        location = ".".join(str(part) for part in first["loc"]) or "columns"
+        return batch_item_error(f"Invalid column definitions ({e.error_count()} error(s)); {location}: {first['msg']}")
+    if not columns:
+        return batch_item_error("No columns provided.")
+    try:
+        return b'{"status":"ok","result":' + generate_suggestions_json(columns, options) + b"}"
+    except Exception as e:
+        return batch_item_error(f"Suggestion generation failed: {e}")
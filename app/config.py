@@ -0,0 +1,55 @@
+# app/config.py
+"""
+Deployment settings, read once from environment variables at import time.
+"""
+import os
+from typing import List
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_str(name: str, default: str) -> str:
+    return os.environ.get(name) or default
+
+
+def _env_list(name: str) -> List[str]:
+    return [item.strip() for item in os.environ.get(name, "").split(",") if item.strip()]
+
+
+# --- Suggestion executor ---
+# "thread" or "process". Suggestion generation always runs off the event loop.
+SUGGESTION_EXECUTOR_KIND = _env_str("IVIZ_SUGGESTION_EXECUTOR", "thread")
+SUGGESTION_EXECUTOR_WORKERS = _env_int("IVIZ_SUGGESTION_WORKERS", min(4, os.cpu_count() or 1))
+# Requests allowed to wait for a worker; beyond this, /generate-ideas/ answers 503.
+SUGGESTION_QUEUE_SIZE = _env_int("IVIZ_SUGGESTION_QUEUE_SIZE", 16)
+RETRY_AFTER_SECONDS = _env_int("IVIZ_RETRY_AFTER_SECONDS", 2)
+
+# --- Result cache ---
+# Serialized /generate-ideas/ responses keyed by request content. Set the size to 0 to disable.
+RESULT_CACHE_MAX_BYTES = _env_int("IVIZ_RESULT_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+RESULT_CACHE_TTL_SECONDS = _env_int("IVIZ_RESULT_CACHE_TTL_SECONDS", 300)
+
+# --- Schema store ---
+# Column lists of recent /generate-ideas/ requests, so /generate-ideas/delta can apply changes to them.
+SCHEMA_STORE_SIZE = _env_int("IVIZ_SCHEMA_STORE_SIZE", 1024)
+
+# --- Batch executor ---
+# /generate-ideas/batch fans schemas out over its own pool, separate from interactive requests.
+BATCH_EXECUTOR_KIND = _env_str("IVIZ_BATCH_EXECUTOR", "process")
+BATCH_WORKERS = _env_int("IVIZ_BATCH_WORKERS", os.cpu_count() or 1)
+# Batches allowed to wait for the pool; beyond this, /generate-ideas/batch answers 503.
+BATCH_QUEUE_SIZE = _env_int("IVIZ_BATCH_QUEUE_SIZE", 2)
+BATCH_MAX_SCHEMAS = _env_int("IVIZ_BATCH_MAX_SCHEMAS", 10000)
+
+# --- Upload executor ---
+# /upload-dataset/ parses files in its own small thread pool, so large uploads cannot starve suggestions.
+UPLOAD_WORKERS = _env_int("IVIZ_UPLOAD_WORKERS", 2)
+# Uploads allowed to wait for a worker; beyond this, /upload-dataset/ answers 503.
+UPLOAD_QUEUE_SIZE = _env_int("IVIZ_UPLOAD_QUEUE_SIZE", 4)
+
+# --- Rules ---
+# Comma-separated rule ids (see suggestion_engine.RULE_IDS) switched off for every request.
+DISABLED_RULES = _env_list("IVIZ_DISABLED_RULES")
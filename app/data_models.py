@@ -1,6 +1,6 @@
 # app/data_models.py
-from pydantic import BaseModel, Field
-from typing import List, Literal, Dict, Any, Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Literal, Dict, Any, Optional, Union
 
 # --- Input Model ---
 class ColumnDefinition(BaseModel):
@@ -19,6 +19,33 @@ class ColumnDefinition(BaseModel):
         "identifier", "rating", "key_performance_indicator", "segment"
     ]] = Field(None, description="The specific semantic meaning of the column (e.g., 'currency', 'identifier').")
 
+SuggestionCategory = Literal["chart", "feature_engineering", "metric_card"]
+FormulaTool = Literal["Excel", "SQL", "Pandas_Python"]
+
+class SuggestionOptions(BaseModel):
+    """
+    Request-level options controlling which suggestions the engine builds. Work for anything not
+    requested is skipped entirely rather than filtered out afterwards.
+    """
+    categories: List[SuggestionCategory] = Field(
+        default_factory=lambda: ["chart", "feature_engineering", "metric_card"],
+        description="Suggestion categories to generate."
+    )
+    formula_tools: List[FormulaTool] = Field(
+        default_factory=lambda: ["Excel", "SQL", "Pandas_Python"],
+        description="Tools to generate formulas for."
+    )
+    include_wireframes: bool = Field(True, description="Whether to generate wireframes for charts and metric cards.")
+    wireframe_format: Literal["inline", "reference"] = Field(
+        "inline", description="'inline' embeds full SVGs; 'reference' uses a shared template table (CompactSuggestionOutput)."
+    )
+    scatter_pair_budget: Optional[int] = Field(
+        None, ge=0, description="Maximum number of Scatter Plot suggestions, keeping the most relevant column pairs."
+    )
+    disabled_rules: List[str] = Field(
+        default_factory=list, description="Ids of rules to skip (see suggestion_engine.RULE_IDS)."
+    )
+
 # --- Output Models ---
 
 class ChartWireframe(BaseModel):
@@ -30,22 +57,47 @@ class ChartWireframe(BaseModel):
 class FormulaSuggestion(BaseModel):
     """
     Provides a formula for a specific tool (e.g., Excel, SQL, Pandas).
+    Frozen so that identical formulas can be shared between suggestions.
     """
-    tool: Literal["Excel", "SQL", "Pandas_Python"] = Field(..., description="The tool for which the formula is provided.")
+    model_config = ConfigDict(frozen=True)
+
+    tool: FormulaTool = Field(..., description="The tool for which the formula is provided.")
     formula_string: str = Field(..., description="The actual formula string for the tool.")
     example_data_context: Optional[str] = Field(
         None, description="Contextual example of data (e.g., 'A2, B2' for Excel) or usage instructions."
     )
 
-class ChartSuggestion(BaseModel):
+class WireframeReference(BaseModel):
     """
-    Represents a suggested chart visualization.
+    Points at a shared wireframe template instead of carrying the full SVG.
+    """
+    template_id: str = Field(..., description="Key of the SVG template in the response's 'wireframes' table.")
+    title: str = Field(..., description="Title to substitute for the '{title}' placeholder in the template.")
+
+class ChartSuggestionBase(BaseModel):
+    """
+    Fields shared by both chart suggestion shapes.
     """
     title: str = Field(..., description="A suggested title for the chart.")
     chart_type: str = Field(..., description="The type of chart (e.g., 'Bar Chart', 'Line Chart', 'Scatter Plot').")
     columns_used: List[str] = Field(..., description="List of original columns used to create this chart.")
     how_to: str = Field(..., description="Instructions on how to create this chart using the specified columns.")
-    wireframe: ChartWireframe = Field(..., description="SVG data for the wireframe of this chart.")
+
+class ChartSuggestion(ChartSuggestionBase):
+    """
+    Represents a suggested chart visualization.
+    """
+    wireframe: Optional[ChartWireframe] = Field(
+        None, description="SVG data for the wireframe of this chart (omitted when wireframes are not requested)."
+    )
+
+class CompactChartSuggestion(ChartSuggestionBase):
+    """
+    A chart suggestion whose wireframe references a shared template.
+    """
+    wireframe: Optional[WireframeReference] = Field(
+        None, description="Reference to the wireframe template of this chart (omitted when wireframes are not requested)."
+    )
 
 
 class FeatureEngineeringSuggestion(BaseModel):
@@ -62,9 +114,9 @@ class FeatureEngineeringSuggestion(BaseModel):
         ..., description="Formulas to create this new feature in various tools."
     )
 
-class MetricCardSuggestion(BaseModel):
+class MetricCardSuggestionBase(BaseModel):
     """
-    Represents a suggested key performance indicator (KPI) or metric.
+    Fields shared by both metric card suggestion shapes.
     """
     title: str = Field(..., description="Title for the metric card (e.g., 'Total Sales', 'Avg. Order Value').")
     metric_name: str = Field(..., description="The name of the metric to display (e.g., 'Total Revenue', 'Average Order Value').")
@@ -76,8 +128,19 @@ class MetricCardSuggestion(BaseModel):
     context: Optional[str] = Field(
         None, description="Context or interpretation for the metric (e.g., 'Displays overall sales performance')."
     )
+
+class MetricCardSuggestion(MetricCardSuggestionBase):
+    """
+    Represents a suggested key performance indicator (KPI) or metric.
+    """
     wireframe: Optional[ChartWireframe] = Field(None, description="Optional SVG wireframe for the metric card.")
 
+class CompactMetricCardSuggestion(MetricCardSuggestionBase):
+    """
+    A metric card suggestion whose wireframe references a shared template.
+    """
+    wireframe: Optional[WireframeReference] = Field(None, description="Optional reference to the metric card's wireframe template.")
+
 class SuggestionOutput(BaseModel):
     """
     The complete output structure containing all types of suggestions.
@@ -88,4 +151,97 @@ class SuggestionOutput(BaseModel):
     )
     metric_card_suggestions: List[MetricCardSuggestion] = Field(
         ..., description="List of suggested metric card ideas."
-    )
\ No newline at end of file
+    )
+
+class CompactSuggestionOutput(BaseModel):
+    """
+    Suggestion output where wireframes are shared templates instead of inlined SVGs.
+    Render a suggestion's wireframe with wireframes[template_id].replace('{title}', title).
+    """
+    wireframes: Dict[str, str] = Field(
+        ..., description="SVG wireframe templates used by the suggestions, keyed by template id."
+    )
+    chart_suggestions: List[CompactChartSuggestion] = Field(..., description="List of suggested chart ideas.")
+    feature_engineering_suggestions: List[FeatureEngineeringSuggestion] = Field(
+        ..., description="List of suggested feature engineering ideas."
+    )
+    metric_card_suggestions: List[CompactMetricCardSuggestion] = Field(
+        ..., description="List of suggested metric card ideas."
+    )
+
+# --- Incremental Update Models ---
+class ColumnDelta(BaseModel):
+    """
+    Changes to a schema previously sent to /generate-ideas/, identified by its X-Schema-Id.
+    Columns are matched by name: `modified` replaces a column in place, `added` columns are appended.
+    """
+    schema_id: str = Field(..., description="X-Schema-Id returned for the previous column list.")
+    added: List[ColumnDefinition] = Field(default_factory=list, description="New columns, appended at the end.")
+    removed: List[str] = Field(default_factory=list, description="Names of columns to drop.")
+    modified: List[ColumnDefinition] = Field(default_factory=list, description="Replacement definitions for existing columns.")
+
+class SuggestionDeltaOutput(BaseModel):
+    """
+    Suggestions affected by a ColumnDelta. Drop every previous suggestion whose columns include one of
+    `invalidated_columns`, then append `suggestions`.
+    """
+    schema_id: str = Field(..., description="Schema id of the updated column list, for the next delta.")
+    invalidated_columns: List[str] = Field(..., description="Columns whose previous suggestions are no longer valid.")
+    suggestions: Union[SuggestionOutput, CompactSuggestionOutput] = Field(
+        ..., description="New suggestions involving the changed columns."
+    )
+
+# --- Batch Models ---
+class BatchSuggestionRequest(BaseModel):
+    """
+    Many named column lists for /generate-ideas/batch. Each list is validated on its own, so one
+    malformed schema only fails its own entry.
+    """
+    schemas: Dict[str, Any] = Field(
+        ..., description="Column definition lists keyed by a caller-chosen name (e.g. the table name)."
+    )
+
+class BatchItemResult(BaseModel):
+    """
+    Outcome for one schema of a batch.
+    """
+    status: Literal["ok", "error"]
+    result: Optional[Union[SuggestionOutput, CompactSuggestionOutput]] = Field(
+        None, description="The suggestions, when status is 'ok'."
+    )
+    error: Optional[str] = Field(None, description="Why the schema failed, when status is 'error'.")
+
+class BatchSuggestionOutput(BaseModel):
+    """
+    Results of /generate-ideas/batch keyed by schema name, in request order.
+    """
+    results: Dict[str, BatchItemResult]
+
+# --- Dataset Profile Models ---
+class TopValue(BaseModel):
+    """
+    A frequent value of a column and its (estimated) number of occurrences.
+    """
+    value: str
+    count: int = Field(..., description="Occurrences; an upper bound, exact for clearly dominant values.")
+
+class ColumnProfile(BaseModel):
+    """
+    Statistics of one uploaded column over the whole file, computed in a single streaming pass.
+    """
+    name: str
+    row_count: int = Field(..., description="Number of data rows.")
+    null_count: int = Field(..., description="Empty cells and null markers such as 'NA' or 'null'.")
+    distinct_count: int = Field(..., description="Approximate number of distinct non-null values (HyperLogLog).")
+    min: Optional[float] = Field(None, description="Smallest finite value, for numerical columns.")
+    max: Optional[float] = Field(None, description="Largest value, for numerical columns.")
+    mean: Optional[float] = Field(None, description="Mean, for numerical columns.")
+    variance: Optional[float] = Field(None, description="Sample variance, for numerical columns.")
+    top_values: List[TopValue] = Field(default_factory=list, description="Most frequent values (Space-Saving).")
+
+class DatasetProfileOutput(BaseModel):
+    """
+    Response of /upload-dataset/?profile=true: the inferred columns and a profile for each, in the same order.
+    """
+    columns: List[ColumnDefinition]
+    profiles: List[ColumnProfile]
@@ -1,48 +1,173 @@
 import csv
+import re
+import openpyxl
 import pandas as pd
-from io import StringIO, BytesIO
-from typing import List, Dict, Any, IO
+from io import TextIOWrapper
+from itertools import chain, islice
+from typing import List, Dict, Any, IO, Iterator, Tuple
 from app.data_models import ColumnDefinition # Assuming ColumnDefinition is accessible
 
-# Helper to infer basic data type - very rudimentary for now
-def _infer_data_type(header: str) -> str:
+# --- TYPE INFERENCE ---
+# Cell values that mean "no value" in exported files.
+_NULL_TOKENS = ["", "na", "n/a", "nan", "null", "none", "-"]
+# A column is boolean when its sample holds exactly one of these true/false pairs.
+_BOOLEAN_PAIRS = [{"true", "false"}, {"yes", "no"}, {"y", "n"}, {"t", "f"}, {"1", "0"}]
+_ID_TOKENS = {"id", "code", "identifier", "uuid"}
+# Currency symbols, thousands separators, percent signs and spaces that may decorate numbers.
+_NUMBER_DECORATION = re.compile(r"[$€£¥%,\s]")
+# Above this share of distinct values (or these lengths), strings are free text rather than categories.
+_CATEGORICAL_MAX_DISTINCT_RATIO = 0.5
+_TEXT_MIN_MEAN_LENGTH = 40
+_TEXT_MIN_MEAN_WORDS = 4
+# Samples this small cannot show repetition; short values are taken as categories.
+_SMALL_SAMPLE = 10
+
+
+def _float_or_nan(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return float("nan")
+
+
+def _parse_numbers(text: "pd.Series") -> "pd.Series":
     """
-    Rudimentary data type inference based on header name.
-    Can be significantly improved by analyzing actual data.
+    Parses stripped cell strings as numbers, ignoring currency and thousands decoration; unparseable
+    values give NaN. Literals pandas rejects but Python reads, such as the overflowing 1e309, give inf.
     """
-    header_lower = header.lower()
-    if "id" in header_lower or "code" in header_lower or "identifier" in header_lower:
-        return "categorical" # Or numerical if it looks like a number, but safer as categorical from just header
-    if "date" in header_lower or "time" in header_lower:
+    cleaned = text.str.replace(_NUMBER_DECORATION, "", regex=True)
+    numbers = pd.to_numeric(cleaned, errors="coerce").astype("float64")
+    failed = numbers.isna()
+    if failed.any():
+        numbers[failed] = cleaned[failed].map(_float_or_nan)
+    return numbers
+
+
+def _header_tokens(header: str) -> List[str]:
+    # "CustomerID", "customer_id" and "customer id" all give ["customer", "id"]
+    return re.findall(r"[a-z0-9]+", re.sub(r"([a-z])([A-Z])", r"\1 \2", header).lower())
+
+
+def _is_flag_header(tokens: List[str]) -> bool:
+    # is_active, has_discount, promo_flag
+    return bool(tokens) and (tokens[0] in ("is", "has") or tokens[-1] == "flag")
+
+
+def _infer_type_from_header(header: str) -> str:
+    """Fallback for columns without sampled values: a guess from the header name alone."""
+    tokens = _header_tokens(header)
+    if _ID_TOKENS.intersection(tokens):
+        return "categorical"
+    if "date" in tokens or "time" in tokens:
         return "date"
-    # Add more heuristics if needed, e.g., for typical numerical names like 'amount', 'value', 'quantity'
-    # For now, default to text if not obviously something else
     return "text"
 
 
-async def parse_csv_to_column_definitions(file_io: IO[bytes], filename: str) -> List[ColumnDefinition]:
+def _infer_data_type(header: str, values: "pd.Series") -> str:
     """
-    Parses a CSV file stream and returns a list of ColumnDefinition objects.
+    Infers a column's data type from its sampled values with vectorized checks, cheapest first:
+    boolean, numerical, date, then categorical vs. text. Each check returns as soon as the type is
+    settled, so later (costlier) parses only run on columns the earlier ones did not claim.
     """
-    definitions = []
+    values = values.dropna()
+    text = values.astype(str).str.strip()
+    present = ~text.str.lower().isin(_NULL_TOKENS)
+    values, text = values[present], text[present]
+    if text.empty:
+        return _infer_type_from_header(header)
+    tokens = _header_tokens(header)
+    is_identifier = bool(_ID_TOKENS.intersection(tokens))
+
+    # Both halves of one true/false pair; a single repeated value (e.g. all "1") or only 0s and 1s
+    # among other digits is not enough, unless the header names a flag
+    distinct = set(text.str.lower().unique())
+    if not is_identifier and (
+        distinct in _BOOLEAN_PAIRS
+        or (_is_flag_header(tokens) and any(distinct <= pair for pair in _BOOLEAN_PAIRS))
+    ):
+        return "boolean"
+
+    # Native numbers (from Excel) and numeric strings, ignoring currency and thousands decoration
+    if _parse_numbers(text).notna().all():
+        return "categorical" if is_identifier else "numerical" # Order numbers are labels, not quantities
+
+    if pd.to_datetime(text, errors="coerce", format="mixed").notna().all():
+        return "date"
+
+    if is_identifier:
+        return "categorical"
+    if text.str.len().mean() >= _TEXT_MIN_MEAN_LENGTH or text.str.split().str.len().mean() >= _TEXT_MIN_MEAN_WORDS:
+        return "text"
+    if len(text) < _SMALL_SAMPLE or text.nunique() <= _CATEGORICAL_MAX_DISTINCT_RATIO * len(text):
+        return "categorical"
+    return "text"
+
+
+def _sample_frame(headers: List[Any], rows: List[List[Any]]) -> pd.DataFrame:
+    """The sampled rows as a frame with one column per header position (missing cells are NaN)."""
+    return pd.DataFrame(rows, dtype=object).reindex(columns=range(len(headers)))
+
+
+# Rows read after the header to sample the column values; the rest of the file is never read.
+SAMPLE_ROWS = 100
+# Longest first line (in characters) used to sniff the CSV dialect.
+_MAX_HEADER_LINE = 1024 * 1024
+# Delimiters the sniffer may pick; unrestricted, it happily splits a single-column header on a letter.
+_DELIMITERS = ",;\t|"
+
+
+def _csv_reader(text: IO[str]) -> Iterator[List[str]]:
+    """A csv.reader over `text` with the dialect sniffed from its first line."""
+    first_line = text.readline(_MAX_HEADER_LINE)
+    if len(first_line) == _MAX_HEADER_LINE and not first_line.endswith(('\n', '\r')):
+        raise ValueError(f"Header line is longer than {_MAX_HEADER_LINE} characters.")
     try:
-        # Read the file content as string
-        content = (await file_io.read()).decode('utf-8-sig') # Use utf-8-sig to handle BOM
-        sniffer = csv.Sniffer()
-        dialect = sniffer.sniff(content.splitlines()[0]) # Sniff first line for dialect
+        dialect = csv.Sniffer().sniff(first_line, delimiters=_DELIMITERS) # Sniff first line for dialect
+    except csv.Error:
+        dialect = csv.excel # e.g. a single column or an empty file, where there is no delimiter to find
+
+    # The reader continues from the sniffed line, so quoted headers spanning lines still parse
+    return csv.reader(chain([first_line], text), dialect=dialect)
+
 
-        # Use csv.reader with sniffed dialect
-        reader = csv.reader(StringIO(content), dialect=dialect)
-        headers = next(reader, None)
+def _read_csv_head(file_io: IO[bytes], sample_rows: int = SAMPLE_ROWS) -> Tuple[List[str], List[List[str]]]:
+    """
+    Reads the header row and up to `sample_rows` non-empty rows from a binary CSV stream. The stream is
+    decoded incrementally in small buffered chunks, so memory use does not depend on the file size.
+    """
+    text = TextIOWrapper(file_io, encoding='utf-8-sig', newline='') # utf-8-sig handles the BOM
+    try:
+        reader = _csv_reader(text)
+        headers = next(reader, [])
+        rows = []
+        for row in reader:
+            if len(rows) == sample_rows:
+                break
+            if row:
+                rows.append(row)
+        return headers, rows
+    finally:
+        text.detach() # Leave the upload's file open for the caller
+
+
+def parse_csv_to_column_definitions(file_io: IO[bytes], filename: str) -> List[ColumnDefinition]:
+    """
+    Parses the header of a CSV file stream and returns a list of ColumnDefinition objects.
+    Only the header and a bounded sample of rows are read, never the whole upload.
+    """
+    definitions = []
+    try:
+        headers, rows = _read_csv_head(file_io)
 
         if headers:
-            for header in headers:
+            sample = _sample_frame(headers, rows)
+            for index, header in enumerate(headers):
                 header = header.strip()
                 if header: # Ensure header is not empty
                     definitions.append(
                         ColumnDefinition(
                             name=header,
-                            data_type=_infer_data_type(header), # Rudimentary type inference
+                            data_type=_infer_data_type(header, sample[index]),
                             description=f"Column '{header}' from uploaded CSV '{filename}'."
                             # semantic_type can be inferred later or left None
                         )
@@ -58,26 +183,57 @@ async def parse_csv_to_column_definitions(file_io: IO[bytes], filename: str) ->
     return definitions
 
 
-async def parse_excel_to_column_definitions(file_io: IO[bytes], filename: str) -> List[ColumnDefinition]:
+# .xlsx files are zip archives; anything else (legacy .xls) goes through pandas.
+_ZIP_MAGIC = b"PK\x03\x04"
+
+
+def _is_xlsx(file_io: IO[bytes]) -> bool:
+    magic = file_io.read(len(_ZIP_MAGIC))
+    file_io.seek(0)
+    return magic == _ZIP_MAGIC
+
+
+def _read_excel_head(file_io: IO[bytes], sample_rows: int = SAMPLE_ROWS) -> Tuple[List[Any], List[List[Any]]]:
+    """
+    Reads the header row and up to `sample_rows` non-empty rows of the first sheet, with cell values
+    as read (numbers, datetimes, strings, None). .xlsx workbooks are opened in openpyxl's read-only
+    mode directly on the upload's file, which streams the sheet XML and stops after the sample.
+    """
+    if not _is_xlsx(file_io):
+        # Legacy .xls: pandas (via xlrd) parses the whole workbook, but only the sample is kept
+        df = pd.read_excel(file_io, sheet_name=0, header=None, nrows=sample_rows + 1)
+        values = df.astype(object).where(df.notna(), None).values.tolist()
+        rows = [row for row in values[1:] if any(value is not None for value in row)]
+        return (values[0], rows) if values else ([], [])
+
+    workbook = openpyxl.load_workbook(file_io, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        row_iter = sheet.iter_rows(values_only=True)
+        headers = list(next(row_iter, ()))
+        non_empty = (list(row) for row in row_iter if any(value is not None for value in row))
+        return headers, list(islice(non_empty, sample_rows))
+    finally:
+        workbook.close() # Read-only workbooks keep the archive open until closed
+
+
+def parse_excel_to_column_definitions(file_io: IO[bytes], filename: str) -> List[ColumnDefinition]:
     """
-    Parses an Excel file stream (first sheet) and returns a list of ColumnDefinition objects.
+    Parses the header of an Excel file stream (first sheet) and returns a list of ColumnDefinition objects.
+    Only the header and a bounded sample of rows are read.
     """
     definitions = []
     try:
-        # Pandas read_excel can take a file-like object (BytesIO for bytes)
-        # We need to ensure the file pointer is at the beginning if it was read before.
-        # However, UploadFile.file is typically a SpooledTemporaryFile, which should be fine.
-        xls_content = await file_io.read()
-        df = pd.read_excel(BytesIO(xls_content), sheet_name=0, nrows=1) # Read only header row for efficiency
-
-        if not df.empty:
-            for header in df.columns:
+        headers, rows = _read_excel_head(file_io)
+        sample = _sample_frame(headers, rows)
+        for index, header in enumerate(headers):
+            if header is not None:
                 header_str = str(header).strip() # Ensure header is string and stripped
                 if header_str:
                     definitions.append(
                         ColumnDefinition(
                             name=header_str,
-                            data_type=_infer_data_type(header_str), # Rudimentary type inference
+                            data_type=_infer_data_type(header_str, sample[index]),
                             description=f"Column '{header_str}' from uploaded Excel file '{filename}' (first sheet)."
                         )
                     )
@@ -87,15 +243,16 @@ async def parse_excel_to_column_definitions(file_io: IO[bytes], filename: str) -
     return definitions
 
 
-async def parse_file_to_column_definitions(file_io: IO[bytes], filename: str, content_type: str) -> List[ColumnDefinition]:
+def parse_file_to_column_definitions(file_io: IO[bytes], filename: str, content_type: str) -> List[ColumnDefinition]:
     """
-    Detects file type and calls the appropriate parser.
+    Detects file type and calls the appropriate parser. Parsing reads the file synchronously,
+    so callers on the event loop run this in a worker (see main.upload_executor).
     """
     logger.info(f"Attempting to parse file: {filename}, content type: {content_type}")
     if "csv" in content_type:
-        return await parse_csv_to_column_definitions(file_io, filename)
+        return parse_csv_to_column_definitions(file_io, filename)
     elif "excel" in content_type or "spreadsheetml" in content_type or "ms-excel" in content_type:
-        return await parse_excel_to_column_definitions(file_io, filename)
+        return parse_excel_to_column_definitions(file_io, filename)
     else:
         logger.error(f"Unsupported file type: {content_type} for file {filename}")
         raise ValueError(f"Unsupported file type: {content_type}. Please upload CSV or Excel.")
@@ -0,0 +1,142 @@
+# app/executor.py
+import asyncio
+from concurrent.futures import BrokenExecutor, Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+class ExecutorSaturatedError(Exception):
+    """Raised when every worker is busy and the wait queue is full."""
+
+
+class BoundedExecutor:
+    """
+    Runs blocking, CPU-bound calls in a thread or process pool without blocking the event loop.
+
+    At most `max_workers + max_queue` calls are accepted at once; further calls fail fast with
+    ExecutorSaturatedError instead of piling up. The pool itself is created on first use.
+    Streams (see stream()) count towards the same limit.
+    """
+
+    def __init__(self, kind: str = "thread", max_workers: int = 4, max_queue: int = 16):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}. Use 'thread' or 'process'.")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool: Optional[Executor] = None
+        self._stream_pool: Optional[ThreadPoolExecutor] = None
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            pool_class = ProcessPoolExecutor if self.kind == "process" else ThreadPoolExecutor
+            self._pool = pool_class(max_workers=self.max_workers)
+        return self._pool
+
+    def _get_stream_pool(self) -> Executor:
+        # Generators cannot be sent to worker processes, so streams always advance in threads.
+        if self.kind == "thread":
+            return self._get_pool()
+        if self._stream_pool is None:
+            self._stream_pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._stream_pool
+
+    def _reserve(self) -> None:
+        if self._in_flight >= self.max_workers + self.max_queue:
+            raise ExecutorSaturatedError(
+                f"{self._in_flight} calls in flight (workers={self.max_workers}, queue={self.max_queue})."
+            )
+        self._in_flight += 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Runs fn(*args) in the pool. Must be awaited from the event loop thread."""
+        self._reserve()
+        try:
+            loop = asyncio.get_running_loop()
+            pool = self._get_pool()
+            try:
+                return await loop.run_in_executor(pool, fn, *args)
+            except BrokenExecutor:
+                if self._pool is pool:
+                    self._discard_pool() # A worker process died; later calls get a fresh pool
+                raise
+        finally:
+            self._in_flight -= 1
+
+    async def stream(self, chunks: Iterator[bytes], max_batch: int = 256) -> AsyncIterator[bytes]:
+        """
+        Advances the blocking iterator `chunks` in a worker thread and yields its items joined into
+        batches. The first batch holds a single item so it arrives as early as possible; later batches
+        double up to `max_batch` items, keeping thread hand-offs rare without buffering the whole output.
+        Raises ExecutorSaturatedError on the first iteration when the executor is full.
+        """
+        self._reserve()
+        try:
+            loop = asyncio.get_running_loop()
+            pool = self._get_stream_pool()
+            batch_size = 1
+            while True:
+                batch = await loop.run_in_executor(pool, _next_batch, chunks, batch_size)
+                if not batch:
+                    return
+                yield b"".join(batch)
+                batch_size = min(batch_size * 2, max_batch)
+        finally:
+            self._in_flight -= 1
+
+    async def map_unordered(self, fn: Callable[..., Any], items: Sequence[Tuple]) -> AsyncIterator[Tuple[int, Any]]:
+        """
+        Runs fn(*args) for every args tuple in `items` and yields (index, result) as calls finish; a call
+        that raises yields (index, exception) instead, so one failure does not stop the others.
+        The whole map takes a single in-flight slot and keeps at most 2 * max_workers calls submitted,
+        so large batches neither crowd out other requests nor queue every item up front.
+        """
+        self._reserve()
+        pending: Dict[asyncio.Future, int] = {}
+        try:
+            loop = asyncio.get_running_loop()
+            window = 2 * self.max_workers
+            next_index = 0
+            while pending or next_index < len(items):
+                while next_index < len(items) and len(pending) < window:
+                    pending[loop.run_in_executor(self._get_pool(), fn, *items[next_index])] = next_index
+                    next_index += 1
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    index = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = e
+                        if isinstance(e, BrokenExecutor):
+                            self._discard_pool() # A worker process died; start a fresh pool for the rest
+                    yield index, result
+        finally:
+            for future in pending:
+                future.cancel()
+            self._in_flight -= 1
+
+    def _discard_pool(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def shutdown(self) -> None:
+        for pool in (self._pool, self._stream_pool):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+        self._stream_pool = None
+
+
+def _next_batch(chunks: Iterator[bytes], size: int) -> List[bytes]:
+    batch = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) == size:
+            break
+    return batch
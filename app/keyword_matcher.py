@@ -0,0 +1,36 @@
+# app/keyword_matcher.py
+from typing import Mapping, List, Tuple
+
+
+class KeywordMatcher:
+    """
+    Matches a fixed keyword vocabulary against text and returns the matched keyword classes as a bitmask.
+
+    The vocabulary is compiled once: keywords are ordered shortest first, and a keyword that contains
+    another vocabulary keyword (e.g. 'total value' contains 'value') is only searched for when the
+    contained keyword already matched. Scanning stops as soon as every class has been seen.
+    """
+
+    def __init__(self, keywords: Mapping[str, int]):
+        ordered = sorted((keyword.lower() for keyword in keywords), key=len)
+        classes = {keyword.lower(): bit for keyword, bit in keywords.items()}
+        self._steps: List[Tuple[str, int, int]] = []
+        self._all_classes = 0
+        for keyword in ordered:
+            required = 0
+            for other in ordered:
+                if other != keyword and other in keyword:
+                    required |= classes[other]
+            self._steps.append((keyword, classes[keyword], required))
+            self._all_classes |= classes[keyword]
+
+    def match(self, text: str) -> int:
+        """Returns the bitmask of every keyword class found in `text` (case-insensitive)."""
+        text = text.lower()
+        mask = 0
+        for keyword, bit, required in self._steps:
+            if mask & required == required and keyword in text:
+                mask |= bit
+                if mask == self._all_classes:
+                    break
+        return mask
@@ -0,0 +1,125 @@
+# app/result_cache.py
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from .data_models import ColumnDefinition, SuggestionOptions
+
+
+def schema_fingerprint(columns: List[ColumnDefinition], options: Optional[SuggestionOptions] = None) -> str:
+    """
+    Content address of a /generate-ideas/ request: SHA-256 over a canonical JSON encoding of the
+    parsed columns (and options), so client-side key order, JSON whitespace and omitted-vs-null
+    optional fields do not change the key. Column order is kept because the suggestions depend on it.
+    """
+    payload = {
+        "columns": [column.model_dump(mode="json") for column in columns],
+        "options": options.model_dump(mode="json") if options is not None else None,
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    In-process LRU cache of serialized responses with a per-entry TTL and a total size bound in bytes.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if self._clock() >= expires_at:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return # Larger than the whole cache; never worth evicting everything for it
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, self._clock() + self.ttl_seconds)
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        value, _ = self._entries.pop(key)
+        self._size -= len(value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class SchemaStore:
+    """
+    Bounded LRU of recently seen schemas (column list plus options) keyed by schema_fingerprint,
+    the base that /generate-ideas/delta requests apply their changes to.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[List[ColumnDefinition], SuggestionOptions]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, schema_id: str) -> Optional[Tuple[List[ColumnDefinition], SuggestionOptions]]:
+        with self._lock:
+            entry = self._entries.get(schema_id)
+            if entry is not None:
+                self._entries.move_to_end(schema_id)
+            return entry
+
+    def put(self, schema_id: str, columns: List[ColumnDefinition], options: SuggestionOptions) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[schema_id] = (list(columns), options)
+            self._entries.move_to_end(schema_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
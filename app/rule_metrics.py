@@ -0,0 +1,47 @@
+# app/rule_metrics.py
+import threading
+from typing import Any, Dict, List
+
+
+class RuleMetrics:
+    """
+    In-process totals of the per-rule statistics reported by the suggestion engine
+    (see suggestion_engine._run_rules), keyed by rule id.
+    """
+
+    def __init__(self):
+        self._totals: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, rule_stats: List[Dict[str, Any]]) -> None:
+        """Adds the statistics of one generate run."""
+        with self._lock:
+            for stat in rule_stats:
+                totals = self._totals.get(stat["rule_id"])
+                if totals is None:
+                    totals = self._totals[stat["rule_id"]] = {
+                        "category": stat["category"],
+                        "runs": 0,
+                        "total_ms": 0.0,
+                        "max_ms": 0.0,
+                        "candidates": 0,
+                        "emitted": 0,
+                    }
+                totals["runs"] += 1
+                totals["total_ms"] += stat["ms"]
+                totals["max_ms"] = max(totals["max_ms"], stat["ms"])
+                totals["candidates"] += stat["candidates"]
+                totals["emitted"] += stat["emitted"]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Totals per rule, slowest rule (by total time) first."""
+        with self._lock:
+            ordered = sorted(self._totals.items(), key=lambda item: item[1]["total_ms"], reverse=True)
+            return {
+                rule_id: {**totals, "total_ms": round(totals["total_ms"], 3)}
+                for rule_id, totals in ordered
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._totals.clear()
@@ -1,15 +1,28 @@
 # app/suggestion_engine.py
-from typing import List, Dict, Any
+import heapq
+import re
+from time import perf_counter
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import combinations
+from typing import List, Dict, Any, Iterator, Tuple, Optional, FrozenSet, AbstractSet, Union, NamedTuple, Callable
+import pydantic_core
 from .data_models import (
     ColumnDefinition, ChartSuggestion, FeatureEngineeringSuggestion,
-    MetricCardSuggestion, FormulaSuggestion, ChartWireframe
+    MetricCardSuggestion, FormulaSuggestion,
+    CompactChartSuggestion, CompactMetricCardSuggestion, SuggestionOptions,
+    SuggestionOutput, CompactSuggestionOutput
 )
+from .keyword_matcher import KeywordMatcher
+
+# Bump whenever a rule change alters the suggestions produced for the same input. It is part of the
+# /generate-ideas/ ETag, so clients holding responses from older rules revalidate to fresh ones.
+RULES_VERSION = "1"
 
 # --- WIREFRAME GENERATION FUNCTIONS ---
-def _get_generic_svg_wireframe(chart_type: str, title: str) -> str:
-    """Returns a very basic SVG wireframe based on chart type."""
-    svg_map = {
-        "Bar Chart": f"""
+# SVG templates per chart type; `{title}` is the only placeholder.
+_SVG_TEMPLATES = {
+    "Bar Chart": """
         <svg width="250" height="150" viewBox="0 0 250 150" fill="none" xmlns="http://www.w3.org/2000/svg">
             <rect x="20" y="20" width="200" height="110" fill="#f0f0f0" stroke="#ccc" stroke-width="1"/>
             <line x1="40" y1="110" x2="40" y2="90" stroke="#007bff" stroke-width="15"/>
@@ -23,7 +36,7 @@ def _get_generic_svg_wireframe(chart_type: str, title: str) -> str:
             <text x="10" y="70" font-family="Arial" font-size="10" fill="#888" transform="rotate(-90 10 70)">Value</text>
         </svg>
         """,
-        "Line Chart": f"""
+    "Line Chart": """
         <svg width="250" height="150" viewBox="0 0 250 150" fill="none" xmlns="http://www.w3.org/2000/svg">
             <rect x="20" y="20" width="200" height="110" fill="#f0f0f0" stroke="#ccc" stroke-width="1"/>
             <polyline points="40,100 70,60 100,80 130,50 160,90 190,40 220,70" stroke="#007bff" stroke-width="2" fill="none"/>
@@ -39,7 +52,7 @@ def _get_generic_svg_wireframe(chart_type: str, title: str) -> str:
             <text x="10" y="70" font-family="Arial" font-size="10" fill="#888" transform="rotate(-90 10 70)">Value</text>
         </svg>
         """,
-        "Scatter Plot": f"""
+    "Scatter Plot": """
         <svg width="250" height="150" viewBox="0 0 250 150" fill="none" xmlns="http://www.w3.org/2000/svg">
             <rect x="20" y="20" width="200" height="110" fill="#f0f0f0" stroke="#ccc" stroke-width="1"/>
             <circle cx="50" cy="80" r="3" fill="#007bff"/>
@@ -54,7 +67,7 @@ def _get_generic_svg_wireframe(chart_type: str, title: str) -> str:
             <text x="10" y="70" font-family="Arial" font-size="10" fill="#888" transform="rotate(-90 10 70)">Y-Axis</text>
         </svg>
         """,
-        "Histogram": f"""
+    "Histogram": """
         <svg width="250" height="150" viewBox="0 0 250 150" fill="none" xmlns="http://www.w3.org/2000/svg">
             <rect x="20" y="20" width="200" height="110" fill="#f0f0f0" stroke="#ccc" stroke-width="1"/>
             <rect x="40" y="90" width="20" height="20" fill="#007bff"/>
@@ -68,7 +81,7 @@ def _get_generic_svg_wireframe(chart_type: str, title: str) -> str:
             <text x="10" y="70" font-family="Arial" font-size="10" fill="#888" transform="rotate(-90 10 70)">Frequency</text>
         </svg>
         """,
-        "Pie/Donut Chart": f"""
+    "Pie/Donut Chart": """
         <svg width="250" height="150" viewBox="0 0 250 150" fill="none" xmlns="http://www.w3.org/2000/svg">
             <rect x="20" y="20" width="200" height="110" fill="#f0f0f0" stroke="#ccc" stroke-width="1"/>
             <circle cx="120" cy="75" r="40" fill="#f0f0f0" stroke="#007bff" stroke-width="2"/>
@@ -80,7 +93,7 @@ def _get_generic_svg_wireframe(chart_type: str, title: str) -> str:
             <text x="120" y="75" font-family="Arial" font-size="10" fill="#fff" text-anchor="middle">Chart</text>
         </svg>
         """,
-        "Box Plot / Violin Plot": f"""
+    "Box Plot / Violin Plot": """
         <svg width="250" height="150" viewBox="0 0 250 150" fill="none" xmlns="http://www.w3.org/2000/svg">
             <rect x="20" y="20" width="200" height="110" fill="#f0f0f0" stroke="#ccc" stroke-width="1"/>
             <rect x="50" y="60" width="20" height="40" fill="#007bff" stroke="#0056b3" stroke-width="1"/>
@@ -97,7 +110,7 @@ def _get_generic_svg_wireframe(chart_type: str, title: str) -> str:
             <text x="10" y="70" font-family="Arial" font-size="10" fill="#888" transform="rotate(-90 10 70)">Value</text>
         </svg>
         """,
-        "Metric Card": f"""
+    "Metric Card": """
         <svg width="250" height="100" viewBox="0 0 250 100" fill="none" xmlns="http://www.w3.org/2000/svg">
             <rect x="10" y="10" width="230" height="80" rx="8" ry="8" fill="#e9f5ff" stroke="#007bff" stroke-width="1"/>
             <text x="25" y="35" font-family="Arial" font-size="12" fill="#555" font-weight="bold">{title}</text>
@@ -105,527 +118,1134 @@ def _get_generic_svg_wireframe(chart_type: str, title: str) -> str:
             <text x="125" y="85" font-family="Arial" font-size="10" fill="#888" text-anchor="middle">Value Placeholder</text>
         </svg>
         """
-    }
-    return svg_map.get(chart_type, svg_map["Bar Chart"])
+}
+# Pre-split at the title placeholder once, so rendering is a single concatenation.
+_COMPILED_SVG_TEMPLATES = {
+    chart_type: template.partition("{title}")[::2] for chart_type, template in _SVG_TEMPLATES.items()
+}
+
+
+# Stable ids for the templates when they are shipped once per response (e.g. 'Pie/Donut Chart' -> 'pie_donut_chart')
+_SVG_TEMPLATE_IDS = {
+    chart_type: re.sub(r"[^a-z0-9]+", "_", chart_type.lower()).strip("_") for chart_type in _SVG_TEMPLATES
+}
+
+
+@lru_cache(maxsize=4096)
+def _get_generic_svg_wireframe(chart_type: str, title: str) -> str:
+    """Returns a very basic SVG wireframe based on chart type."""
+    head, tail = _COMPILED_SVG_TEMPLATES.get(chart_type, _COMPILED_SVG_TEMPLATES["Bar Chart"])
+    return head + title + tail
+
+
+class _WireframeBuilder:
+    """
+    Builds suggestion wireframes, either inline (full SVG per suggestion) or, for the 'reference'
+    format, as template references while collecting the templates actually used.
+    """
+
+    def __init__(self, wireframe_format: str = "inline", enabled: bool = True):
+        self.referenced = wireframe_format == "reference"
+        self.enabled = enabled
+        self.templates: Dict[str, str] = {}
+
+    def build(self, chart_type: str, title: str) -> Optional[Dict[str, str]]:
+        """The wireframe as plain data shaped like ChartWireframe (inline) or WireframeReference (reference)."""
+        if not self.enabled:
+            return None
+        if not self.referenced:
+            return {"svg_data": _get_generic_svg_wireframe(chart_type, title)}
+        if chart_type not in _SVG_TEMPLATES:
+            chart_type = "Bar Chart"
+        template_id = _SVG_TEMPLATE_IDS[chart_type]
+        self.templates[template_id] = _SVG_TEMPLATES[chart_type]
+        return {"template_id": template_id, "title": title}
 
 
 # --- FORMULA GENERATION FUNCTIONS ---
-def _get_formulas(operation: str, cols: List[str], agg_type: str = "SUM") -> List[FormulaSuggestion]:
-    formulas = []
+# Formula templates per operation, in output order (Excel, then SQL, then Pandas).
+# Each entry is (tool, formula_string, example_data_context); '{col1}'/'{col2}' are filled in per call.
+_FORMULA_TEMPLATES: Dict[str, List[Tuple[str, str, Optional[str]]]] = {
+    "SUM": [
+        ("Excel", "=SUM(A:A)", "Assuming '{col1}' is in column A."),
+        ("SQL", "SELECT SUM({col1}) FROM your_table;", None),
+        ("Pandas_Python", "import pandas as pd\ndf['{col1}'].sum()", None),
+    ],
+    "AVERAGE": [
+        ("Excel", "=AVERAGE(A:A)", "Assuming '{col1}' is in column A."),
+        ("SQL", "SELECT AVG({col1}) FROM your_table;", None),
+        ("Pandas_Python", "import pandas as pd\ndf['{col1}'].mean()", None),
+    ],
+    "COUNT": [
+        ("Excel", "=COUNTA(A:A)", "Assuming '{col1}' is in column A."),
+        ("SQL", "SELECT COUNT(*) FROM your_table;", None),
+        ("Pandas_Python", "import pandas as pd\ndf.shape[0]", None), # Total rows
+        ("Pandas_Python", "import pandas as pd\ndf['{col1}'].count()", None), # Count non-nulls
+    ],
+    "DIVIDE": [
+        ("Excel", "=A2/B2", "Assuming '{col1}' is in A2 and '{col2}' is in B2. Adjust cell references as needed."),
+        ("SQL", "({col1} / {col2}) AS new_feature_name", None),
+        ("Pandas_Python", "import pandas as pd\ndf['New_Feature'] = df['{col1}'] / df['{col2}']", None),
+    ],
+    "MULTIPLY": [
+        ("Excel", "=A2*B2", "Assuming '{col1}' is in A2 and '{col2}' is in B2. Adjust cell references as needed."),
+        ("SQL", "({col1} * {col2}) AS new_feature_name", None),
+        ("Pandas_Python", "import pandas as pd\ndf['New_Feature'] = df['{col1}'] * df['{col2}']", None),
+    ],
+    "SQRT": [
+        ("Excel", "=SQRT(A2)", "Assuming '{col1}' is in A2. Adjust cell reference as needed."),
+        ("SQL", "SQRT({col1}) AS new_feature_name", None),
+        ("Pandas_Python", "import numpy as np\ndf['New_Feature'] = np.sqrt(df['{col1}'])", None),
+    ],
+    "GROUP_BY_SUM": [
+        # For Excel, this implies PivotTable or SUMIFS
+        ("Excel", "Use PivotTable: Rows={col1}, Values={col2} (Sum)", "For grouped sum, a PivotTable is recommended."),
+        ("Excel", "=SUMIFS(Sum_Range, Criteria_Range, Criteria)", "For dynamic grouped sum (e.g., SUMIFS(C:C, A:A, 'Category1'))."),
+        ("SQL", "SELECT {col1}, SUM({col2}) FROM your_table GROUP BY {col1};", None),
+        ("Pandas_Python", "import pandas as pd\ndf.groupby('{col1}')['{col2}'].sum()", None),
+    ],
+    "GROUP_BY_AVERAGE": [
+        # For Excel, this implies PivotTable or AVERAGEIFS
+        ("Excel", "Use PivotTable: Rows={col1}, Values={col2} (Average)", "For grouped average, a PivotTable is recommended."),
+        ("Excel", "=AVERAGEIFS(Average_Range, Criteria_Range, Criteria)", "For dynamic grouped average (e.g., AVERAGEIFS(C:C, A:A, 'Category1'))."),
+        ("SQL", "SELECT {col1}, AVG({col2}) FROM your_table GROUP BY {col1};", None),
+        ("Pandas_Python", "import pandas as pd\ndf.groupby('{col1}')['{col2}'].mean()", None),
+    ],
+    "DATE_PART_YEAR": [
+        ("Excel", "=YEAR(A2)", "Assuming '{col1}' is a date in A2."),
+        ("SQL", "EXTRACT(YEAR FROM {col1}) AS {col1}_year", None), # Or YEAR({col1}) depending on DB
+        ("Pandas_Python", "import pandas as pd\ndf['{col1}'] = pd.to_datetime(df['{col1}'])\ndf['{col1}_Year'] = df['{col1}'].dt.year", None),
+    ],
+    "DATE_PART_MONTH": [
+        ("Excel", "=MONTH(A2)", "Assuming '{col1}' is a date in A2."),
+        ("SQL", "EXTRACT(MONTH FROM {col1}) AS {col1}_month", None), # Or MONTH({col1}) depending on DB
+        ("Pandas_Python", "import pandas as pd\ndf['{col1}'] = pd.to_datetime(df['{col1}'])\ndf['{col1}_Month'] = df['{col1}'].dt.month", None),
+    ],
+    "DATE_PART_DAYOFWEEK": [
+        ("Excel", "=WEEKDAY(A2)", "Assuming '{col1}' is a date in A2. Returns a number (1=Sunday or 1=Monday based on system)."),
+        ("SQL", "EXTRACT(DOW FROM {col1}) AS {col1}_dayofweek", None), # Or DAYOFWEEK({col1}), varies by DB (0=Sun, 1=Mon etc)
+        ("Pandas_Python", "import pandas as pd\ndf['{col1}'] = pd.to_datetime(df['{col1}'])\ndf['{col1}_DayOfWeek'] = df['{col1}'].dt.dayofweek", None), # Monday=0, Sunday=6
+    ],
+    "DATE_PART_QUARTER": [
+        ("Excel", "=ROUNDUP(MONTH(A2)/3,0)", "Assuming '{col1}' is a date in A2."),
+        ("SQL", "EXTRACT(QUARTER FROM {col1}) AS {col1}_quarter", None), # Or QUARTER({col1}) depending on DB
+        ("Pandas_Python", "import pandas as pd\ndf['{col1}'] = pd.to_datetime(df['{col1}'])\ndf['{col1}_Quarter'] = df['{col1}'].dt.quarter", None),
+    ],
+    "DATE_DIFF_DAYS": [
+        ("Excel", "=TODAY()-A2", "Assuming '{col1}' is a date in A2."),
+        ("SQL", "DATEDIFF(day, {col1}, GETDATE()) AS days_since_{col1}", None), # Or NOW() depending on DB
+        ("Pandas_Python", "import pandas as pd\ndf['{col1}'] = pd.to_datetime(df['{col1}'])\ndf['DaysSince'] = (pd.to_datetime('today') - df['{col1}']).dt.days", None),
+    ],
+    "COUNT_UNIQUE": [
+        ("Excel", "=SUM(1/COUNTIF(A:A,A:A))", "Array formula (Ctrl+Shift+Enter) to count unique values in column A. For newer Excel: =COUNTA(UNIQUE(A:A))"),
+        ("SQL", "SELECT COUNT(DISTINCT {col1}) FROM your_table;", None),
+        ("Pandas_Python", "import pandas as pd\ndf['{col1}'].nunique()", None),
+    ],
+    "TEXT_LENGTH": [
+        ("Excel", "=LEN(A2)", "Assuming '{col1}' is a text in A2."),
+        ("SQL", "LENGTH({col1}) AS {col1}_length", None), # Or LEN({col1}) depending on DB
+        ("Pandas_Python", "import pandas as pd\ndf['{col1}_Length'] = df['{col1}'].str.len()", None),
+    ],
+    "TEXT_WORD_COUNT": [
+        ("Excel", "=LEN(TRIM(A2))-LEN(SUBSTITUTE(A2,\" \",\"\"))+1", "Assuming '{col1}' is a text in A2. Counts words based on spaces."),
+        # SQL word count is highly DB-dependent and often complex or requires UDFs.
+        # Example for some DBs (very basic, splits by space):
+        ("SQL", "LENGTH({col1}) - LENGTH(REPLACE({col1}, ' ', '')) + 1 AS {col1}_word_count", "Basic word count, may vary by SQL dialect and complexity of text."),
+        ("Pandas_Python", "import pandas as pd\ndf['{col1}_WordCount'] = df['{col1}'].str.split().str.len()", None),
+    ],
+    "BOOLEAN_COUNT_TRUE": [
+        ("Excel", "=COUNTIF(A:A,TRUE)", "Assuming '{col1}' (boolean) is in column A."),
+        ("SQL", "SUM(CASE WHEN {col1} THEN 1 ELSE 0 END) AS count_true_{col1}", "Assumes boolean is TRUE/FALSE or 1/0."),
+        ("Pandas_Python", "import pandas as pd\ndf['{col1}'].sum() # Assumes True=1, False=0 or boolean column", None),
+    ],
+    "BOOLEAN_PERCENT_TRUE": [
+        ("Excel", "=COUNTIF(A:A,TRUE)/COUNTA(A:A)", "Assuming '{col1}' (boolean) is in column A. Format as percentage."),
+        ("SQL", "AVG(CASE WHEN {col1} THEN 1.0 ELSE 0.0 END) AS percent_true_{col1}", "Assumes boolean is TRUE/FALSE or 1/0. Format as percentage."),
+        ("Pandas_Python", "import pandas as pd\ndf['{col1}'].mean() # Assumes True=1, False=0 or boolean column. Format as percentage.", None),
+    ],
+}
+
+
+@lru_cache(maxsize=8192)
+def _cached_formula_records(
+    operation: str, cols: Tuple[str, ...], agg_type: str, tools: Optional[FrozenSet[str]]
+) -> Tuple[Dict[str, Optional[str]], ...]:
+    """Renders the formulas for one (operation, cols, agg_type) once, as plain FormulaSuggestion-shaped dicts (shared, never mutated)."""
     col1 = cols[0] if cols else "ColA"
     col2 = cols[1] if len(cols) > 1 else "ColB"
+    return tuple(
+        {
+            "tool": tool,
+            "formula_string": formula.format(col1=col1, col2=col2),
+            "example_data_context": context.format(col1=col1, col2=col2) if context is not None else None
+        }
+        for tool, formula, context in _FORMULA_TEMPLATES.get(operation, ())
+        if tools is None or tool in tools
+    )
 
-    # Excel Formulas
-    if operation == "SUM":
-        formulas.append(FormulaSuggestion(tool="Excel", formula_string=f"=SUM(A:A)", example_data_context=f"Assuming '{col1}' is in column A."))
-    elif operation == "AVERAGE":
-        formulas.append(FormulaSuggestion(tool="Excel", formula_string=f"=AVERAGE(A:A)", example_data_context=f"Assuming '{col1}' is in column A."))
-    elif operation == "COUNT":
-        formulas.append(FormulaSuggestion(tool="Excel", formula_string=f"=COUNTA(A:A)", example_data_context=f"Assuming '{col1}' is in column A."))
-    elif operation == "DIVIDE":
-        formulas.append(FormulaSuggestion(tool="Excel", formula_string=f"=A2/B2", example_data_context=f"Assuming '{col1}' is in A2 and '{col2}' is in B2. Adjust cell references as needed."))
-    elif operation == "MULTIPLY":
-        formulas.append(FormulaSuggestion(tool="Excel", formula_string=f"=A2*B2", example_data_context=f"Assuming '{col1}' is in A2 and '{col2}' is in B2. Adjust cell references as needed."))
-    elif operation == "SQRT":
-        formulas.append(FormulaSuggestion(tool="Excel", formula_string=f"=SQRT(A2)", example_data_context=f"Assuming '{col1}' is in A2. Adjust cell reference as needed."))
-    elif operation == "GROUP_BY_SUM":
-        # For Excel, this implies PivotTable or SUMIFS
-        formulas.append(FormulaSuggestion(tool="Excel", formula_string=f"Use PivotTable: Rows={col1}, Values={col2} (Sum)", example_data_context=f"For grouped sum, a PivotTable is recommended."))
-        formulas.append(FormulaSuggestion(tool="Excel", formula_string=f"=SUMIFS(Sum_Range, Criteria_Range, Criteria)", example_data_context=f"For dynamic grouped sum (e.g., SUMIFS(C:C, A:A, 'Category1'))."))
-    elif operation == "GROUP_BY_AVERAGE":
-        # For Excel, this implies PivotTable or AVERAGEIFS
-        formulas.append(FormulaSuggestion(tool="Excel", formula_string=f"Use PivotTable: Rows={col1}, Values={col2} (Average)", example_data_context=f"For grouped average, a PivotTable is recommended."))
-        formulas.append(FormulaSuggestion(tool="Excel", formula_string=f"=AVERAGEIFS(Average_Range, Criteria_Range, Criteria)", example_data_context=f"For dynamic grouped average (e.g., AVERAGEIFS(C:C, A:A, 'Category1'))."))
-    elif operation == "DATE_PART_YEAR":
-        formulas.append(FormulaSuggestion(tool="Excel", formula_string=f"=YEAR(A2)", example_data_context=f"Assuming '{col1}' is a date in A2."))
-    elif operation == "DATE_PART_MONTH":
-        formulas.append(FormulaSuggestion(tool="Excel", formula_string=f"=MONTH(A2)", example_data_context=f"Assuming '{col1}' is a date in A2."))
-    elif operation == "DATE_PART_DAYOFWEEK":
-        formulas.append(FormulaSuggestion(tool="Excel", formula_string=f"=WEEKDAY(A2)", example_data_context=f"Assuming '{col1}' is a date in A2. Returns a number (1=Sunday or 1=Monday based on system)."))
-    elif operation == "DATE_PART_QUARTER":
-        formulas.append(FormulaSuggestion(tool="Excel", formula_string=f"=ROUNDUP(MONTH(A2)/3,0)", example_data_context=f"Assuming '{col1}' is a date in A2."))
-    elif operation == "DATE_DIFF_DAYS":
-        formulas.append(FormulaSuggestion(tool="Excel", formula_string=f"=TODAY()-A2", example_data_context=f"Assuming '{col1}' is a date in A2."))
-    elif operation == "COUNT_UNIQUE":
-        formulas.append(FormulaSuggestion(tool="Excel", formula_string=f"=SUM(1/COUNTIF(A:A,A:A))", example_data_context=f"Array formula (Ctrl+Shift+Enter) to count unique values in column A. For newer Excel: =COUNTA(UNIQUE(A:A))"))
-    elif operation == "TEXT_LENGTH":
-        formulas.append(FormulaSuggestion(tool="Excel", formula_string=f"=LEN(A2)", example_data_context=f"Assuming '{col1}' is a text in A2."))
-    elif operation == "TEXT_WORD_COUNT":
-        formulas.append(FormulaSuggestion(tool="Excel", formula_string=f"=LEN(TRIM(A2))-LEN(SUBSTITUTE(A2,\" \",\"\"))+1", example_data_context=f"Assuming '{col1}' is a text in A2. Counts words based on spaces."))
-    elif operation == "BOOLEAN_COUNT_TRUE":
-        formulas.append(FormulaSuggestion(tool="Excel", formula_string=f"=COUNTIF(A:A,TRUE)", example_data_context=f"Assuming '{col1}' (boolean) is in column A."))
-    elif operation == "BOOLEAN_PERCENT_TRUE":
-        formulas.append(FormulaSuggestion(tool="Excel", formula_string=f"=COUNTIF(A:A,TRUE)/COUNTA(A:A)", example_data_context=f"Assuming '{col1}' (boolean) is in column A. Format as percentage."))
-
-
-    # SQL Formulas
-    if operation == "SUM":
-        formulas.append(FormulaSuggestion(tool="SQL", formula_string=f"SELECT SUM({col1}) FROM your_table;"))
-    elif operation == "AVERAGE":
-        formulas.append(FormulaSuggestion(tool="SQL", formula_string=f"SELECT AVG({col1}) FROM your_table;"))
-    elif operation == "COUNT":
-        formulas.append(FormulaSuggestion(tool="SQL", formula_string=f"SELECT COUNT(*) FROM your_table;"))
-    elif operation == "DIVIDE":
-        formulas.append(FormulaSuggestion(tool="SQL", formula_string=f"({col1} / {col2}) AS new_feature_name"))
-    elif operation == "MULTIPLY":
-        formulas.append(FormulaSuggestion(tool="SQL", formula_string=f"({col1} * {col2}) AS new_feature_name"))
-    elif operation == "SQRT":
-        formulas.append(FormulaSuggestion(tool="SQL", formula_string=f"SQRT({col1}) AS new_feature_name"))
-    elif operation == "GROUP_BY_SUM":
-        formulas.append(FormulaSuggestion(tool="SQL", formula_string=f"SELECT {col1}, SUM({col2}) FROM your_table GROUP BY {col1};"))
-    elif operation == "GROUP_BY_AVERAGE":
-        formulas.append(FormulaSuggestion(tool="SQL", formula_string=f"SELECT {col1}, AVG({col2}) FROM your_table GROUP BY {col1};"))
-    elif operation == "DATE_PART_YEAR":
-        formulas.append(FormulaSuggestion(tool="SQL", formula_string=f"EXTRACT(YEAR FROM {col1}) AS {col1}_year")) # Or YEAR({col1}) depending on DB
-    elif operation == "DATE_PART_MONTH":
-        formulas.append(FormulaSuggestion(tool="SQL", formula_string=f"EXTRACT(MONTH FROM {col1}) AS {col1}_month")) # Or MONTH({col1}) depending on DB
-    elif operation == "DATE_PART_DAYOFWEEK":
-        formulas.append(FormulaSuggestion(tool="SQL", formula_string=f"EXTRACT(DOW FROM {col1}) AS {col1}_dayofweek")) # Or DAYOFWEEK({col1}), varies by DB (0=Sun, 1=Mon etc)
-    elif operation == "DATE_PART_QUARTER":
-        formulas.append(FormulaSuggestion(tool="SQL", formula_string=f"EXTRACT(QUARTER FROM {col1}) AS {col1}_quarter")) # Or QUARTER({col1}) depending on DB
-    elif operation == "DATE_DIFF_DAYS":
-        formulas.append(FormulaSuggestion(tool="SQL", formula_string=f"DATEDIFF(day, {col1}, GETDATE()) AS days_since_{col1}")) # Or NOW() depending on DB
-    elif operation == "COUNT_UNIQUE":
-        formulas.append(FormulaSuggestion(tool="SQL", formula_string=f"SELECT COUNT(DISTINCT {col1}) FROM your_table;"))
-    elif operation == "TEXT_LENGTH":
-        formulas.append(FormulaSuggestion(tool="SQL", formula_string=f"LENGTH({col1}) AS {col1}_length")) # Or LEN({col1}) depending on DB
-    elif operation == "TEXT_WORD_COUNT":
-         # SQL word count is highly DB-dependent and often complex or requires UDFs.
-         # Example for some DBs (very basic, splits by space):
-        formulas.append(FormulaSuggestion(tool="SQL", formula_string=f"LENGTH({col1}) - LENGTH(REPLACE({col1}, ' ', '')) + 1 AS {col1}_word_count", example_data_context="Basic word count, may vary by SQL dialect and complexity of text."))
-    elif operation == "BOOLEAN_COUNT_TRUE":
-        formulas.append(FormulaSuggestion(tool="SQL", formula_string=f"SUM(CASE WHEN {col1} THEN 1 ELSE 0 END) AS count_true_{col1}", example_data_context="Assumes boolean is TRUE/FALSE or 1/0."))
-    elif operation == "BOOLEAN_PERCENT_TRUE":
-        formulas.append(FormulaSuggestion(tool="SQL", formula_string=f"AVG(CASE WHEN {col1} THEN 1.0 ELSE 0.0 END) AS percent_true_{col1}", example_data_context="Assumes boolean is TRUE/FALSE or 1/0. Format as percentage."))
-
-
-    # Pandas (Python) Formulas
-    if operation == "SUM":
-        formulas.append(FormulaSuggestion(tool="Pandas_Python", formula_string=f"import pandas as pd\ndf['{col1}'].sum()"))
-    elif operation == "AVERAGE":
-        formulas.append(FormulaSuggestion(tool="Pandas_Python", formula_string=f"import pandas as pd\ndf['{col1}'].mean()"))
-    elif operation == "COUNT":
-        formulas.append(FormulaSuggestion(tool="Pandas_Python", formula_string=f"import pandas as pd\ndf.shape[0]")) # Total rows
-        formulas.append(FormulaSuggestion(tool="Pandas_Python", formula_string=f"import pandas as pd\ndf['{col1}'].count()")) # Count non-nulls
-    elif operation == "DIVIDE":
-        formulas.append(FormulaSuggestion(tool="Pandas_Python", formula_string=f"import pandas as pd\ndf['New_Feature'] = df['{col1}'] / df['{col2}']"))
-    elif operation == "MULTIPLY":
-        formulas.append(FormulaSuggestion(tool="Pandas_Python", formula_string=f"import pandas as pd\ndf['New_Feature'] = df['{col1}'] * df['{col2}']"))
-    elif operation == "SQRT":
-        formulas.append(FormulaSuggestion(tool="Pandas_Python", formula_string=f"import numpy as np\ndf['New_Feature'] = np.sqrt(df['{col1}'])"))
-    elif operation == "GROUP_BY_SUM":
-        formulas.append(FormulaSuggestion(tool="Pandas_Python", formula_string=f"import pandas as pd\ndf.groupby('{col1}')['{col2}'].sum()"))
-    elif operation == "GROUP_BY_AVERAGE":
-        formulas.append(FormulaSuggestion(tool="Pandas_Python", formula_string=f"import pandas as pd\ndf.groupby('{col1}')['{col2}'].mean()"))
-    elif operation == "DATE_PART_YEAR":
-        formulas.append(FormulaSuggestion(tool="Pandas_Python", formula_string=f"import pandas as pd\ndf['{col1}'] = pd.to_datetime(df['{col1}'])\ndf['{col1}_Year'] = df['{col1}'].dt.year"))
-    elif operation == "DATE_PART_MONTH":
-        formulas.append(FormulaSuggestion(tool="Pandas_Python", formula_string=f"import pandas as pd\ndf['{col1}'] = pd.to_datetime(df['{col1}'])\ndf['{col1}_Month'] = df['{col1}'].dt.month"))
-    elif operation == "DATE_PART_DAYOFWEEK":
-        formulas.append(FormulaSuggestion(tool="Pandas_Python", formula_string=f"import pandas as pd\ndf['{col1}'] = pd.to_datetime(df['{col1}'])\ndf['{col1}_DayOfWeek'] = df['{col1}'].dt.dayofweek")) # Monday=0, Sunday=6
-    elif operation == "DATE_PART_QUARTER":
-        formulas.append(FormulaSuggestion(tool="Pandas_Python", formula_string=f"import pandas as pd\ndf['{col1}'] = pd.to_datetime(df['{col1}'])\ndf['{col1}_Quarter'] = df['{col1}'].dt.quarter"))
-    elif operation == "DATE_DIFF_DAYS":
-        formulas.append(FormulaSuggestion(tool="Pandas_Python", formula_string=f"import pandas as pd\ndf['{col1}'] = pd.to_datetime(df['{col1}'])\ndf['DaysSince'] = (pd.to_datetime('today') - df['{col1}']).dt.days"))
-    elif operation == "COUNT_UNIQUE":
-        formulas.append(FormulaSuggestion(tool="Pandas_Python", formula_string=f"import pandas as pd\ndf['{col1}'].nunique()"))
-    elif operation == "TEXT_LENGTH":
-        formulas.append(FormulaSuggestion(tool="Pandas_Python", formula_string=f"import pandas as pd\ndf['{col1}_Length'] = df['{col1}'].str.len()"))
-    elif operation == "TEXT_WORD_COUNT":
-        formulas.append(FormulaSuggestion(tool="Pandas_Python", formula_string=f"import pandas as pd\ndf['{col1}_WordCount'] = df['{col1}'].str.split().str.len()"))
-    elif operation == "BOOLEAN_COUNT_TRUE":
-        formulas.append(FormulaSuggestion(tool="Pandas_Python", formula_string=f"import pandas as pd\ndf['{col1}'].sum() # Assumes True=1, False=0 or boolean column"))
-    elif operation == "BOOLEAN_PERCENT_TRUE":
-        formulas.append(FormulaSuggestion(tool="Pandas_Python", formula_string=f"import pandas as pd\ndf['{col1}'].mean() # Assumes True=1, False=0 or boolean column. Format as percentage."))
-
-
-    return formulas
-
-
-def generate_suggestions(columns: List[ColumnDefinition]) -> Dict[str, Any]:
+
+@lru_cache(maxsize=8192)
+def _cached_formulas(
+    operation: str, cols: Tuple[str, ...], agg_type: str, tools: Optional[FrozenSet[str]]
+) -> Tuple[FormulaSuggestion, ...]:
+    """Validates the rendered formulas once; the frozen models are shared."""
+    return tuple(FormulaSuggestion(**record) for record in _cached_formula_records(operation, cols, agg_type, tools))
+
+
+def _get_formulas(
+    operation: str, cols: List[str], agg_type: str = "SUM", tools: Optional[FrozenSet[str]] = None
+) -> List[FormulaSuggestion]:
+    """Formulas for `operation` on `cols`, limited to `tools` when given (templates for other tools are never rendered)."""
+    if tools is not None and not tools:
+        return []
+    return list(_cached_formulas(operation, tuple(cols), agg_type, tools))
+
+
+# --- COLUMN CLASSIFICATION ---
+# Every keyword the rules look for is one bit, so a column's keyword matches fit in a single int
+# and the rules can test a whole keyword class with one `&` instead of re-scanning strings.
+_TYPE_CODES = {"numerical": 0, "categorical": 1, "date": 2, "text": 3, "boolean": 4}
+_NUMERICAL, _CATEGORICAL, _DATE, _TEXT, _BOOLEAN = range(5)
+
+_DESCRIPTION_KEYWORDS = {
+    "amount": 1 << 0,
+    "value": 1 << 1,
+    "revenue": 1 << 2,
+    "cost": 1 << 3,
+    "price": 1 << 4,
+    "units": 1 << 5,
+    "quantity": 1 << 6,
+    "count": 1 << 7,
+    "items": 1 << 8,
+    "distribution": 1 << 9,
+    "skewed": 1 << 10,
+    "order": 1 << 11,
+    "sales": 1 << 12,
+    "identifier": 1 << 13,
+    "unique": 1 << 14,
+    "total value": 1 << 15,
+    "sum of": 1 << 16,
+}
+_NAME_KEYWORDS = {
+    "id": 1 << 20,
+    "total": 1 << 21,
+    "sum": 1 << 22,
+    "amount": 1 << 23,
+}
+
+
+def _kw(*keywords: str, table: Dict[str, int] = _DESCRIPTION_KEYWORDS) -> int:
+    """Combines the bits of the given keywords into one keyword-class mask."""
+    mask = 0
+    for keyword in keywords:
+        mask |= table[keyword]
+    return mask
+
+
+# Keyword classes queried by the rules
+_KW_RATIO_NUMERATOR = _kw("amount", "value", "revenue", "cost", "price")
+_KW_RATIO_DENOMINATOR = _kw("units", "quantity", "count", "items")
+_KW_PRODUCT_PRICE = _kw("price", "cost")
+_KW_PRODUCT_QUANTITY = _kw("quantity", "units")
+_KW_SKEWED = _kw("distribution", "skewed")
+_KW_AGGREGATABLE = _kw("order", "sales", "amount")
+_KW_COUNT = _kw("count")
+_KW_IDENTIFIER = _kw("identifier")
+_KW_IDENTIFIER_OR_UNIQUE = _kw("identifier", "unique")
+_KW_PRE_SUMMED_DESCRIPTION = _kw("total value", "sum of")
+_KW_NAME_ID = _kw("id", table=_NAME_KEYWORDS)
+_KW_PRE_SUMMED_NAME = _kw("total", "sum", "amount", table=_NAME_KEYWORDS)
+
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset({"the", "and", "for", "per", "from", "with", "that", "this", "each", "are", "was", "into", "its"})
+
+
+class _ColumnFeatures:
+    """Compact per-column record built once per request by `_classify_columns`."""
+    __slots__ = ("column", "name", "index", "type_code", "is_id", "keywords", "_tokens")
+
+    def __init__(self, column: ColumnDefinition, index: int, type_code: int, is_id: bool, keywords: int):
+        self.column = column
+        self.name = column.name
+        self.index = index
+        self.type_code = type_code
+        self.is_id = is_id
+        self.keywords = keywords
+        self._tokens: Optional[FrozenSet[str]] = None
+
+    @property
+    def tokens(self) -> FrozenSet[str]:
+        """Significant description words, computed on first use (only pair ranking needs them)."""
+        if self._tokens is None:
+            self._tokens = frozenset(
+                token for token in _TOKEN_PATTERN.findall(self.column.description.lower())
+                if len(token) > 2 and token not in _STOPWORDS
+            )
+        return self._tokens
+
+
+# The whole rule vocabulary, compiled once at import and shared by every rule
+_NAME_MATCHER = KeywordMatcher(_NAME_KEYWORDS)
+_DESCRIPTION_MATCHER = KeywordMatcher(_DESCRIPTION_KEYWORDS)
+
+
+def _classify_columns(columns: List[ColumnDefinition]) -> List[_ColumnFeatures]:
+    """
+    Matches each column's name and description against the rule vocabulary exactly once, so the
+    rules only test precomputed flags no matter how many pairs a column takes part in.
+    """
+    features = []
+    for index, col in enumerate(columns):
+        keywords = _NAME_MATCHER.match(col.name) | _DESCRIPTION_MATCHER.match(col.description)
+        type_code = _TYPE_CODES[col.data_type]
+        # Helper for identifying ID columns more robustly
+        # This checks if the column name or description indicates it's an identifier
+        is_id = col.semantic_type == "identifier" or \
+                (type_code == _NUMERICAL and bool(keywords & (_KW_NAME_ID | _KW_IDENTIFIER))) or \
+                (type_code == _CATEGORICAL and bool(keywords & (_KW_NAME_ID | _KW_IDENTIFIER_OR_UNIQUE)))
+        features.append(_ColumnFeatures(col, index, type_code, is_id, keywords))
+    # A name flagged as an ID marks every column sharing that name
+    id_names = {f.name for f in features if f.is_id}
+    for f in features:
+        f.is_id = f.name in id_names
+    return features
+
+
+def _bucket(features: List[_ColumnFeatures], keyword_class: int) -> List[_ColumnFeatures]:
+    """Returns the columns (in schema order) matching at least one keyword of the class."""
+    return [f for f in features if f.keywords & keyword_class]
+
+
+def _in_focus(features: List[_ColumnFeatures], focus: Optional[AbstractSet[str]]) -> List[_ColumnFeatures]:
+    """The columns a single-column rule must visit: all of them, or only the focus columns."""
+    if focus is None:
+        return features
+    return [f for f in features if f.name in focus]
+
+
+def _ordered_pairs(
+    left: List[_ColumnFeatures], right: List[_ColumnFeatures], focus: Optional[AbstractSet[str]] = None
+) -> Iterator[Tuple[_ColumnFeatures, _ColumnFeatures]]:
+    """
+    Yields every (a, b) with `a` from `left`, `b` from `right` and `a` before `b` in the schema,
+    ordered like the original i < j loops. Only matching pairs are visited; with a `focus`, only
+    pairs involving at least one focus column.
+    """
+    right_indices = [f.index for f in right]
+    right_focus = _in_focus(right, focus)
+    right_focus_indices = [f.index for f in right_focus]
+    for a in left:
+        if focus is None or a.name in focus:
+            partners = right[bisect_right(right_indices, a.index):]
+        else:
+            partners = right_focus[bisect_right(right_focus_indices, a.index):]
+        for b in partners:
+            yield a, b
+
+
+def _crossed_pairs(
+    left: List[_ColumnFeatures], right: List[_ColumnFeatures], focus: Optional[AbstractSet[str]] = None
+) -> Iterator[Tuple[_ColumnFeatures, _ColumnFeatures]]:
+    """
+    Yields every (a, b) of `left` x `right` in nested-loop order; with a `focus`, only pairs
+    involving at least one focus column.
+    """
+    right_focus = _in_focus(right, focus)
+    for a in left:
+        for b in (right if focus is None or a.name in focus else right_focus):
+            yield a, b
+
+
+def _pair_relevance(a: _ColumnFeatures, b: _ColumnFeatures) -> int:
+    """Cheap relevance score for a column pair: shared description words plus a bonus for a shared semantic type."""
+    score = len(a.tokens & b.tokens)
+    if a.column.semantic_type is not None and a.column.semantic_type == b.column.semantic_type:
+        score += 2
+    return score
+
+
+def _top_ranked_pairs(features: List[_ColumnFeatures], budget: int) -> List[Tuple[_ColumnFeatures, _ColumnFeatures]]:
+    """
+    Returns at most `budget` column pairs, best `_pair_relevance` first (ties keep schema order).
+    A bounded min-heap holds the current best pairs, so the full pair list is never built.
+    """
+    if budget <= 0:
+        return []
+    heap: List[Tuple[int, int, int]] = []
+    for a, b in combinations(features, 2):
+        entry = (_pair_relevance(a, b), -a.index, -b.index)
+        if len(heap) < budget:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+    by_index = {f.index: f for f in features}
+    return [(by_index[-i], by_index[-j]) for _, i, j in sorted(heap, reverse=True)]
+
+
+# --- SUGGESTION RECORDS ---
+# The rules build these lightweight records; pydantic models are only created at the API boundary
+# (to_model), for suggestions that survived dedup, and JSON responses are encoded from to_dict()
+# without any models. Validating constructors are used on purpose: pydantic-core validates faster
+# than the pure-Python model_construct().
+# A FormulaKey holds the _cached_formula_records() arguments, so formulas are rendered once and shared.
+FormulaKey = Tuple[str, Tuple[str, ...], str, Optional[FrozenSet[str]]]
+
+
+class _ChartRecord:
+    __slots__ = ("title", "chart_type", "columns_used", "how_to", "wireframe")
+
+    def __init__(self, title: str, chart_type: str, columns_used: List[str], how_to: str,
+                 wireframe: Optional[Dict[str, str]]):
+        self.title = title
+        self.chart_type = chart_type
+        self.columns_used = columns_used
+        self.how_to = how_to
+        self.wireframe = wireframe
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "title": self.title,
+            "chart_type": self.chart_type,
+            "columns_used": self.columns_used,
+            "how_to": self.how_to,
+            "wireframe": self.wireframe
+        }
+
+    def to_model(self, compact: bool):
+        return (CompactChartSuggestion if compact else ChartSuggestion)(
+            title=self.title,
+            chart_type=self.chart_type,
+            columns_used=self.columns_used,
+            how_to=self.how_to,
+            wireframe=self.wireframe
+        )
+
+
+class _FeatureRecord:
+    __slots__ = ("new_feature_name", "description", "columns_involved", "potential_charts", "formulas")
+
+    def __init__(self, new_feature_name: str, description: str, columns_involved: List[str],
+                 potential_charts: List[str], formulas: FormulaKey):
+        self.new_feature_name = new_feature_name
+        self.description = description
+        self.columns_involved = columns_involved
+        self.potential_charts = potential_charts
+        self.formulas = formulas
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "new_feature_name": self.new_feature_name,
+            "description": self.description,
+            "columns_involved": self.columns_involved,
+            "potential_charts": self.potential_charts,
+            "formulas": _cached_formula_records(*self.formulas)
+        }
+
+    def to_model(self, compact: bool) -> FeatureEngineeringSuggestion:
+        return FeatureEngineeringSuggestion(
+            new_feature_name=self.new_feature_name,
+            description=self.description,
+            columns_involved=self.columns_involved,
+            potential_charts=self.potential_charts,
+            formulas=list(_cached_formulas(*self.formulas))
+        )
+
+
+class _MetricRecord:
+    __slots__ = ("title", "metric_name", "columns_used", "calculation_how_to", "formulas", "context", "wireframe")
+
+    def __init__(self, title: str, metric_name: str, columns_used: List[str], calculation_how_to: str,
+                 formulas: FormulaKey, context: str, wireframe: Optional[Dict[str, str]]):
+        self.title = title
+        self.metric_name = metric_name
+        self.columns_used = columns_used
+        self.calculation_how_to = calculation_how_to
+        self.formulas = formulas
+        self.context = context
+        self.wireframe = wireframe
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "title": self.title,
+            "metric_name": self.metric_name,
+            "columns_used": self.columns_used,
+            "calculation_how_to": self.calculation_how_to,
+            "formulas": _cached_formula_records(*self.formulas),
+            "context": self.context,
+            "wireframe": self.wireframe
+        }
+
+    def to_model(self, compact: bool):
+        return (CompactMetricCardSuggestion if compact else MetricCardSuggestion)(
+            title=self.title,
+            metric_name=self.metric_name,
+            columns_used=self.columns_used,
+            calculation_how_to=self.calculation_how_to,
+            formulas=list(_cached_formulas(*self.formulas)),
+            context=self.context,
+            wireframe=self.wireframe
+        )
+
+
+def _encode_json(data: Any) -> bytes:
+    """Compact UTF-8 JSON of plain data, byte-for-byte what the pydantic models serialize to."""
+    return pydantic_core.to_json(data)
+
+
+_SUGGESTION_LISTS = ("chart_suggestions", "feature_engineering_suggestions", "metric_card_suggestions")
+
+
+class _SuggestionCollector:
+    """
+    Builds the suggestions of one request. chart(), feature() and metric() yield a
+    (category, suggestion) pair, or nothing for a duplicate: the dedup key is checked first, so a
+    duplicate never gets its model, wireframe or formulas built.
+    """
+
+    def __init__(self, options: SuggestionOptions):
+        self.options = options
+        self.formula_tools = frozenset(options.formula_tools)
+        self.wireframes = _WireframeBuilder(options.wireframe_format, enabled=options.include_wireframes)
+        self._seen = set()
+        self.candidates = 0 # Suggestions the rules proposed, before dedup
+        # One entry per rule run: {"rule_id", "category", "ms", "candidates", "emitted"}; see _run_rules
+        self.rule_stats: List[Dict[str, Any]] = []
+
+    def collect(self, records: Iterator[Tuple[str, Any]]) -> Dict[str, Any]:
+        """Gathers (category, record) pairs into the generate_suggestions() result dict, converting them to models."""
+        compact = self.wireframes.referenced
+        result = {key: [] for key in _SUGGESTION_LISTS}
+        for category, record in records:
+            result[f"{category}_suggestions"].append(record.to_model(compact))
+        if compact:
+            result["wireframes"] = self.wireframes.templates
+        return result
+
+    def collect_json(self, records: Iterator[Tuple[str, Any]]) -> bytes:
+        """Encodes (category, record) pairs straight to the SuggestionOutput / CompactSuggestionOutput JSON."""
+        lists = {key: [] for key in _SUGGESTION_LISTS}
+        for category, record in records:
+            lists[f"{category}_suggestions"].append(record.to_dict())
+        # Same field order as the output models
+        output = {"wireframes": self.wireframes.templates, **lists} if self.wireframes.referenced else lists
+        return _encode_json(output)
+
+    def _is_new(self, key: Tuple) -> bool:
+        self.candidates += 1
+        if key in self._seen:
+            return False
+        self._seen.add(key)
+        return True
+
+    def chart(self, title: str, chart_type: str, columns_used: List[str], how_to: str,
+              wireframe_type: str) -> Iterator[Tuple[str, _ChartRecord]]:
+        if not self._is_new(("chart", title, chart_type, tuple(sorted(columns_used)))):
+            return
+        yield "chart", _ChartRecord(title, chart_type, columns_used, how_to, self.wireframes.build(wireframe_type, title))
+
+    def feature(self, new_feature_name: str, description: str, columns_involved: List[str],
+                potential_charts: List[str], operation: str) -> Iterator[Tuple[str, _FeatureRecord]]:
+        if not self._is_new(("feature", new_feature_name, tuple(sorted(columns_involved)), description)):
+            return
+        yield "feature_engineering", _FeatureRecord(
+            new_feature_name, description, columns_involved, potential_charts,
+            (operation, tuple(columns_involved), "SUM", self.formula_tools)
+        )
+
+    def metric(self, title: str, metric_name: str, columns_used: List[str], calculation_how_to: str,
+               operation: str, context: str, wireframe_title: str) -> Iterator[Tuple[str, _MetricRecord]]:
+        if not self._is_new(("metric", title, metric_name, tuple(sorted(columns_used)))):
+            return
+        yield "metric_card", _MetricRecord(
+            title, metric_name, columns_used, calculation_how_to,
+            (operation, tuple(columns_used), "SUM", self.formula_tools),
+            context, self.wireframes.build("Metric Card", wireframe_title)
+        )
+
+
+def generate_suggestions(columns: List[ColumnDefinition], options: Optional[SuggestionOptions] = None) -> Dict[str, Any]:
     """
     Analyzes column definitions and generates chart, feature engineering, and metric card suggestions.
+
+    `options` selects the categories, formula tools and wireframes to build (everything by default).
+    `options.scatter_pair_budget` caps the number of Scatter Plot suggestions. When set, only the most
+    relevant numerical column pairs are kept; when None, every pair gets a Scatter Plot.
+
+    With `options.wireframe_format="reference"` the suggestions are Compact* models whose wireframes point
+    into a shared template table, returned under the extra "wireframes" key (see CompactSuggestionOutput).
     """
-    chart_suggestions = []
-    feature_engineering_suggestions = []
-    metric_card_suggestions = []
+    out = _SuggestionCollector(options or SuggestionOptions())
+    return out.collect(_run_rules(out, columns))
+
 
-    # --- Initial Parsing of Columns (THIS WAS THE MISSING PART) ---
-    numerical_cols = [col for col in columns if col.data_type == "numerical"]
-    categorical_cols = [col for col in columns if col.data_type == "categorical"]
-    date_cols = [col for col in columns if col.data_type == "date"]
-    text_cols = [col for col in columns if col.data_type == "text"]
-    boolean_cols = [col for col in columns if col.data_type == "boolean"]
+# --- RULE REGISTRY ---
+# Column groups a rule signature can name. "id" is the identifier-like columns of any type; "any" is every column.
+_COLUMN_GROUPS = ("numerical", "categorical", "date", "text", "boolean", "id", "any")
+_GROUP_BITS = {group: 1 << bit for bit, group in enumerate(_COLUMN_GROUPS)}
 
-    # Helper for identifying ID columns more robustly
-    # This checks if the column name or description indicates it's an identifier
-    id_cols = [
-        col for col in columns
-        if col.semantic_type == "identifier" or \
-           (col.data_type == "numerical" and ("id" in col.name.lower() or "identifier" in col.description.lower())) or \
-           (col.data_type == "categorical" and ("id" in col.name.lower() or "identifier" in col.description.lower() or "unique" in col.description.lower()))
-    ]
-    # Ensure uniqueness if a column matches multiple conditions
-    unique_id_cols_names = {col.name for col in id_cols}
-    id_cols = [col for col in columns if col.name in unique_id_cols_names]
 
+class _SchemaView:
+    """
+    The classified schema as the rules see it: columns grouped by kind, plus the incremental-update
+    `focus` (see _run_rules). `available` has the bit of every non-empty column group.
+    """
+    __slots__ = ("columns", "numerical", "categorical", "date", "text", "boolean", "ids", "focus",
+                 "emit_total_records", "available")
+
+    def __init__(self, columns: List[ColumnDefinition], focus: Optional[AbstractSet[str]], emit_total_records: bool):
+        # Single pass over the schema: every rule works on these precomputed records.
+        features = _classify_columns(columns)
+        self.columns = columns
+        self.numerical = [f for f in features if f.type_code == _NUMERICAL]
+        self.categorical = [f for f in features if f.type_code == _CATEGORICAL]
+        self.date = [f for f in features if f.type_code == _DATE]
+        self.text = [f for f in features if f.type_code == _TEXT]
+        self.boolean = [f for f in features if f.type_code == _BOOLEAN]
+        self.ids = [f for f in features if f.is_id]
+        self.focus = focus
+        self.emit_total_records = emit_total_records
+        groups = (self.numerical, self.categorical, self.date, self.text, self.boolean, self.ids, features)
+        self.available = sum(_GROUP_BITS[name] for name, members in zip(_COLUMN_GROUPS, groups) if members)
 
-    # --- CHART SUGGESTIONS ---
 
+class _Rule(NamedTuple):
+    rule_id: str
+    category: str
+    # Each signature entry is a column group, or a tuple of groups of which any one will do.
+    signature: Tuple[Union[str, Tuple[str, ...]], ...]
+    requirements: Tuple[int, ...] # The signature as group bitmasks
+    generate: Callable[[_SuggestionCollector, _SchemaView], Iterator[Tuple[str, Any]]]
+
+
+# Every rule, in registration order, which is also the order of the suggestions in the output.
+_RULES: List[_Rule] = []
+
+
+def _rule(rule_id: str, category: str, signature: Tuple[Union[str, Tuple[str, ...]], ...]):
+    """
+    Registers a rule generator under `rule_id`. The rule only runs when the schema has at least one
+    column in every group of its `signature`, e.g. ("numerical", "date").
+    """
+    def register(generate):
+        requirements = tuple(
+            sum(_GROUP_BITS[group] for group in ((entry,) if isinstance(entry, str) else entry))
+            for entry in signature
+        )
+        _RULES.append(_Rule(rule_id, category, signature, requirements, generate))
+        return generate
+    return register
+
+
+# --- CHART RULES ---
+@_rule("category_distribution", "chart", ("categorical",))
+def _category_distribution_rule(out: _SuggestionCollector, schema: _SchemaView) -> Iterator[Tuple[str, Any]]:
     # Rule 1: Single Categorical Column
-    for cat_col in categorical_cols:
-        title_dist = f"Distribution of {cat_col.name}"
-        chart_suggestions.append(
-            ChartSuggestion(
-                title=title_dist,
-                chart_type="Bar Chart",
-                columns_used=[cat_col.name],
-                how_to=f"Use '{cat_col.name}' on the X-axis and count of rows on the Y-axis. This shows the frequency of each category.",
-                wireframe=ChartWireframe(svg_data=_get_generic_svg_wireframe("Bar Chart", title_dist))
-            )
+    for cat_col in _in_focus(schema.categorical, schema.focus):
+        yield from out.chart(
+            title=f"Distribution of {cat_col.name}",
+            chart_type="Bar Chart",
+            columns_used=[cat_col.name],
+            how_to=f"Use '{cat_col.name}' on the X-axis and count of rows on the Y-axis. This shows the frequency of each category.",
+            wireframe_type="Bar Chart"
         )
-        title_prop = f"Proportion of {cat_col.name}"
-        chart_suggestions.append(
-            ChartSuggestion(
-                title=title_prop,
-                chart_type="Pie/Donut Chart",
-                columns_used=[cat_col.name],
-                how_to=f"Use '{cat_col.name}' to segment the pie, with the size of slices representing the count of each category. Best for 2-5 categories.",
-                wireframe=ChartWireframe(svg_data=_get_generic_svg_wireframe("Pie/Donut Chart", title_prop))
-            )
+        yield from out.chart(
+            title=f"Proportion of {cat_col.name}",
+            chart_type="Pie/Donut Chart",
+            columns_used=[cat_col.name],
+            how_to=f"Use '{cat_col.name}' to segment the pie, with the size of slices representing the count of each category. Best for 2-5 categories.",
+            wireframe_type="Pie/Donut Chart"
         )
 
+
+@_rule("numeric_by_category", "chart", ("numerical", "categorical"))
+def _numeric_by_category_rule(out: _SuggestionCollector, schema: _SchemaView) -> Iterator[Tuple[str, Any]]:
     # Rule 2: Numerical + Categorical Column (for comparison)
-    for num_col in numerical_cols:
-        for cat_col in categorical_cols:
-            if num_col.name != cat_col.name:
-                title_agg = f"{num_col.name} by {cat_col.name}"
-                chart_suggestions.append(
-                    ChartSuggestion(
-                        title=title_agg,
-                        chart_type="Bar Chart (Aggregated)",
-                        columns_used=[cat_col.name, num_col.name],
-                        how_to=f"Use '{cat_col.name}' on the X-axis and the {'SUM' if num_col.semantic_type == 'currency' else 'SUM or AVERAGE'} of '{num_col.name}' on the Y-axis. " +
-                                 f"This compares {'total' if num_col.semantic_type == 'currency' else 'a numerical'} value across different categories." +
-                                 (f" Consider currency formatting for '{num_col.name}'." if num_col.semantic_type == 'currency' else ""),
-                        wireframe=ChartWireframe(svg_data=_get_generic_svg_wireframe("Bar Chart", title_agg))
-                    )
-                )
-                title_dist_cat_num = f"Distribution of {num_col.name} for each {cat_col.name}"
-                chart_suggestions.append(
-                    ChartSuggestion(
-                        title=title_dist_cat_num,
-                        chart_type="Box Plot / Violin Plot",
-                        columns_used=[cat_col.name, num_col.name],
-                        how_to=f"Use '{cat_col.name}' to define groups on the X-axis, and '{num_col.name}' for the Y-axis. This shows the spread, median, and outliers for the numerical value within each category.",
-                        wireframe=ChartWireframe(svg_data=_get_generic_svg_wireframe("Box Plot / Violin Plot", title_dist_cat_num))
-                    )
-                )
+    for num_col, cat_col in _crossed_pairs(schema.numerical, schema.categorical, schema.focus):
+        is_currency = num_col.column.semantic_type == 'currency'
+        if num_col.name != cat_col.name:
+            yield from out.chart(
+                title=f"{num_col.name} by {cat_col.name}",
+                chart_type="Bar Chart (Aggregated)",
+                columns_used=[cat_col.name, num_col.name],
+                how_to=f"Use '{cat_col.name}' on the X-axis and the {'SUM' if is_currency else 'SUM or AVERAGE'} of '{num_col.name}' on the Y-axis. " +
+                       f"This compares {'total' if is_currency else 'a numerical'} value across different categories." +
+                       (f" Consider currency formatting for '{num_col.name}'." if is_currency else ""),
+                wireframe_type="Bar Chart"
+            )
+            yield from out.chart(
+                title=f"Distribution of {num_col.name} for each {cat_col.name}",
+                chart_type="Box Plot / Violin Plot",
+                columns_used=[cat_col.name, num_col.name],
+                how_to=f"Use '{cat_col.name}' to define groups on the X-axis, and '{num_col.name}' for the Y-axis. This shows the spread, median, and outliers for the numerical value within each category.",
+                wireframe_type="Box Plot / Violin Plot"
+            )
+
 
+@_rule("numeric_trend", "chart", ("numerical", "date"))
+def _numeric_trend_rule(out: _SuggestionCollector, schema: _SchemaView) -> Iterator[Tuple[str, Any]]:
     # Rule 3: Numerical + Date Column (for trends)
-    for num_col in numerical_cols:
-        for date_col in date_cols:
-            title_trend = f"Trend of {num_col.name} over {date_col.name}"
-            chart_suggestions.append(
-                ChartSuggestion(
-                    title=title_trend,
-                    chart_type="Line Chart",
-                    columns_used=[date_col.name, num_col.name],
-                    how_to=f"Use '{date_col.name}' on the X-axis (aggregated by Day, Month, Year) and the SUM or AVERAGE of '{num_col.name}' on the Y-axis. This visualizes changes over time.",
-                    wireframe=ChartWireframe(svg_data=_get_generic_svg_wireframe("Line Chart", title_trend))
-                )
-            )
+    for num_col, date_col in _crossed_pairs(schema.numerical, schema.date, schema.focus):
+        yield from out.chart(
+            title=f"Trend of {num_col.name} over {date_col.name}",
+            chart_type="Line Chart",
+            columns_used=[date_col.name, num_col.name],
+            how_to=f"Use '{date_col.name}' on the X-axis (aggregated by Day, Month, Year) and the SUM or AVERAGE of '{num_col.name}' on the Y-axis. This visualizes changes over time.",
+            wireframe_type="Line Chart"
+        )
+
 
+@_rule("numeric_scatter", "chart", ("numerical",))
+def _numeric_scatter_rule(out: _SuggestionCollector, schema: _SchemaView) -> Iterator[Tuple[str, Any]]:
     # Rule 4: Two Numerical Columns (for relationships)
-    if len(numerical_cols) >= 2:
-        for i in range(len(numerical_cols)):
-            for j in range(i + 1, len(numerical_cols)):
-                num_col1 = numerical_cols[i]
-                num_col2 = numerical_cols[j]
-                title_rel = f"Relationship between {num_col1.name} and {num_col2.name}"
-                chart_suggestions.append(
-                    ChartSuggestion(
-                        title=title_rel,
-                        chart_type="Scatter Plot",
-                        columns_used=[num_col1.name, num_col2.name],
-                        how_to=f"Use '{num_col1.name}' on the X-axis and '{num_col2.name}' on the Y-axis. Each point represents a record, showing correlation or clusters.",
-                        wireframe=ChartWireframe(svg_data=_get_generic_svg_wireframe("Scatter Plot", title_rel))
-                    )
-                )
+    # Wide schemas have O(n^2) pairs, so callers can ask for only the best-ranked ones.
+    if out.options.scatter_pair_budget is None:
+        scatter_pairs = _ordered_pairs(schema.numerical, schema.numerical, schema.focus)
+    else:
+        scatter_pairs = _top_ranked_pairs(schema.numerical, out.options.scatter_pair_budget)
+    for num_col1, num_col2 in scatter_pairs:
+        yield from out.chart(
+            title=f"Relationship between {num_col1.name} and {num_col2.name}",
+            chart_type="Scatter Plot",
+            columns_used=[num_col1.name, num_col2.name],
+            how_to=f"Use '{num_col1.name}' on the X-axis and '{num_col2.name}' on the Y-axis. Each point represents a record, showing correlation or clusters.",
+            wireframe_type="Scatter Plot"
+        )
+
 
+@_rule("numeric_distribution", "chart", ("numerical",))
+def _numeric_distribution_rule(out: _SuggestionCollector, schema: _SchemaView) -> Iterator[Tuple[str, Any]]:
     # Rule 5: Single Numerical Column (for distribution)
-    for num_col in numerical_cols:
-        title_hist = f"Distribution of {num_col.name}"
-        chart_suggestions.append(
-            ChartSuggestion(
-                title=title_hist,
-                chart_type="Histogram",
-                columns_used=[num_col.name],
-                how_to=f"Group '{num_col.name}' into bins and count the occurrences in each bin. Shows the shape and spread of the data.",
-                wireframe=ChartWireframe(svg_data=_get_generic_svg_wireframe("Histogram", title_hist))
-            )
+    for num_col in _in_focus(schema.numerical, schema.focus):
+        yield from out.chart(
+            title=f"Distribution of {num_col.name}",
+            chart_type="Histogram",
+            columns_used=[num_col.name],
+            how_to=f"Group '{num_col.name}' into bins and count the occurrences in each bin. Shows the shape and spread of the data.",
+            wireframe_type="Histogram"
         )
 
-    # --- FEATURE ENGINEERING SUGGESTIONS ---
 
+# --- FEATURE ENGINEERING RULES ---
+@_rule("ratio_product", "feature_engineering", ("numerical",))
+def _ratio_product_rule(out: _SuggestionCollector, schema: _SchemaView) -> Iterator[Tuple[str, Any]]:
     # Rule FE1: Ratio/Product of two numerical columns
-    if len(numerical_cols) >= 2:
-        for i in range(len(numerical_cols)):
-            for j in range(i + 1, len(numerical_cols)):
-                num_col1 = numerical_cols[i]
-                num_col2 = numerical_cols[j]
-                
-                # Suggest Ratio if appropriate keywords are in descriptions
-                if any(k in num_col1.description.lower() for k in ["amount", "value", "revenue", "cost", "price"]) and \
-                   any(k in num_col2.description.lower() for k in ["units", "quantity", "count", "items"]):
-                    feature_engineering_suggestions.append(
-                        FeatureEngineeringSuggestion(
-                            new_feature_name=f"{num_col1.name}_Per_{num_col2.name}",
-                            description=f"Calculate the ratio of '{num_col1.name}' to '{num_col2.name}'. Useful for 'price per unit', 'revenue per customer', etc. Reveals efficiency or specific rates.",
-                            columns_involved=[num_col1.name, num_col2.name],
-                            potential_charts=["Histogram", "Line Chart (over time if a date column exists)", "Scatter Plot"],
-                            formulas=_get_formulas("DIVIDE", [num_col1.name, num_col2.name])
-                        )
-                    )
-                
-                # Suggest Product if relevant
-                if any(k in num_col1.description.lower() for k in ["price", "cost"]) and \
-                   any(k in num_col2.description.lower() for k in ["quantity", "units"]):
-                    feature_engineering_suggestions.append(
-                        FeatureEngineeringSuggestion(
-                            new_feature_name=f"Total_{num_col1.name}_x_{num_col2.name}",
-                            description=f"Calculate the product of '{num_col1.name}' and '{num_col2.name}'. Useful for 'total sales' (price * quantity), 'total cost' etc.",
-                            columns_involved=[num_col1.name, num_col2.name],
-                            potential_charts=["Bar Chart (aggregated)", "Line Chart"],
-                            formulas=_get_formulas("MULTIPLY", [num_col1.name, num_col2.name])
-                        )
-                    )
-    
+    # Only amount-like x unit-like and price-like x quantity-like buckets can match, so just those are crossed.
+    ratio_pairs = _ordered_pairs(_bucket(schema.numerical, _KW_RATIO_NUMERATOR), _bucket(schema.numerical, _KW_RATIO_DENOMINATOR), schema.focus)
+    product_pairs = _ordered_pairs(_bucket(schema.numerical, _KW_PRODUCT_PRICE), _bucket(schema.numerical, _KW_PRODUCT_QUANTITY), schema.focus)
+    for num_col1, num_col2 in sorted({*ratio_pairs, *product_pairs}, key=lambda pair: (pair[0].index, pair[1].index)):
+        # Suggest Ratio if appropriate keywords are in descriptions
+        if num_col1.keywords & _KW_RATIO_NUMERATOR and num_col2.keywords & _KW_RATIO_DENOMINATOR:
+            yield from out.feature(
+                new_feature_name=f"{num_col1.name}_Per_{num_col2.name}",
+                description=f"Calculate the ratio of '{num_col1.name}' to '{num_col2.name}'. Useful for 'price per unit', 'revenue per customer', etc. Reveals efficiency or specific rates.",
+                columns_involved=[num_col1.name, num_col2.name],
+                potential_charts=["Histogram", "Line Chart (over time if a date column exists)", "Scatter Plot"],
+                operation="DIVIDE"
+            )
+
+        # Suggest Product if relevant
+        if num_col1.keywords & _KW_PRODUCT_PRICE and num_col2.keywords & _KW_PRODUCT_QUANTITY:
+            yield from out.feature(
+                new_feature_name=f"Total_{num_col1.name}_x_{num_col2.name}",
+                description=f"Calculate the product of '{num_col1.name}' and '{num_col2.name}'. Useful for 'total sales' (price * quantity), 'total cost' etc.",
+                columns_involved=[num_col1.name, num_col2.name],
+                potential_charts=["Bar Chart (aggregated)", "Line Chart"],
+                operation="MULTIPLY"
+            )
+
+
+@_rule("sqrt_transform", "feature_engineering", ("numerical",))
+def _sqrt_transform_rule(out: _SuggestionCollector, schema: _SchemaView) -> Iterator[Tuple[str, Any]]:
     # Advanced FE: Sqrt for skewed data
-    for num_col in numerical_cols:
+    for num_col in _in_focus(schema.numerical, schema.focus):
         # Simple heuristic: if description mentions "distribution" or "skewed"
-        if "distribution" in num_col.description.lower() or "skewed" in num_col.description.lower():
-            feature_engineering_suggestions.append(
-                FeatureEngineeringSuggestion(
-                    new_feature_name=f"SQRT_{num_col.name}",
-                    description=f"Apply a square root transformation to '{num_col.name}'. Useful for normalizing highly skewed numerical data, making patterns more visible in charts.",
-                    columns_involved=[num_col.name],
-                    potential_charts=["Histogram", "Box Plot"],
-                    formulas=_get_formulas("SQRT", [num_col.name])
-                )
+        if num_col.keywords & _KW_SKEWED:
+            yield from out.feature(
+                new_feature_name=f"SQRT_{num_col.name}",
+                description=f"Apply a square root transformation to '{num_col.name}'. Useful for normalizing highly skewed numerical data, making patterns more visible in charts.",
+                columns_involved=[num_col.name],
+                potential_charts=["Histogram", "Box Plot"],
+                operation="SQRT"
             )
 
+
+@_rule("date_parts", "feature_engineering", ("date",))
+def _date_parts_rule(out: _SuggestionCollector, schema: _SchemaView) -> Iterator[Tuple[str, Any]]:
     # Rule FE2: Time-based features from Date Column
-    for date_col in date_cols:
-        feature_engineering_suggestions.append(
-            FeatureEngineeringSuggestion(
-                new_feature_name=f"{date_col.name}_Year",
-                description=f"Extract the year from '{date_col.name}'. Useful for yearly aggregation and comparison.",
-                columns_involved=[date_col.name],
-                potential_charts=["Bar Chart (Yearly Trend)", "Line Chart"],
-                formulas=_get_formulas("DATE_PART_YEAR", [date_col.name])
-            )
+    for date_col in _in_focus(schema.date, schema.focus):
+        yield from out.feature(
+            new_feature_name=f"{date_col.name}_Year",
+            description=f"Extract the year from '{date_col.name}'. Useful for yearly aggregation and comparison.",
+            columns_involved=[date_col.name],
+            potential_charts=["Bar Chart (Yearly Trend)", "Line Chart"],
+            operation="DATE_PART_YEAR"
         )
-        feature_engineering_suggestions.append(
-            FeatureEngineeringSuggestion(
-                new_feature_name=f"{date_col.name}_Month",
-                description=f"Extract the month from '{date_col.name}'. Useful for monthly trends or seasonality analysis.",
-                columns_involved=[date_col.name],
-                potential_charts=["Bar Chart (Monthly Trend)", "Box Plot per Month"],
-                formulas=_get_formulas("DATE_PART_MONTH", [date_col.name])
-            )
+        yield from out.feature(
+            new_feature_name=f"{date_col.name}_Month",
+            description=f"Extract the month from '{date_col.name}'. Useful for monthly trends or seasonality analysis.",
+            columns_involved=[date_col.name],
+            potential_charts=["Bar Chart (Monthly Trend)", "Box Plot per Month"],
+            operation="DATE_PART_MONTH"
         )
-        feature_engineering_suggestions.append(
-            FeatureEngineeringSuggestion(
-                new_feature_name=f"{date_col.name}_DayOfWeek",
-                description=f"Extract the day of the week from '{date_col.name}'. Useful for weekly patterns.",
-                columns_involved=[date_col.name],
-                potential_charts=["Bar Chart (Day of Week Trend)", "Box Plot per DayOfWeek"],
-                formulas=_get_formulas("DATE_PART_DAYOFWEEK", [date_col.name])
-            )
+        yield from out.feature(
+            new_feature_name=f"{date_col.name}_DayOfWeek",
+            description=f"Extract the day of the week from '{date_col.name}'. Useful for weekly patterns.",
+            columns_involved=[date_col.name],
+            potential_charts=["Bar Chart (Day of Week Trend)", "Box Plot per DayOfWeek"],
+            operation="DATE_PART_DAYOFWEEK"
         )
-        feature_engineering_suggestions.append(
-            FeatureEngineeringSuggestion(
-                new_feature_name=f"{date_col.name}_Quarter",
-                description=f"Extract the quarter from '{date_col.name}'. Useful for quarterly business cycle analysis.",
-                columns_involved=[date_col.name],
-                potential_charts=["Bar Chart (Quarterly Trend)", "Line Chart"],
-                formulas=_get_formulas("DATE_PART_QUARTER", [date_col.name])
-            )
+        yield from out.feature(
+            new_feature_name=f"{date_col.name}_Quarter",
+            description=f"Extract the quarter from '{date_col.name}'. Useful for quarterly business cycle analysis.",
+            columns_involved=[date_col.name],
+            potential_charts=["Bar Chart (Quarterly Trend)", "Line Chart"],
+            operation="DATE_PART_QUARTER"
         )
-        feature_engineering_suggestions.append(
-            FeatureEngineeringSuggestion(
-                new_feature_name=f"{date_col.name}_DaysSince",
-                description=f"Calculate days elapsed since '{date_col.name}'. Useful for recency analysis (e.g., 'Days Since Last Purchase').",
-                columns_involved=[date_col.name],
-                potential_charts=["Histogram", "Scatter Plot"],
-                formulas=_get_formulas("DATE_DIFF_DAYS", [date_col.name])
-            )
+        yield from out.feature(
+            new_feature_name=f"{date_col.name}_DaysSince",
+            description=f"Calculate days elapsed since '{date_col.name}'. Useful for recency analysis (e.g., 'Days Since Last Purchase').",
+            columns_involved=[date_col.name],
+            potential_charts=["Histogram", "Scatter Plot"],
+            operation="DATE_DIFF_DAYS"
         )
 
+
+@_rule("per_entity_aggregates", "feature_engineering", ("id", "numerical"))
+def _per_entity_aggregates_rule(out: _SuggestionCollector, schema: _SchemaView) -> Iterator[Tuple[str, Any]]:
     # Rule FE3: Aggregation of numerical columns for IDs/Categorical
-    for id_col in id_cols:
-        for num_col in numerical_cols:
-            if "order" in num_col.description.lower() or "sales" in num_col.description.lower() or "amount" in num_col.description.lower():
-                # Aggregated Total
-                feature_engineering_suggestions.append(
-                    FeatureEngineeringSuggestion(
-                        new_feature_name=f"Total_{num_col.name}_Per_{id_col.name}",
-                        description=f"Calculate the sum of '{num_col.name}' grouped by each unique '{id_col.name}'. Useful for identifying total contribution per entity.",
-                        columns_involved=[id_col.name, num_col.name],
-                        potential_charts=["Bar Chart (Top N)", "Histogram"],
-                        formulas=_get_formulas("GROUP_BY_SUM", [id_col.name, num_col.name])
-                    )
-                )
-            # Average aggregation
-            if "count" not in num_col.description.lower() and (
-                "order" in num_col.description.lower() or "sales" in num_col.description.lower() or "amount" in num_col.description.lower()
-            ):
-                feature_engineering_suggestions.append(
-                    FeatureEngineeringSuggestion(
-                        new_feature_name=f"Average_{num_col.name}_Per_{id_col.name}",
-                        description=f"Calculate the average of '{num_col.name}' grouped by each unique '{id_col.name}'. Useful for understanding average values per entity.",
-                        columns_involved=[id_col.name, num_col.name],
-                        potential_charts=["Bar Chart", "Histogram"],
-                        formulas=_get_formulas("GROUP_BY_AVERAGE", [id_col.name, num_col.name])
-                    )
-                )
+    # Only order/sales/amount-like numerical columns can be aggregated, so IDs are crossed with that bucket alone.
+    aggregatable_cols = _bucket(schema.numerical, _KW_AGGREGATABLE)
+    for id_col, num_col in _crossed_pairs(schema.ids, aggregatable_cols, schema.focus):
+        # Aggregated Total
+        yield from out.feature(
+            new_feature_name=f"Total_{num_col.name}_Per_{id_col.name}",
+            description=f"Calculate the sum of '{num_col.name}' grouped by each unique '{id_col.name}'. Useful for identifying total contribution per entity.",
+            columns_involved=[id_col.name, num_col.name],
+            potential_charts=["Bar Chart (Top N)", "Histogram"],
+            operation="GROUP_BY_SUM"
+        )
+        # Average aggregation
+        if not num_col.keywords & _KW_COUNT:
+            yield from out.feature(
+                new_feature_name=f"Average_{num_col.name}_Per_{id_col.name}",
+                description=f"Calculate the average of '{num_col.name}' grouped by each unique '{id_col.name}'. Useful for understanding average values per entity.",
+                columns_involved=[id_col.name, num_col.name],
+                potential_charts=["Bar Chart", "Histogram"],
+                operation="GROUP_BY_AVERAGE"
+            )
 
+
+@_rule("text_length", "feature_engineering", ("text",))
+def _text_length_rule(out: _SuggestionCollector, schema: _SchemaView) -> Iterator[Tuple[str, Any]]:
     # Rule FE4: Text-based features (Length, Word Count)
-    for text_col in text_cols:
-        feature_engineering_suggestions.append(
-            FeatureEngineeringSuggestion(
-                new_feature_name=f"{text_col.name}_Length",
-                description=f"Calculate the character length of the text in '{text_col.name}'. Useful for understanding text size variability.",
-                columns_involved=[text_col.name],
-                potential_charts=["Histogram", "Box Plot"],
-                formulas=_get_formulas("TEXT_LENGTH", [text_col.name])
-            )
+    for text_col in _in_focus(schema.text, schema.focus):
+        yield from out.feature(
+            new_feature_name=f"{text_col.name}_Length",
+            description=f"Calculate the character length of the text in '{text_col.name}'. Useful for understanding text size variability.",
+            columns_involved=[text_col.name],
+            potential_charts=["Histogram", "Box Plot"],
+            operation="TEXT_LENGTH"
         )
-        feature_engineering_suggestions.append(
-            FeatureEngineeringSuggestion(
-                new_feature_name=f"{text_col.name}_WordCount",
-                description=f"Estimate the number of words in the text in '{text_col.name}'. Useful for content analysis.",
-                columns_involved=[text_col.name],
-                potential_charts=["Histogram", "Box Plot"],
-                formulas=_get_formulas("TEXT_WORD_COUNT", [text_col.name])
-            )
+        yield from out.feature(
+            new_feature_name=f"{text_col.name}_WordCount",
+            description=f"Estimate the number of words in the text in '{text_col.name}'. Useful for content analysis.",
+            columns_involved=[text_col.name],
+            potential_charts=["Histogram", "Box Plot"],
+            operation="TEXT_WORD_COUNT"
         )
 
-    # --- METRIC CARD SUGGESTIONS ---
 
+# --- METRIC CARD RULES ---
+@_rule("numeric_totals", "metric_card", ("numerical",))
+def _numeric_totals_rule(out: _SuggestionCollector, schema: _SchemaView) -> Iterator[Tuple[str, Any]]:
     # Rule MC1: Overall Sum/Average for Numerical Columns
-    for num_col in numerical_cols:
+    for num_col in _in_focus(schema.numerical, schema.focus):
+        is_currency = num_col.column.semantic_type == 'currency'
         # Total Sum
-        metric_card_suggestions.append(
-            MetricCardSuggestion(
-                title=f"Total {num_col.name}",
-                metric_name=f"Total {num_col.name}",
-                columns_used=[num_col.name],
-                calculation_how_to=f"Sum all values in the '{num_col.name}' column.",
-                formulas=_get_formulas("SUM", [num_col.name]),
-                context=f"Displays the grand total of '{num_col.name}' across your entire dataset." +
-                        (f" As this column is marked as currency, this represents a monetary total." if num_col.semantic_type == 'currency' else ""),
-                wireframe=ChartWireframe(svg_data=_get_generic_svg_wireframe("Metric Card", f"Total {num_col.name}"))
-            )
+        yield from out.metric(
+            title=f"Total {num_col.name}",
+            metric_name=f"Total {num_col.name}",
+            columns_used=[num_col.name],
+            calculation_how_to=f"Sum all values in the '{num_col.name}' column.",
+            operation="SUM",
+            context=f"Displays the grand total of '{num_col.name}' across your entire dataset." +
+                    (f" As this column is marked as currency, this represents a monetary total." if is_currency else ""),
+            wireframe_title=f"Total {num_col.name}"
         )
         # Overall Average
         # Avoid suggesting average for currency if it's something like 'TotalTransactionAmount' and the sum is already suggested.
         # However, average price, average discount amount etc. make sense.
         # Heuristic: Suggest average unless semantic_type is currency AND ('total' or 'sum') is in name/description, implying it's an already summed value.
-        is_pre_summed_currency = num_col.semantic_type == 'currency' and \
-                                 any(kw in num_col.name.lower() for kw in ['total', 'sum', 'amount']) or \
-                                 any(kw in num_col.description.lower() for kw in ['total value', 'sum of'])
+        is_pre_summed_currency = is_currency and \
+                                 bool(num_col.keywords & _KW_PRE_SUMMED_NAME) or \
+                                 bool(num_col.keywords & _KW_PRE_SUMMED_DESCRIPTION)
 
         if not is_pre_summed_currency:
-            metric_card_suggestions.append(
-                MetricCardSuggestion(
-                    title=f"Average {num_col.name}",
-                    metric_name=f"Average {num_col.name}",
-                    columns_used=[num_col.name],
-                    calculation_how_to=f"Calculate the average of all values in the '{num_col.name}' column.",
-                    formulas=_get_formulas("AVERAGE", [num_col.name]),
-                    context=f"Displays the overall average of '{num_col.name}' across your dataset." +
-                            (f" As this column is marked as currency, this represents an average monetary value (e.g., average price, average spend)." if num_col.semantic_type == 'currency' else ""),
-                    wireframe=ChartWireframe(svg_data=_get_generic_svg_wireframe("Metric Card", f"Average {num_col.name}"))
-                )
+            yield from out.metric(
+                title=f"Average {num_col.name}",
+                metric_name=f"Average {num_col.name}",
+                columns_used=[num_col.name],
+                calculation_how_to=f"Calculate the average of all values in the '{num_col.name}' column.",
+                operation="AVERAGE",
+                context=f"Displays the overall average of '{num_col.name}' across your dataset." +
+                        (f" As this column is marked as currency, this represents an average monetary value (e.g., average price, average spend)." if is_currency else ""),
+                wireframe_title=f"Average {num_col.name}"
             )
 
+
+@_rule("unique_counts", "metric_card", (("categorical", "id"),))
+def _unique_counts_rule(out: _SuggestionCollector, schema: _SchemaView) -> Iterator[Tuple[str, Any]]:
     # Rule MC2: Count of Categorical/ID Columns or general records
-    # Count of unique values for categorical/ID columns
-    for col_for_unique_count in categorical_cols + id_cols:
-        metric_card_suggestions.append(
-            MetricCardSuggestion(
-                title=f"Total Unique {col_for_unique_count.name}",
-                metric_name=f"Unique {col_for_unique_count.name} Count",
-                columns_used=[col_for_unique_count.name],
-                calculation_how_to=f"Count the number of unique entries in the '{col_for_unique_count.name}' column.",
-                formulas=_get_formulas("COUNT_UNIQUE", [col_for_unique_count.name]),
-                context=f"Indicates the total number of distinct '{col_for_unique_count.name}' instances or unique entities in your data.",
-                wireframe=ChartWireframe(svg_data=_get_generic_svg_wireframe("Metric Card", f"Unique {col_for_unique_count.name} Count"))
-            )
+    # Count of unique values for categorical/ID columns (categorical ID columns are skipped by the dedup check)
+    for col_for_unique_count in _in_focus(schema.categorical + schema.ids, schema.focus):
+        yield from out.metric(
+            title=f"Total Unique {col_for_unique_count.name}",
+            metric_name=f"Unique {col_for_unique_count.name} Count",
+            columns_used=[col_for_unique_count.name],
+            calculation_how_to=f"Count the number of unique entries in the '{col_for_unique_count.name}' column.",
+            operation="COUNT_UNIQUE",
+            context=f"Indicates the total number of distinct '{col_for_unique_count.name}' instances or unique entities in your data.",
+            wireframe_title=f"Unique {col_for_unique_count.name} Count"
         )
 
+
+@_rule("total_records", "metric_card", ("any",))
+def _total_records_rule(out: _SuggestionCollector, schema: _SchemaView) -> Iterator[Tuple[str, Any]]:
     # Total record count (can derive from any column that always has a value)
-    if columns: # If there's at least one column
-        first_col_name = columns[0].name
-        metric_card_suggestions.append(
-            MetricCardSuggestion(
-                title="Total Records",
-                metric_name="Total Rows in Dataset",
-                columns_used=[first_col_name], # Just using the first column name as a placeholder
-                calculation_how_to="Count the total number of rows/records in your dataset.",
-                formulas=_get_formulas("COUNT", [first_col_name]),
-                context="Represents the total size of your dataset.",
-                wireframe=ChartWireframe(svg_data=_get_generic_svg_wireframe("Metric Card", "Total Records"))
-            )
+    if schema.emit_total_records:
+        first_col_name = schema.columns[0].name
+        yield from out.metric(
+            title="Total Records",
+            metric_name="Total Rows in Dataset",
+            columns_used=[first_col_name], # Just using the first column name as a placeholder
+            calculation_how_to="Count the total number of rows/records in your dataset.",
+            operation="COUNT",
+            context="Represents the total size of your dataset.",
+            wireframe_title="Total Records"
         )
 
+
+@_rule("boolean_rates", "metric_card", ("boolean",))
+def _boolean_rates_rule(out: _SuggestionCollector, schema: _SchemaView) -> Iterator[Tuple[str, Any]]:
     # Rule MC3: Metrics for Boolean Columns
-    for bool_col in boolean_cols:
-        metric_card_suggestions.append(
-            MetricCardSuggestion(
-                title=f"Count of True for {bool_col.name}",
-                metric_name=f"Count True ({bool_col.name})",
-                columns_used=[bool_col.name],
-                calculation_how_to=f"Count the number of TRUE values in the '{bool_col.name}' column.",
-                formulas=_get_formulas("BOOLEAN_COUNT_TRUE", [bool_col.name]),
-                context=f"Shows how many records have the '{bool_col.name}' flag set to true.",
-                wireframe=ChartWireframe(svg_data=_get_generic_svg_wireframe("Metric Card", f"Count True: {bool_col.name}"))
-            )
+    for bool_col in _in_focus(schema.boolean, schema.focus):
+        yield from out.metric(
+            title=f"Count of True for {bool_col.name}",
+            metric_name=f"Count True ({bool_col.name})",
+            columns_used=[bool_col.name],
+            calculation_how_to=f"Count the number of TRUE values in the '{bool_col.name}' column.",
+            operation="BOOLEAN_COUNT_TRUE",
+            context=f"Shows how many records have the '{bool_col.name}' flag set to true.",
+            wireframe_title=f"Count True: {bool_col.name}"
         )
-        metric_card_suggestions.append(
-            MetricCardSuggestion(
-                title=f"Percentage of True for {bool_col.name}",
-                metric_name=f"% True ({bool_col.name})",
-                columns_used=[bool_col.name],
-                calculation_how_to=f"Calculate the percentage of TRUE values in the '{bool_col.name}' column out of all entries for that column.",
-                formulas=_get_formulas("BOOLEAN_PERCENT_TRUE", [bool_col.name]),
-                context=f"Shows the proportion of records where '{bool_col.name}' is true. Useful for conversion rates, flag prevalence, etc.",
-                wireframe=ChartWireframe(svg_data=_get_generic_svg_wireframe("Metric Card", f"% True: {bool_col.name}"))
-            )
+        yield from out.metric(
+            title=f"Percentage of True for {bool_col.name}",
+            metric_name=f"% True ({bool_col.name})",
+            columns_used=[bool_col.name],
+            calculation_how_to=f"Calculate the percentage of TRUE values in the '{bool_col.name}' column out of all entries for that column.",
+            operation="BOOLEAN_PERCENT_TRUE",
+            context=f"Shows the proportion of records where '{bool_col.name}' is true. Useful for conversion rates, flag prevalence, etc.",
+            wireframe_title=f"% True: {bool_col.name}"
         )
 
 
-    # Deduplicate suggestions (simple by title/name for now)
-    deduplicated_charts = {}
-    for chart in chart_suggestions:
-        key = (chart.title, chart.chart_type, tuple(sorted(chart.columns_used)))
-        deduplicated_charts[key] = chart
-    
-    deduplicated_features = {}
-    for fe in feature_engineering_suggestions:
-        # Key includes name, sorted columns involved, and description for better uniqueness
-        key = (fe.new_feature_name, tuple(sorted(fe.columns_involved)), fe.description)
-        deduplicated_features[key] = fe
-
-    deduplicated_metrics = {}
-    for mc in metric_card_suggestions:
-        key = (mc.title, mc.metric_name, tuple(sorted(mc.columns_used)))
-        deduplicated_metrics[key] = mc
-
-    return {
-        "chart_suggestions": list(deduplicated_charts.values()),
-        "feature_engineering_suggestions": list(deduplicated_features.values()),
-        "metric_card_suggestions": list(deduplicated_metrics.values())
-    }
\ No newline at end of file
+# Ids accepted in SuggestionOptions.disabled_rules (and IVIZ_DISABLED_RULES).
+RULE_IDS = tuple(rule.rule_id for rule in _RULES)
+
+
+@lru_cache(maxsize=1024)
+def _rules_for(available: int, categories: FrozenSet[str], disabled: FrozenSet[str]) -> Tuple[_Rule, ...]:
+    """The enabled rules of the requested categories whose signature the available column groups satisfy."""
+    return tuple(
+        rule for rule in _RULES
+        if rule.category in categories
+        and rule.rule_id not in disabled
+        and all(available & requirement for requirement in rule.requirements)
+    )
+
+
+def _run_rules(
+    out: _SuggestionCollector,
+    columns: List[ColumnDefinition],
+    focus: Optional[AbstractSet[str]] = None,
+    emit_total_records: bool = True
+) -> Iterator[Tuple[str, Any]]:
+    """
+    Applies the applicable rules to the schema, yielding (category, suggestion) pairs as the rules produce them.
+    With a `focus` set of column names, only suggestions involving at least one of those columns are
+    produced (used for incremental updates).
+
+    Each rule run is recorded in `out.rule_stats`: time spent inside the rule (not in the consumer of
+    its suggestions), candidates it proposed and suggestions it emitted after dedup.
+    """
+    schema = _SchemaView(columns, focus, emit_total_records)
+    options = out.options
+    for rule in _rules_for(schema.available, frozenset(options.categories), frozenset(options.disabled_rules)):
+        candidates_before = out.candidates
+        emitted = 0
+        elapsed = 0.0
+        generator = rule.generate(out, schema)
+        while True:
+            started = perf_counter()
+            item = next(generator, None)
+            elapsed += perf_counter() - started
+            if item is None:
+                break
+            emitted += 1
+            yield item
+        out.rule_stats.append({
+            "rule_id": rule.rule_id,
+            "category": rule.category,
+            "ms": round(elapsed * 1000, 3),
+            "candidates": out.candidates - candidates_before,
+            "emitted": emitted
+        })
+
+
+# --- INCREMENTAL UPDATES ---
+
+
+def apply_column_delta(
+    columns: List[ColumnDefinition],
+    added: List[ColumnDefinition],
+    removed: List[str],
+    modified: List[ColumnDefinition]
+) -> List[ColumnDefinition]:
+    """
+    Returns the schema after a delta: `removed` names are dropped, `modified` columns replace the
+    column with the same name in place, and `added` columns are appended.
+    Raises ValueError for unknown removed/modified names or added names that already exist.
+    """
+    existing = {c.name for c in columns}
+    unknown = [name for name in [*removed, *(c.name for c in modified)] if name not in existing]
+    if unknown:
+        raise ValueError(f"Unknown columns in delta: {', '.join(unknown)}")
+    removed_names = set(removed)
+    replacements = {c.name: c for c in modified}
+    remaining = [replacements.get(c.name, c) for c in columns if c.name not in removed_names]
+    remaining_names = {c.name for c in remaining}
+    added_names = [c.name for c in added]
+    clashing = [name for name in added_names if name in remaining_names]
+    if clashing or len(set(added_names)) != len(added_names):
+        raise ValueError(f"Added columns must have new, unique names: {', '.join(clashing or added_names)}")
+    return remaining + list(added)
+
+
+def generate_suggestions_for_delta(
+    previous_columns: List[ColumnDefinition],
+    added: List[ColumnDefinition],
+    removed: List[str],
+    modified: List[ColumnDefinition],
+    options: Optional[SuggestionOptions] = None
+) -> Tuple[List[ColumnDefinition], List[str], Dict[str, Any]]:
+    """
+    Re-runs only the rules touching the changed columns. Returns the new schema, the invalidated column
+    names and the new suggestions: dropping every previous suggestion that uses an invalidated column
+    and adding the new ones gives the same set as generate_suggestions() on the new schema.
+    """
+    options = options or SuggestionOptions()
+    new_columns = apply_column_delta(previous_columns, added, removed, modified)
+    if options.scatter_pair_budget is not None:
+        # The scatter budget ranks pairs across the whole schema, so any change can reshuffle it.
+        invalidated = list(dict.fromkeys(c.name for c in previous_columns))
+        return new_columns, invalidated, generate_suggestions(new_columns, options)
+
+    invalidated = list(dict.fromkeys([*removed, *(c.name for c in modified), *(c.name for c in added)]))
+    previous_first = previous_columns[0].name if previous_columns else None
+    new_first = new_columns[0].name if new_columns else None
+    out = _SuggestionCollector(options)
+    suggestions = _run_rules(
+        out, new_columns,
+        focus=set(invalidated),
+        emit_total_records=new_first != previous_first or new_first in invalidated
+    )
+    return new_columns, invalidated, out.collect(suggestions)
+
+
+def merge_suggestions(previous: Dict[str, Any], invalidated_columns: List[str], added: Dict[str, Any]) -> Dict[str, Any]:
+    """Applies a generate_suggestions_for_delta() result to a previous generate_suggestions() result."""
+    invalidated = set(invalidated_columns)
+
+    def still_valid(suggestion) -> bool:
+        columns = getattr(suggestion, "columns_used", None) or getattr(suggestion, "columns_involved", [])
+        return invalidated.isdisjoint(columns)
+
+    merged = {key: [s for s in previous[key] if still_valid(s)] + added[key] for key in _SUGGESTION_LISTS}
+    if "wireframes" in previous or "wireframes" in added:
+        merged["wireframes"] = {**previous.get("wireframes", {}), **added.get("wireframes", {})}
+    return merged
+
+
+# --- SERIALIZATION ---
+def build_suggestion_output(
+    suggestions: Dict[str, Any], options: SuggestionOptions
+) -> Union[SuggestionOutput, CompactSuggestionOutput]:
+    """
+    Wraps a generate_suggestions() result in the output model selected by `options.wireframe_format`.
+    The suggestions were built as validated models already, so the wrapper is constructed without a
+    second validation pass.
+    """
+    output_model = CompactSuggestionOutput if options.wireframe_format == "reference" else SuggestionOutput
+    return output_model.model_construct(**suggestions)
+
+
+def generate_suggestions_json(columns: List[ColumnDefinition], options: Optional[SuggestionOptions] = None) -> bytes:
+    """
+    Generates suggestions and serializes them to JSON bytes in the response shape selected by
+    `options.wireframe_format`. Bytes are cheap to hand back from a worker process and to cache.
+    The suggestion records are encoded directly, without building pydantic models.
+    """
+    return generate_suggestions_json_with_stats(columns, options)[0]
+
+
+def generate_suggestions_json_with_stats(
+    columns: List[ColumnDefinition], options: Optional[SuggestionOptions] = None, attach_timings: bool = False
+) -> Tuple[bytes, List[Dict[str, Any]]]:
+    """
+    generate_suggestions_json() plus the per-rule statistics of the run (see _run_rules), returned as
+    plain data so they survive a trip back from a worker process. With `attach_timings`, the statistics
+    are also added to the JSON document as {"debug": {"rule_timings": [...]}}.
+    """
+    out = _SuggestionCollector(options or SuggestionOptions())
+    body = out.collect_json(_run_rules(out, columns))
+    if attach_timings:
+        body = body[:-1] + b',"debug":' + _encode_json({"rule_timings": out.rule_stats}) + b"}"
+    return body, out.rule_stats
+
+
+# Line prefixes per category for the NDJSON stream; the suggestion JSON and '}\n' complete each line.
+_NDJSON_PREFIXES = {
+    category: b'{"type":"' + category.encode() + b'","suggestion":'
+    for category in ("chart", "feature_engineering", "metric_card")
+}
+
+
+def iter_suggestions_ndjson(
+    columns: List[ColumnDefinition],
+    options: Optional[SuggestionOptions] = None,
+    attach_timings: bool = False,
+    on_complete: Optional[Callable[[List[Dict[str, Any]]], None]] = None
+) -> Iterator[bytes]:
+    """
+    Yields the suggestions as NDJSON lines, each as soon as its rule produces it:
+    {"type": "chart" | "feature_engineering" | "metric_card", "suggestion": {...}}.
+
+    With `options.wireframe_format="reference"`, a {"type": "wireframe_template", "template_id": ..., "svg": ...}
+    line precedes the first suggestion that uses each template. Nothing is accumulated besides the dedup keys.
+    Once every rule has run, `on_complete` receives the per-rule statistics, and with `attach_timings` a final
+    {"type": "debug", "rule_timings": [...]} line is sent.
+    """
+    out = _SuggestionCollector(options or SuggestionOptions())
+    templates = out.wireframes.templates
+    sent_templates = 0
+    for category, record in _run_rules(out, columns):
+        if len(templates) > sent_templates:
+            for template_id, svg in list(templates.items())[sent_templates:]:
+                yield _encode_json({"type": "wireframe_template", "template_id": template_id, "svg": svg}) + b"\n"
+            sent_templates = len(templates)
+        yield _NDJSON_PREFIXES[category] + _encode_json(record.to_dict()) + b"}\n"
+    if on_complete is not None:
+        on_complete(out.rule_stats)
+    if attach_timings:
+        yield _encode_json({"type": "debug", "rule_timings": out.rule_stats}) + b"\n"
@@ -0,0 +1,273 @@
+# benchmarks/bench_suggestion_engine.py
+"""
+Scalability benchmark for the suggestion engine.
+
+Generates synthetic schemas across column counts, type mixes and description lengths, and measures
+for each: generate_suggestions latency, peak traced allocations, the number of suggestions and the
+size of the serialized JSON response. Results are written as JSON; with --baseline they are compared
+against a stored run and regressions (including a worse growth exponent, i.e. a new quadratic
+blowup) make the command exit with status 1.
+
+    python -m benchmarks.bench_suggestion_engine --output results.json
+    python -m benchmarks.bench_suggestion_engine --baseline benchmarks/baseline.json
+"""
+import argparse
+import gc
+import json
+import math
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Collection, Dict, Iterator, List, Optional, Tuple
+
+from app.data_models import ColumnDefinition, SuggestionOptions
+from app.suggestion_engine import RULES_VERSION, generate_suggestions, generate_suggestions_json
+
+DEFAULT_SIZES = (10, 50, 200, 1000, 5000)
+
+# Share of each data type in a schema.
+TYPE_MIXES: Dict[str, Dict[str, float]] = {
+    "mixed": {"numerical": 0.3, "categorical": 0.3, "date": 0.1, "text": 0.15, "boolean": 0.15},
+    "numeric_heavy": {"numerical": 0.7, "categorical": 0.15, "date": 0.05, "text": 0.05, "boolean": 0.05},
+    "categorical_heavy": {"numerical": 0.1, "categorical": 0.7, "date": 0.05, "text": 0.1, "boolean": 0.05},
+}
+
+# Approximate number of words per column description.
+DESCRIPTION_LENGTHS: Dict[str, int] = {"short": 4, "long": 60}
+
+# Request options to benchmark. The chart and feature engineering rules pair columns up, so their output
+# grows quadratically with the schema; the metric card rules are linear and carry the largest sizes.
+PROFILES: Dict[str, SuggestionOptions] = {
+    "default": SuggestionOptions(),
+    "compact": SuggestionOptions(wireframe_format="reference", scatter_pair_budget=100),
+    "metrics": SuggestionOptions(categories=["metric_card"], wireframe_format="reference"),
+}
+
+# Column name stems and description phrases per data type, drawn from the vocabulary the rules react to
+# so the synthetic schemas trigger the same keyword rules as real ones.
+_VOCABULARY: Dict[str, List[Tuple[str, str]]] = {
+    "numerical": [
+        ("revenue", "total revenue amount"), ("price", "unit price"), ("quantity", "quantity of units sold"),
+        ("cost", "cost of goods"), ("score", "customer satisfaction score"), ("order_count", "count of orders"),
+        ("total_sales", "sum of sales"), ("duration", "skewed distribution of session length"),
+    ],
+    "categorical": [
+        ("region", "sales region"), ("segment", "customer segment"), ("channel", "acquisition channel"),
+        ("customer_id", "unique customer identifier"), ("product_category", "product category"),
+    ],
+    "date": [("order_date", "date the order was placed"), ("signup_date", "customer signup date")],
+    "text": [("review", "free text review"), ("notes", "support notes")],
+    "boolean": [("is_active", "whether the account is active"), ("has_discount", "discount applied flag")],
+}
+_FILLER = ("the", "value", "recorded", "for", "each", "record", "in", "source", "system", "as", "reported", "daily")
+
+_SUGGESTION_LISTS = ("chart_suggestions", "feature_engineering_suggestions", "metric_card_suggestions")
+
+
+def synthetic_schema(n_columns: int, mix: str, description_length: str, seed: int = 0) -> List[ColumnDefinition]:
+    """A deterministic schema of `n_columns` columns with the given type mix and description length."""
+    rng = random.Random(f"{seed}:{n_columns}:{mix}:{description_length}")
+    types = list(TYPE_MIXES[mix])
+    weights = list(TYPE_MIXES[mix].values())
+    words = DESCRIPTION_LENGTHS[description_length]
+    columns = []
+    for i in range(n_columns):
+        data_type = rng.choices(types, weights)[0]
+        stem, phrase = rng.choice(_VOCABULARY[data_type])
+        description = phrase.split()
+        description += rng.choices(_FILLER, k=max(0, words - len(description)))
+        columns.append(ColumnDefinition(name=f"{stem}_{i}", data_type=data_type, description=" ".join(description)))
+    return columns
+
+
+def measure(columns: List[ColumnDefinition], options: SuggestionOptions, repeats: int) -> Dict[str, Any]:
+    """
+    Latency (median and best of `repeats` warm runs), peak traced allocations, output count and JSON size.
+    Like timeit, the timed runs pause the garbage collector, whose collections would otherwise land in
+    random runs; best_ms is the steadiest figure and the one the comparison uses.
+    """
+    generate_suggestions(columns, options) # Warm the template and formula caches
+    timings = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            suggestions = generate_suggestions(columns, options)
+            timings.append((time.perf_counter() - start) * 1000)
+    finally:
+        gc.enable()
+
+    tracemalloc.start()
+    try:
+        generate_suggestions(columns, options)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "latency_ms": round(statistics.median(timings), 3),
+        "best_ms": round(min(timings), 3),
+        "peak_alloc_bytes": peak,
+        "suggestions": sum(len(suggestions.get(key, [])) for key in _SUGGESTION_LISTS),
+        "json_bytes": len(generate_suggestions_json(columns, options)),
+    }
+
+
+def scenario_key(profile: str, mix: str, description_length: str, n_columns: int) -> str:
+    return f"{profile}/{mix}/{description_length}/{n_columns}"
+
+
+def run_suite(
+    sizes=DEFAULT_SIZES,
+    mixes=tuple(TYPE_MIXES),
+    description_lengths=tuple(DESCRIPTION_LENGTHS),
+    profiles=tuple(PROFILES),
+    repeats: int = 3,
+    time_limit_s: float = 2.0,
+    always_measure: Collection[str] = (),
+    log=None,
+) -> Dict[str, Any]:
+    """
+    Runs every scenario and returns the results document. Within a profile/mix/description family the
+    sizes run in increasing order; a size is skipped when the previous one, scaled quadratically, would
+    take longer than `time_limit_s`, so the largest schemas only run where the engine can afford them.
+    Scenarios in `always_measure` (those a baseline measured) are never skipped, so that a run close to
+    the time limit does not flip between measured and skipped from one run to the next.
+    """
+    scenarios: Dict[str, Dict[str, Any]] = {}
+    for profile in profiles:
+        for mix in mixes:
+            for description_length in description_lengths:
+                previous: Optional[Tuple[int, float]] = None
+                for n_columns in sorted(sizes):
+                    key = scenario_key(profile, mix, description_length, n_columns)
+                    if previous is not None and key not in always_measure:
+                        projected_s = previous[1] / 1000 * (n_columns / previous[0]) ** 2
+                        if projected_s > time_limit_s:
+                            scenarios[key] = {"skipped": f"projected {projected_s:.0f}s exceeds the time limit"}
+                            if log:
+                                log(f"{key}: skipped")
+                            continue
+                    columns = synthetic_schema(n_columns, mix, description_length)
+                    result = measure(columns, PROFILES[profile], repeats)
+                    scenarios[key] = result
+                    previous = (n_columns, result["best_ms"])
+                    if log:
+                        log(f"{key}: {result['latency_ms']:.1f} ms, {result['suggestions']} suggestions, "
+                            f"{result['json_bytes']} bytes, peak {result['peak_alloc_bytes']} bytes")
+    return {
+        "rules_version": RULES_VERSION,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "repeats": repeats,
+        "scenarios": scenarios,
+    }
+
+
+def _growth_exponents(scenarios: Dict[str, Dict[str, Any]]) -> Iterator[Tuple[str, float]]:
+    """
+    For consecutive measured sizes of the same family, the exponent k in best latency ~ columns^k,
+    keyed by the larger scenario. Latencies below 1 ms are too noisy to fit and are ignored.
+    """
+    families: Dict[str, List[Tuple[int, float]]] = {}
+    for key, result in scenarios.items():
+        if "skipped" in result:
+            continue
+        family, n_columns = key.rsplit("/", 1)
+        families.setdefault(family, []).append((int(n_columns), result["best_ms"]))
+    for family, points in families.items():
+        points.sort()
+        for (n1, t1), (n2, t2) in zip(points, points[1:]):
+            if t1 >= 1.0 and t2 >= 1.0:
+                yield f"{family}/{n2}", math.log(t2 / t1) / math.log(n2 / n1)
+
+
+def compare_results(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    latency_tolerance: float = 1.5,
+    alloc_tolerance: float = 0.2,
+    output_tolerance: float = 0.1,
+    exponent_tolerance: float = 0.75,
+) -> List[str]:
+    """
+    Returns a description of every regression of `current` against `baseline`: best latency, peak allocations
+    or output size grown beyond their relative tolerance, or a latency growth exponent more than
+    `exponent_tolerance` above the baseline's. A scenario the baseline measured but `current` skipped
+    for the time limit is a regression too; scenarios missing from either run are not compared.
+    """
+    regressions = []
+    base_scenarios = baseline["scenarios"]
+    current_scenarios = current["scenarios"]
+    checks = (
+        ("best_ms", latency_tolerance, 1.0),
+        ("peak_alloc_bytes", alloc_tolerance, 64 * 1024),
+        ("suggestions", output_tolerance, 0),
+        ("json_bytes", output_tolerance, 0),
+    )
+    for key, result in current_scenarios.items():
+        base = base_scenarios.get(key)
+        if base is None or "skipped" in base:
+            continue
+        if "skipped" in result:
+            regressions.append(f"{key}: measured in the baseline but now skipped ({result['skipped']})")
+            continue
+        for metric, tolerance, min_delta in checks:
+            old, new = base[metric], result[metric]
+            # Small absolute changes are noise for timings and allocations, whatever the ratio.
+            if new > old * (1 + tolerance) and new - old > min_delta:
+                regressions.append(f"{key}: {metric} {old} -> {new} (+{(new / old - 1) * 100 if old else math.inf:.0f}%)")
+
+    base_exponents = dict(_growth_exponents(base_scenarios))
+    for key, exponent in _growth_exponents(current_scenarios):
+        old = base_exponents.get(key)
+        if old is not None and exponent > old + exponent_tolerance:
+            regressions.append(f"{key}: latency grows as columns^{exponent:.2f} (baseline columns^{old:.2f})")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the suggestion engine on synthetic schemas.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Column counts to run.")
+    parser.add_argument("--mixes", nargs="+", choices=list(TYPE_MIXES), default=list(TYPE_MIXES))
+    parser.add_argument("--descriptions", nargs="+", choices=list(DESCRIPTION_LENGTHS), default=list(DESCRIPTION_LENGTHS))
+    parser.add_argument("--profiles", nargs="+", choices=list(PROFILES), default=list(PROFILES))
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per scenario.")
+    parser.add_argument("--time-limit", type=float, default=2.0,
+                        help="Skip sizes projected to take longer than this many seconds per run.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", help="Compare against this results file; exit with status 1 on regressions.")
+    parser.add_argument("--latency-tolerance", type=float, default=1.5,
+                        help="Allowed relative increase of the best latency over the baseline.")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    measured = {key for key, result in baseline["scenarios"].items() if "skipped" not in result} if baseline else set()
+    results = run_suite(args.sizes, args.mixes, args.descriptions, args.profiles, args.repeats, args.time_limit,
+                        measured, log=lambda line: print(line, file=sys.stderr))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+    else:
+        print(json.dumps(results, indent=2, sort_keys=True))
+
+    if baseline is not None:
+        regressions = compare_results(baseline, results, latency_tolerance=args.latency_tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+        print("No regressions against the baseline.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
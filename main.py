@@ -1,22 +1,90 @@
 # main.py
+import json
 import logging # <--- NEW IMPORT
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
-from pydantic import BaseModel, Field
-from fastapi.responses import PlainTextResponse
+from typing import List, Optional, Literal, Union, get_args
+from pydantic import BaseModel, Field, TypeAdapter
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 
 # Import your application-specific modules
 from fastapi import File, UploadFile
 from typing import List # Ensure List is imported
-from app.suggestion_engine import generate_suggestions
-from app.data_models import ColumnDefinition, SuggestionOutput
+from app.suggestion_engine import (
+    generate_suggestions_json_with_stats, generate_suggestions_for_delta, iter_suggestions_ndjson, build_suggestion_output,
+    RULES_VERSION, RULE_IDS
+)
+from app.data_models import (
+    ColumnDefinition, SuggestionOutput, CompactSuggestionOutput, SuggestionOptions,
+    SuggestionCategory, FormulaTool, ColumnDelta, SuggestionDeltaOutput,
+    BatchSuggestionRequest, BatchSuggestionOutput, DatasetProfileOutput
+)
 from app import dataset_parser # Import the new parser module
+from app import column_profiler
+from app import config
+from app.executor import BoundedExecutor, ExecutorSaturatedError
+from app.batch import run_batch_item, batch_item_error
+from app.result_cache import ResultCache, SchemaStore, schema_fingerprint
+from app.rule_metrics import RuleMetrics
+
+# --- Suggestion Executor ---
+# generate_suggestions is CPU-bound; running it in a bounded pool keeps the event loop free for
+# health checks and uploads, and sheds load with 503 instead of queueing without limit.
+suggestion_executor = BoundedExecutor(
+    kind=config.SUGGESTION_EXECUTOR_KIND,
+    max_workers=config.SUGGESTION_EXECUTOR_WORKERS,
+    max_queue=config.SUGGESTION_QUEUE_SIZE
+)
+
+# Nightly jobs send thousands of schemas at once; they get their own process pool (sized to the cores)
+# so a batch cannot starve interactive requests.
+batch_executor = BoundedExecutor(
+    kind=config.BATCH_EXECUTOR_KIND,
+    max_workers=config.BATCH_WORKERS,
+    max_queue=config.BATCH_QUEUE_SIZE
+)
+
+# Upload parsing does blocking file reads and CPU-bound decoding; a small pool of its own caps how many
+# uploads are parsed at once and keeps them off the event loop and out of the suggestion workers.
+upload_executor = BoundedExecutor(
+    kind="thread",
+    max_workers=config.UPLOAD_WORKERS,
+    max_queue=config.UPLOAD_QUEUE_SIZE
+)
+
+# --- Rule Metrics ---
+# Per-rule time, candidates and emitted suggestions, summed over requests and served at /metrics.
+rule_metrics = RuleMetrics()
+
+# --- Rule Toggles ---
+_DEPLOYMENT_DISABLED_RULES = set(config.DISABLED_RULES) & set(RULE_IDS)
+for _rule_id in sorted(set(config.DISABLED_RULES) - set(RULE_IDS)):
+    logging.getLogger(__name__).warning(f"Ignoring unknown rule id in IVIZ_DISABLED_RULES: {_rule_id}")
+
+# --- Result Cache ---
+# Dashboards resend identical column lists; a hit returns the stored response bytes directly.
+result_cache = ResultCache(
+    max_bytes=config.RESULT_CACHE_MAX_BYTES,
+    ttl_seconds=config.RESULT_CACHE_TTL_SECONDS
+)
+
+# --- Schema Store ---
+# Recent column lists by schema id, so clients editing a schema can send only the changed columns.
+schema_store = SchemaStore(max_entries=config.SCHEMA_STORE_SIZE)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    suggestion_executor.shutdown()
+    batch_executor.shutdown()
+    upload_executor.shutdown()
 
 app = FastAPI(
     title="iviz API",
     description="API for intelligent data visualization suggestions and feature engineering ideas.",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # --- Logging Configuration ---
@@ -35,6 +103,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all HTTP methods (GET, POST, OPTIONS, etc.)
     allow_headers=["*"],  # Allows all headers (Content-Type, Authorization, etc.)
+    expose_headers=["ETag", "Retry-After", "X-Schema-Id"],  # Lets browser clients read these for conditional requests, backoff and deltas
 )
 
 # --- API Endpoints ---
@@ -55,8 +124,98 @@ app.add_middleware(
 #     return PlainTextResponse(status_code=200)
 
 
-@app.post("/generate-ideas/", response_model=SuggestionOutput)
-async def get_visualization_ideas(columns: List[ColumnDefinition]):
+def get_suggestion_options(
+    scatter_budget: Optional[int] = Query(
+        None, ge=0,
+        description="Maximum number of Scatter Plot suggestions. When set, only the most relevant numerical column pairs are kept."
+    ),
+    wireframe_format: Literal["inline", "reference"] = Query(
+        "inline",
+        description="'inline' embeds a full SVG in every suggestion. 'reference' returns a shared 'wireframes' "
+                    "template table and per-suggestion template references (CompactSuggestionOutput)."
+    ),
+    categories: Optional[List[SuggestionCategory]] = Query(
+        None, description="Suggestion categories to generate (repeat the parameter for several). Defaults to all."
+    ),
+    formula_tools: Optional[List[FormulaTool]] = Query(
+        None, description="Tools to generate formulas for (repeat the parameter for several). Defaults to all."
+    ),
+    include_wireframes: bool = Query(True, description="Set to false to skip wireframe generation entirely."),
+    disabled_rules: Optional[List[str]] = Query(
+        None, description="Ids of rules to skip (repeat the parameter for several), on top of the deployment's IVIZ_DISABLED_RULES."
+    )
+) -> SuggestionOptions:
+    """
+    Collects the request-level engine options from the query string.
+    """
+    unknown_rules = sorted(set(disabled_rules or []) - set(RULE_IDS))
+    if unknown_rules:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown rule id(s): {', '.join(unknown_rules)}. Known rules: {', '.join(RULE_IDS)}."
+        )
+    options = SuggestionOptions(
+        scatter_pair_budget=scatter_budget,
+        wireframe_format=wireframe_format,
+        include_wireframes=include_wireframes
+    )
+    # Canonical order (declaration order, without repeats) and sorted rule ids, so the same selection
+    # always gives the same cache key and ETag however the query lists it
+    if categories is not None:
+        options.categories = [category for category in get_args(SuggestionCategory) if category in categories]
+    if formula_tools is not None:
+        options.formula_tools = [tool for tool in get_args(FormulaTool) if tool in formula_tools]
+    options.disabled_rules = sorted(set(disabled_rules or []) | _DEPLOYMENT_DISABLED_RULES)
+    return options
+
+
+def _suggestions_etag(fingerprint: str) -> str:
+    """Strong ETag for a /generate-ideas/ response: the request's content address plus the rules version."""
+    return f'"{RULES_VERSION}-{fingerprint}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    If-None-Match comparison: '*' or any listed tag equal to ours, ignoring weak prefixes.
+    A match answers 304 even though /generate-ideas/ is a POST. RFC 9110 (13.1.2) would require 412 there,
+    but this endpoint is a read-only query that takes its input as a body, so it deliberately behaves like
+    a conditional GET for polling clients.
+    """
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def _executor_busy(endpoint: str, error: ExecutorSaturatedError, activity: str = "generating suggestions") -> HTTPException:
+    logger.warning(f"Rejecting {endpoint} request, executor is saturated: {error}")
+    return HTTPException(
+        status_code=503,
+        detail=f"Server is busy {activity}. Please retry shortly.",
+        headers={"Retry-After": str(config.RETRY_AFTER_SECONDS)}
+    )
+
+
+async def _prepend(first, rest):
+    """Re-attaches an item that was pulled early (to pick the status code) to the rest of its stream."""
+    yield first
+    async for item in rest:
+        yield item
+
+
+_DEBUG_QUERY = Query(
+    None,
+    description="'timings' adds a per-rule breakdown (time, candidates, emitted) to the response under 'debug'."
+)
+
+
+@app.post("/generate-ideas/", response_model=Union[SuggestionOutput, CompactSuggestionOutput])
+async def get_visualization_ideas(
+    columns: List[ColumnDefinition],
+    options: SuggestionOptions = Depends(get_suggestion_options),
+    if_none_match: Optional[str] = Header(None),
+    debug: Optional[Literal["timings"]] = _DEBUG_QUERY
+):
     """
     Generates data visualization and feature engineering ideas based on provided column definitions.
     """
@@ -67,21 +226,184 @@ async def get_visualization_ideas(columns: List[ColumnDefinition]):
         logger.warning("Request to /generate-ideas/ received with no columns.")
         raise HTTPException(status_code=400, detail="No columns provided in the request body.")
     
+    cache_key = schema_fingerprint(columns, options)
+    schema_store.put(cache_key, columns, options)
+    if debug == "timings":
+        # A per-request breakdown: always computed fresh, never cached and without an ETag
+        body = await _generate_body(columns, options, attach_timings=True)
+        return Response(content=body, media_type="application/json", headers={"X-Schema-Id": cache_key})
+
+    etag_headers = {"ETag": _suggestions_etag(cache_key), "X-Schema-Id": cache_key}
+    # Pollers with unchanged columns get a bodiless 304 before any suggestion work happens (a local
+    # convention for this read-only POST; see _etag_matches)
+    if _etag_matches(if_none_match, etag_headers["ETag"]):
+        return Response(status_code=304, headers=etag_headers)
+
+    cached_body = result_cache.get(cache_key)
+    if cached_body is not None:
+        logger.info(f"Serving /generate-ideas/ from the result cache ({len(cached_body)} bytes).")
+        return Response(content=cached_body, media_type="application/json", headers=etag_headers)
+
+    body = await _generate_body(columns, options, attach_timings=False)
+    result_cache.put(cache_key, body)
+    return Response(content=body, media_type="application/json", headers=etag_headers)
+
+
+async def _generate_body(columns: List[ColumnDefinition], options: SuggestionOptions, attach_timings: bool) -> bytes:
+    """Runs the engine in the suggestion executor and adds its per-rule statistics to rule_metrics."""
     try:
-        suggestions_dict = generate_suggestions(columns)
-        logger.info(f"Successfully generated {len(suggestions_dict['chart_suggestions'])} chart suggestions, "
-                    f"{len(suggestions_dict['feature_engineering_suggestions'])} FE suggestions, "
-                    f"and {len(suggestions_dict['metric_card_suggestions'])} metric card suggestions.")
-        return suggestions_dict # FastAPI will convert this dict to SuggestionOutput
+        body, rule_stats = await suggestion_executor.run(
+            generate_suggestions_json_with_stats, columns, options, attach_timings
+        )
+        logger.info(f"Successfully generated suggestions ({len(body)} bytes).")
+        rule_metrics.record(rule_stats)
+        return body
+    except ExecutorSaturatedError as e:
+        raise _executor_busy("/generate-ideas/", e)
     except Exception as e:
         logger.error(f"Error during suggestion generation: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="An internal error occurred while generating suggestions.")
 
+
+@app.post("/generate-ideas/stream")
+async def stream_visualization_ideas(
+    columns: List[ColumnDefinition],
+    options: SuggestionOptions = Depends(get_suggestion_options),
+    debug: Optional[Literal["timings"]] = _DEBUG_QUERY
+):
+    """
+    Streams suggestions as NDJSON (application/x-ndjson), one suggestion per line, as soon as each rule
+    produces it. Accepts the same body and query parameters as /generate-ideas/.
+    """
+    logger.info(f"Received request for /generate-ideas/stream with {len(columns)} column(s).")
+    if not columns:
+        raise HTTPException(status_code=400, detail="No columns provided in the request body.")
+
+    lines = iter_suggestions_ndjson(columns, options, attach_timings=debug == "timings", on_complete=rule_metrics.record)
+    chunks = suggestion_executor.stream(lines)
+    # Pull the first chunk before committing to a 200, so saturation and early failures get a proper status
+    try:
+        first_chunk = await anext(chunks, b"")
+    except ExecutorSaturatedError as e:
+        raise _executor_busy("/generate-ideas/stream", e)
+    except Exception as e:
+        logger.error(f"Error during suggestion streaming: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An internal error occurred while generating suggestions.")
+
+    return StreamingResponse(_prepend(first_chunk, chunks), media_type="application/x-ndjson")
+
+
+@app.post("/generate-ideas/batch", response_model=BatchSuggestionOutput)
+async def get_visualization_ideas_batch(
+    batch: BatchSuggestionRequest,
+    options: SuggestionOptions = Depends(get_suggestion_options),
+    stream: bool = Query(
+        False,
+        description="Stream NDJSON lines ({\"name\": ..., \"status\": ...}) in completion order instead of one document."
+    )
+):
+    """
+    Generates suggestions for many named column lists in one request, spread over a process pool.
+    A schema that fails validation or generation gets a status 'error' entry instead of failing the batch.
+    """
+    logger.info(f"Received request for /generate-ideas/batch with {len(batch.schemas)} schema(s).")
+    if not batch.schemas:
+        raise HTTPException(status_code=400, detail="No schemas provided in the request body.")
+    if len(batch.schemas) > config.BATCH_MAX_SCHEMAS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many schemas in one batch ({len(batch.schemas)}); the limit is {config.BATCH_MAX_SCHEMAS}."
+        )
+
+    names = list(batch.schemas)
+    results = batch_executor.map_unordered(run_batch_item, [(batch.schemas[name], options) for name in names])
+
+    async def items():
+        # (index, item JSON bytes) as schemas finish; pool-level failures become error entries too
+        async for index, outcome in results:
+            if isinstance(outcome, Exception):
+                logger.error(f"Batch item '{names[index]}' failed in the worker pool: {outcome!r}")
+                outcome = batch_item_error("Suggestion generation failed in the worker pool.")
+            yield index, outcome
+
+    item_stream = items()
+    # Start the batch before committing to a 200, so a saturated pool still gets a 503
+    try:
+        first = await anext(item_stream)
+    except ExecutorSaturatedError as e:
+        raise _executor_busy("/generate-ideas/batch", e)
+
+    if stream:
+        async def lines():
+            async for index, item in _prepend(first, item_stream):
+                # Item objects always start with '{'; splice the name in as the first field
+                yield b'{"name":' + json.dumps(names[index]).encode("utf-8") + b"," + item[1:] + b"\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    ordered: List[bytes] = [b""] * len(names)
+    async for index, item in _prepend(first, item_stream):
+        ordered[index] = item
+    body = b'{"results":{' + b",".join(
+        json.dumps(name).encode("utf-8") + b":" + item for name, item in zip(names, ordered)
+    ) + b"}}"
+    logger.info(f"Finished batch of {len(names)} schema(s) ({len(body)} bytes).")
+    return Response(content=body, media_type="application/json")
+
+
+_DELTA_OUTPUT = TypeAdapter(SuggestionDeltaOutput)
+
+
+@app.post("/generate-ideas/delta", response_model=SuggestionDeltaOutput)
+async def get_visualization_ideas_delta(delta: ColumnDelta):
+    """
+    Re-evaluates only the rules touching added, removed or modified columns of a schema previously sent
+    to /generate-ideas/ (identified by its X-Schema-Id) and returns the suggestions to replace.
+    """
+    logger.info(
+        f"Received /generate-ideas/delta request: {len(delta.added)} added, "
+        f"{len(delta.removed)} removed, {len(delta.modified)} modified column(s)."
+    )
+    previous = schema_store.get(delta.schema_id)
+    if previous is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Unknown or expired schema_id. Send the full column list to /generate-ideas/ again."
+        )
+    previous_columns, options = previous
+
+    try:
+        new_columns, invalidated_columns, suggestions = await suggestion_executor.run(
+            generate_suggestions_for_delta, previous_columns, delta.added, delta.removed, delta.modified, options
+        )
+    except ValueError as ve: # Delta does not apply to the stored schema
+        raise HTTPException(status_code=400, detail=str(ve))
+    except ExecutorSaturatedError as e:
+        raise _executor_busy("/generate-ideas/delta", e)
+    except Exception as e:
+        logger.error(f"Error during incremental suggestion generation: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An internal error occurred while generating suggestions.")
+
+    schema_id = schema_fingerprint(new_columns, options)
+    schema_store.put(schema_id, new_columns, options)
+    # Built from already-validated suggestions and returned as bytes, skipping response_model re-validation
+    output = SuggestionDeltaOutput.model_construct(
+        schema_id=schema_id,
+        invalidated_columns=invalidated_columns,
+        suggestions=build_suggestion_output(suggestions, options)
+    )
+    return Response(content=_DELTA_OUTPUT.dump_json(output), media_type="application/json")
+
 # --- New Endpoint for Dataset Upload ---
 @app.post("/upload-dataset/")
-async def handle_dataset_upload(dataset: UploadFile = File(...)):
+async def handle_dataset_upload(
+    dataset: UploadFile = File(...),
+    profile: bool = Query(
+        False, description="Also stream the whole file and return per-column statistics (DatasetProfileOutput)."
+    )
+):
     """
     Accepts a dataset file (CSV or Excel), parses it to infer column definitions.
+    With profile=true, returns {"columns": [...], "profiles": [...]} instead of the bare column list.
     """
     if not dataset:
         logger.warning("Upload dataset request received with no file.")
@@ -104,19 +426,18 @@ async def handle_dataset_upload(dataset: UploadFile = File(...)):
             detail=f"Invalid file type: {dataset.content_type}. Please upload a CSV or Excel file."
         )
 
-    # Placeholder for parsing logic (to be implemented in next steps)
-    # For now, just acknowledge receipt and filename.
-    # In a real scenario, here you would:
-    # 1. Read dataset.file (it's a SpooledTemporaryFile)
-    # 2. Call a parsing function (e.g., from app.dataset_parser)
-    # 3. Return the list of ColumnDefinition objects
-
     try:
-        # The file pointer of dataset.file might need to be reset if read multiple times,
-        # but for a single pass to the parser, it should be fine.
-        # dataset.file is a SpooledTemporaryFile.
-        inferred_columns = await dataset_parser.parse_file_to_column_definitions(
-            dataset.file, dataset.filename, dataset.content_type
+        # dataset.file is a SpooledTemporaryFile (on disk for large uploads). The parser reads it only as
+        # far as the sample, the profiler in chunks to the end; both read synchronously, so they run in
+        # the upload pool, off the event loop.
+        if profile:
+            inferred_columns, profiles = await upload_executor.run(
+                column_profiler.profile_file, dataset.file, dataset.filename, dataset.content_type
+            )
+            logger.info(f"Profiled {len(profiles)} columns of {filename}.")
+            return DatasetProfileOutput(columns=inferred_columns, profiles=profiles)
+        inferred_columns = await upload_executor.run(
+            dataset_parser.parse_file_to_column_definitions, dataset.file, dataset.filename, dataset.content_type
         )
         logger.info(f"Successfully parsed {filename}, inferred {len(inferred_columns)} columns.")
         if not inferred_columns:
@@ -124,6 +445,8 @@ async def handle_dataset_upload(dataset: UploadFile = File(...)):
             # Return empty list, frontend can handle this. Or raise HTTPException.
             # For now, let's allow empty list to be returned.
         return inferred_columns
+    except ExecutorSaturatedError as e:
+        raise _executor_busy("/upload-dataset/", e, activity="parsing uploads")
     except ValueError as ve: # Catch parsing errors from our parser
         logger.error(f"Parsing error for {filename}: {ve}", exc_info=True)
         raise HTTPException(status_code=400, detail=str(ve))
@@ -132,6 +455,16 @@ async def handle_dataset_upload(dataset: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred while processing the file: {e}")
 
 
+# --- Metrics ---
+@app.get("/metrics")
+async def get_metrics():
+    """
+    In-process counters: result cache hits, misses and evictions, and per-rule totals (runs, time,
+    candidates evaluated and suggestions emitted) for /generate-ideas/ and /generate-ideas/stream.
+    """
+    return {"result_cache": result_cache.stats(), "rules": rule_metrics.snapshot()}
+
+
 # --- Example of a simple health check endpoint ---
 @app.get("/")
 async def root():
@@ -0,0 +1,25 @@
+import json
+import unittest
+from app.batch import run_batch_item
+from app.data_models import SuggestionOptions, SuggestionOutput
+
+class TestBatchItem(unittest.TestCase):
+
+    def test_valid_schema_returns_suggestions(self):
+        """Test that a valid column list yields an 'ok' item wrapping the normal suggestion output."""
+        columns = [{"name": "Sales", "data_type": "numerical", "description": "Total sales amount"}]
+        item = json.loads(run_batch_item(columns, SuggestionOptions()))
+        self.assertEqual(item["status"], "ok")
+        SuggestionOutput(**item["result"])
+
+    def test_invalid_schemas_become_error_items(self):
+        """Test that malformed or empty column lists yield error items instead of raising."""
+        for raw_columns in ([{"name": "Sales", "data_type": "money", "description": "Sales"}], "not a list", []):
+            with self.subTest(raw_columns=raw_columns):
+                item = json.loads(run_batch_item(raw_columns, SuggestionOptions()))
+                self.assertEqual(item["status"], "error")
+                self.assertTrue(item["error"])
+
+
+if __name__ == '__main__':
+    unittest.main()
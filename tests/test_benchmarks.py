@@ -0,0 +1,59 @@
+import unittest
+from benchmarks.bench_suggestion_engine import compare_results, run_suite, synthetic_schema
+
+def _results(latencies, **overrides):
+    scenarios = {}
+    for n_columns, latency in latencies.items():
+        result = {"latency_ms": latency, "best_ms": latency, "peak_alloc_bytes": 1000, "suggestions": 10, "json_bytes": 5000}
+        result.update(overrides)
+        scenarios[f"metrics/mixed/short/{n_columns}"] = result
+    return {"scenarios": scenarios}
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_synthetic_schema_is_deterministic(self):
+        """Test that a scenario always benchmarks the same schema, with the requested size and type mix."""
+        columns = synthetic_schema(200, "numeric_heavy", "long")
+        self.assertEqual(columns, synthetic_schema(200, "numeric_heavy", "long"))
+        self.assertEqual(len(columns), 200)
+        numerical = sum(column.data_type == "numerical" for column in columns)
+        self.assertGreater(numerical, 100)
+        self.assertGreaterEqual(len(columns[0].description.split()), 50)
+
+    def test_run_suite_skips_sizes_over_the_time_limit(self):
+        """Test that sizes projected past the time limit are recorded as skipped instead of run."""
+        results = run_suite(sizes=(10, 100000), mixes=("mixed",), description_lengths=("short",),
+                            profiles=("metrics",), repeats=1, time_limit_s=0.001)
+        measured = results["scenarios"]["metrics/mixed/short/10"]
+        self.assertGreater(measured["suggestions"], 0)
+        self.assertGreater(measured["json_bytes"], 0)
+        self.assertIn("skipped", results["scenarios"]["metrics/mixed/short/100000"])
+
+        # Sizes a baseline measured are run whatever the projection says
+        results = run_suite(sizes=(10, 20), mixes=("mixed",), description_lengths=("short",), profiles=("metrics",),
+                            repeats=1, time_limit_s=0.0, always_measure={"metrics/mixed/short/20"})
+        self.assertNotIn("skipped", results["scenarios"]["metrics/mixed/short/20"])
+
+    def test_compare_flags_regressions_and_quadratic_growth(self):
+        """Test that growth beyond the tolerances and a steeper scaling exponent are reported."""
+        baseline = _results({100: 10.0, 1000: 100.0})
+        self.assertEqual(compare_results(baseline, _results({100: 12.0, 1000: 110.0})), [])
+        # Only the best run counts; a slow median is noise from other load on the machine
+        self.assertEqual(compare_results(baseline, _results({100: 10.0, 1000: 100.0}, latency_ms=500.0)), [])
+
+        quadratic = compare_results(baseline, _results({100: 10.0, 1000: 1000.0}))
+        self.assertTrue(any("best_ms" in regression for regression in quadratic))
+        self.assertTrue(any("columns^2.00" in regression for regression in quadratic))
+
+        bigger = compare_results(baseline, _results({100: 10.0, 1000: 100.0}, json_bytes=9000))
+        self.assertEqual(len(bigger), 2)
+
+        skipped = _results({100: 10.0})
+        skipped["scenarios"]["metrics/mixed/short/1000"] = {"skipped": "projected 3s exceeds the time limit"}
+        self.assertEqual(compare_results(baseline, skipped),
+                         ["metrics/mixed/short/1000: measured in the baseline but now skipped (projected 3s exceeds the time limit)"])
+        self.assertEqual(compare_results(baseline, _results({100: 10.0})), []) # Not run at all, e.g. --sizes 100
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import io
+import random
+import unittest
+from unittest import mock
+import numpy as np
+import openpyxl
+import pandas as pd
+from app.column_profiler import HyperLogLog, SpaceSaving, ColumnSummary, profile_file
+
+class TestColumnProfiler(unittest.TestCase):
+
+    def test_hyperloglog_estimates_distinct_count(self):
+        """Test that the distinct estimate stays within a few percent, and exact-ish for small counts."""
+        for distinct in (10, 1000, 100000):
+            with self.subTest(distinct=distinct):
+                sketch = HyperLogLog()
+                values = pd.Series([f"value-{i % distinct}" for i in range(2 * distinct)])
+                for start in range(0, len(values), distinct // 2):
+                    chunk = values[start:start + distinct // 2]
+                    sketch.add_hashes(pd.util.hash_pandas_object(chunk, index=False).to_numpy())
+                self.assertAlmostEqual(sketch.count() / distinct, 1.0, delta=0.05)
+
+    def test_space_saving_keeps_heavy_hitters(self):
+        """Test that dominant values are reported with their counts and uniform noise is not."""
+        rng = random.Random(0)
+        values = ["a"] * 3000 + ["b"] * 1500 + [f"noise-{rng.randrange(100000)}" for _ in range(5000)]
+        rng.shuffle(values)
+        summary = SpaceSaving(capacity=16)
+        for start in range(0, len(values), 1000):
+            summary.add_counts(pd.Series(values[start:start + 1000]).value_counts())
+        top = summary.top(5)
+        self.assertEqual([value for value, _ in top], ["a", "b"])
+        self.assertGreaterEqual(top[0][1], 3000) # Counts are upper bounds
+
+    def test_running_moments_match_whole_column(self):
+        """Test that chunked mean/variance/min/max equal the statistics of the whole column."""
+        numbers = np.random.default_rng(0).normal(1e6, 3.0, 10000)
+        summary = ColumnSummary("x", numeric=True)
+        for chunk in np.array_split(numbers, 7):
+            summary.update(pd.Series([repr(float(n)) for n in chunk] + ["NA"], dtype=object))
+        profile = summary.to_profile()
+        self.assertEqual((profile.row_count, profile.null_count), (10007, 7))
+        self.assertAlmostEqual(profile.mean, numbers.mean(), places=6)
+        self.assertAlmostEqual(profile.variance, numbers.var(ddof=1), places=6)
+        self.assertAlmostEqual(profile.min, numbers.min(), places=6)
+        self.assertAlmostEqual(profile.max, numbers.max(), places=6)
+
+    def test_profile_csv_and_excel(self):
+        """Test that both file types are streamed to the end and profiled per inferred column."""
+        rows = [["Region", "", "Sales"]] + [["north" if i % 3 else "south", "x", i] for i in range(1, 301)]
+        csv_data = "\n".join(",".join(str(cell) for cell in row) for row in rows).encode("utf-8")
+        workbook = openpyxl.Workbook()
+        for row in rows:
+            workbook.active.append([cell if cell != "" else None for cell in row])
+        xlsx_data = io.BytesIO()
+        workbook.save(xlsx_data)
+
+        for file_io, content_type in (
+            (io.BytesIO(csv_data), "text/csv"),
+            (io.BytesIO(xlsx_data.getvalue()), "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+        ):
+            with self.subTest(content_type=content_type):
+                columns, profiles = profile_file(file_io, "sales", content_type, chunk_rows=64)
+                self.assertEqual([column.name for column in columns], ["Region", "Sales"])
+                region, sales = profiles
+                self.assertEqual((region.row_count, region.distinct_count), (300, 2))
+                self.assertEqual([(top.value, top.count) for top in region.top_values], [("north", 200), ("south", 100)])
+                self.assertIsNone(region.mean)
+                self.assertEqual((sales.min, sales.max, sales.mean), (1.0, 300.0, 150.5))
+
+    def test_profile_failure_is_logged_and_chained(self):
+        """Test that profiling errors are logged and raised as ValueError keeping the original cause."""
+        with mock.patch("app.column_profiler.ColumnSummary.update", side_effect=RuntimeError("boom")):
+            with self.assertLogs("app.column_profiler", level="ERROR"), self.assertRaises(ValueError) as raised:
+                profile_file(io.BytesIO(b"Sales\n1\n2\n"), "sales.csv", "text/csv")
+        self.assertIsInstance(raised.exception.__cause__, RuntimeError)
+
+
+if __name__ == '__main__':
+    unittest.main()
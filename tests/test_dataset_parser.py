@@ -0,0 +1,137 @@
+import datetime
+import io
+import unittest
+import openpyxl
+import pandas as pd
+from app.dataset_parser import (
+    SAMPLE_ROWS, _infer_data_type, _read_csv_head, _read_excel_head, parse_csv_to_column_definitions,
+    parse_excel_to_column_definitions
+)
+
+class EndlessCsv(io.RawIOBase):
+    """A CSV stream that never ends, counting the bytes handed out."""
+
+    def __init__(self, header: bytes, row: bytes):
+        self.pending = header
+        self.row = row
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while len(self.pending) < len(buffer):
+            self.pending += self.row
+        n = len(buffer)
+        buffer[:n] = self.pending[:n]
+        self.pending = self.pending[n:]
+        self.bytes_read += n
+        return n
+
+def _xlsx(rows) -> io.BytesIO:
+    workbook = openpyxl.Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    data = io.BytesIO()
+    workbook.save(data)
+    data.seek(0)
+    return data
+
+class TestDatasetParser(unittest.TestCase):
+
+    def test_csv_header_with_bom_dialect_and_quoted_newline(self):
+        """Test that the header is decoded, its dialect sniffed and multi-line quoted names kept."""
+        data = '﻿Order ID;"Unit\nPrice";Notes\n1;2.5;x\n\n3;4.0;y\n'.encode('utf-8')
+        headers, rows = _read_csv_head(io.BytesIO(data))
+        self.assertEqual(headers, ["Order ID", "Unit\nPrice", "Notes"])
+        self.assertEqual(rows, [["1", "2.5", "x"], ["3", "4.0", "y"]]) # Blank lines are skipped
+        self.assertEqual(_read_csv_head(io.BytesIO(b"Sales\n10\n")), (["Sales"], [["10"]]))
+        self.assertEqual(_read_csv_head(io.BytesIO(b"")), ([], []))
+
+    def test_csv_reads_only_header_and_sample(self):
+        """Test that parsing stops after the bounded sample, however large the file is."""
+        stream = EndlessCsv(b"id,amount,region\n", b"12345,67.89,north\n")
+        file_io = io.BufferedReader(stream)
+        headers, rows = _read_csv_head(file_io)
+        self.assertEqual(headers, ["id", "amount", "region"])
+        self.assertEqual(len(rows), SAMPLE_ROWS)
+        self.assertLess(stream.bytes_read, 64 * 1024)
+        self.assertFalse(file_io.closed) # The caller still owns the upload
+
+        columns = parse_csv_to_column_definitions(io.BufferedReader(EndlessCsv(b"id,amount\n", b"1,2\n")), "big.csv")
+        self.assertEqual([column.name for column in columns], ["id", "amount"])
+
+    def test_csv_invalid_encoding_raises_value_error(self):
+        """Test that undecodable uploads surface as ValueError (a 400 from the endpoint)."""
+        with self.assertRaises(ValueError):
+            parse_csv_to_column_definitions(io.BytesIO(b"\xff\xfe\x00bad,header\n"), "bad.csv")
+
+    def test_excel_header_and_typed_sample(self):
+        """Test that the first sheet's header and a bounded sample of typed rows are read."""
+        rows = [["Order ID", None, "Order Date"]]
+        rows += [[i, 2.5 * i, datetime.datetime(2024, 1, 1)] for i in range(SAMPLE_ROWS + 50)]
+        headers, sample = _read_excel_head(_xlsx(rows))
+        self.assertEqual(headers, ["Order ID", None, "Order Date"])
+        self.assertEqual(len(sample), SAMPLE_ROWS)
+        self.assertEqual(sample[1], [1, 2.5, datetime.datetime(2024, 1, 1)])
+
+        columns = parse_excel_to_column_definitions(_xlsx(rows), "orders.xlsx")
+        self.assertEqual([column.name for column in columns], ["Order ID", "Order Date"]) # Blank headers are skipped
+        self.assertEqual([column.data_type for column in columns], ["categorical", "date"])
+
+    def test_excel_header_only_sheet(self):
+        """Test that a sheet with a header and no data rows still yields its columns."""
+        columns = parse_excel_to_column_definitions(_xlsx([["Sales", "Region"]]), "empty.xlsx")
+        self.assertEqual([column.name for column in columns], ["Sales", "Region"])
+
+    def test_excel_invalid_file_raises_value_error(self):
+        """Test that a file that is neither .xlsx nor .xls surfaces as ValueError."""
+        with self.assertRaises(ValueError):
+            parse_excel_to_column_definitions(io.BytesIO(b"not a workbook"), "bad.xlsx")
+
+    def test_infer_types_from_sampled_values(self):
+        """Test the boolean, numerical, date, categorical and text checks on sampled values."""
+        cases = [
+            ("Active", ["yes", "no", "Yes", ""], "boolean"),
+            ("Churned", ["0", "1", "1"], "boolean"),
+            ("A", ["1"], "numerical"), # A single value is not a true/false pair
+            ("Quantity", ["1", "1", "1"], "numerical"),
+            ("Items", ["0", "1", "2"], "numerical"),
+            ("Returned", ["yes", "y"], "categorical"), # Tokens from two different pairs
+            ("is_active", ["1", "1"], "boolean"), # Flag headers settle single-valued samples
+            ("promo_flag", ["no"], "boolean"),
+            ("Revenue", ["$1,200.50", "300", " 4.5 ", "n/a"], "numerical"),
+            ("Amount", [1, 2.5, None], "numerical"), # Native Excel numbers
+            ("Order ID", ["1001", "1002", "1003"], "categorical"), # Numeric identifiers are labels
+            ("Shipped", ["2024-01-05", "2024-02-10", "null"], "date"),
+            ("Region", ["north", "south"] * 20, "categorical"),
+            ("Email", [f"user{i}@example.com" for i in range(40)], "text"), # Short, but all distinct
+            ("Review", ["Arrived quickly and works as described"] * 3, "text"),
+        ]
+        for header, values, expected in cases:
+            with self.subTest(header=header):
+                self.assertEqual(_infer_data_type(header, pd.Series(values, dtype=object)), expected)
+
+    def test_infer_type_from_header_without_values(self):
+        """Test that columns with no sampled values fall back to whole-word header hints."""
+        empty = pd.Series([None, ""], dtype=object)
+        self.assertEqual(_infer_data_type("CustomerID", empty), "categorical")
+        self.assertEqual(_infer_data_type("paid_amount", empty), "text") # "id" inside a word is not an identifier
+        self.assertEqual(_infer_data_type("signup_date", empty), "date")
+
+    def test_single_row_numeric_csv_is_numerical(self):
+        """Test that a one-row sample of small integers is not mistaken for booleans."""
+        columns = parse_csv_to_column_definitions(io.BytesIO(b"A,B\n1,2\n"), "ab.csv")
+        self.assertEqual([column.data_type for column in columns], ["numerical", "numerical"])
+
+    def test_csv_columns_typed_from_sample(self):
+        """Test that uploaded columns get types from their values rather than their names."""
+        data = b"Order ID,Sales,Order Date,Notes\n" + b"".join(
+            f"{i},{i * 2.5},2024-03-{i % 28 + 1:02d},\n".encode() for i in range(30)
+        )
+        columns = parse_csv_to_column_definitions(io.BytesIO(data), "orders.csv")
+        self.assertEqual([column.data_type for column in columns], ["categorical", "numerical", "date", "text"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import threading
+import time
+import unittest
+from concurrent.futures import BrokenExecutor
+from app.executor import BoundedExecutor, ExecutorSaturatedError
+
+class TestBoundedExecutor(unittest.IsolatedAsyncioTestCase):
+
+    async def test_runs_call_in_pool(self):
+        """Test that calls run in a worker thread, not on the event loop thread."""
+        executor = BoundedExecutor(kind="thread", max_workers=1, max_queue=0)
+        try:
+            worker_thread = await executor.run(threading.get_ident)
+            self.assertNotEqual(worker_thread, threading.get_ident())
+            self.assertEqual(executor.in_flight, 0)
+        finally:
+            executor.shutdown()
+
+    async def test_rejects_when_workers_and_queue_are_full(self):
+        """Test that calls beyond workers + queue fail fast with ExecutorSaturatedError."""
+        executor = BoundedExecutor(kind="thread", max_workers=1, max_queue=1)
+        release = threading.Event()
+        try:
+            running = [asyncio.ensure_future(executor.run(release.wait, 5)) for _ in range(2)]
+            await asyncio.sleep(0)
+            self.assertEqual(executor.in_flight, 2)
+            with self.assertRaises(ExecutorSaturatedError):
+                await executor.run(release.wait, 5)
+            release.set()
+            self.assertEqual(await asyncio.gather(*running), [True, True])
+            self.assertEqual(executor.in_flight, 0)
+        finally:
+            release.set()
+            executor.shutdown()
+
+    async def test_stream_batches_items_off_the_event_loop(self):
+        """Test that streams yield growing batches from a worker thread and release their slot."""
+        executor = BoundedExecutor(kind="thread", max_workers=1, max_queue=0)
+        loop_thread = threading.get_ident()
+        threads = set()
+
+        def items():
+            for i in range(10):
+                threads.add(threading.get_ident())
+                yield b"%d," % i
+        try:
+            chunks = [chunk async for chunk in executor.stream(items(), max_batch=4)]
+            self.assertEqual(chunks, [b"0,", b"1,2,", b"3,4,5,6,", b"7,8,9,"])
+            self.assertNotIn(loop_thread, threads)
+            self.assertEqual(executor.in_flight, 0)
+
+            blocker = asyncio.ensure_future(executor.run(time.sleep, 0.2))
+            await asyncio.sleep(0)
+            with self.assertRaises(ExecutorSaturatedError):
+                await anext(executor.stream(items()))
+            await blocker
+        finally:
+            executor.shutdown()
+
+    async def test_run_replaces_a_broken_process_pool(self):
+        """Test that a worker process dying fails its own call only, not every call after it."""
+        executor = BoundedExecutor(kind="process", max_workers=1, max_queue=0)
+        try:
+            with self.assertRaises(BrokenExecutor):
+                await executor.run(os._exit, 1)
+            self.assertNotEqual(await executor.run(os.getpid), os.getpid())
+            self.assertEqual(executor.in_flight, 0)
+        finally:
+            executor.shutdown()
+
+    async def test_map_unordered_isolates_failures(self):
+        """Test that a batch map yields every result by index and reports failures per item."""
+        executor = BoundedExecutor(kind="thread", max_workers=2, max_queue=0)
+        try:
+            outcomes = dict([item async for item in executor.map_unordered(int, [("1",), ("x",), ("3",)])])
+            self.assertEqual(outcomes[0], 1)
+            self.assertIsInstance(outcomes[1], ValueError)
+            self.assertEqual(outcomes[2], 3)
+            self.assertEqual(executor.in_flight, 0)
+        finally:
+            executor.shutdown()
+
+    def test_unknown_kind(self):
+        """Test that only thread and process pools are accepted."""
+        with self.assertRaises(ValueError):
+            BoundedExecutor(kind="fiber")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+from app.keyword_matcher import KeywordMatcher
+
+class TestKeywordMatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.matcher = KeywordMatcher({"value": 1, "total value": 2, "count": 4, "units": 8})
+
+    def test_matches_every_class_case_insensitively(self):
+        """Test that all keywords found in the text are reported, regardless of case."""
+        self.assertEqual(self.matcher.match("Total VALUE of all Units"), 1 | 2 | 8)
+
+    def test_no_match_returns_zero(self):
+        """Test that text without any keyword yields an empty mask."""
+        self.assertEqual(self.matcher.match("Customer region"), 0)
+
+    def test_substring_semantics(self):
+        """Test that keywords match inside longer words, like the original substring checks."""
+        self.assertEqual(self.matcher.match("discounted price"), 4)
+        self.assertEqual(self.matcher.match("valued at"), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,17 @@
+import json
 import unittest
 from fastapi.testclient import TestClient
+import main
 from main import app # Assuming your FastAPI app instance is named 'app' in main.py
-from app.data_models import ColumnDefinition, SuggestionOutput # For response validation
+from unittest import mock
+from app.executor import ExecutorSaturatedError
+from app.data_models import ColumnDefinition, SuggestionOutput, CompactSuggestionOutput # For response validation
 
 class TestMainAPI(unittest.TestCase):
 
     def setUp(self):
         self.client = TestClient(app)
+        main.result_cache.clear()
 
     def test_root_health_check(self):
         """Test the root endpoint health check."""
@@ -48,6 +53,222 @@ class TestMainAPI(unittest.TestCase):
         self.assertIn("Sales by Region", chart_titles)
 
 
+    def test_generate_ideas_scatter_budget(self):
+        """Test that the scatter_budget query parameter caps Scatter Plot suggestions."""
+        columns_data = [
+            {"name": f"Metric{i}", "data_type": "numerical", "description": f"Metric number {i}"}
+            for i in range(6)
+        ]
+        response = self.client.post("/generate-ideas/?scatter_budget=3", json=columns_data)
+        self.assertEqual(response.status_code, 200)
+        scatter = [cs for cs in response.json()["chart_suggestions"] if cs["chart_type"] == "Scatter Plot"]
+        self.assertEqual(len(scatter), 3)
+
+        response = self.client.post("/generate-ideas/?scatter_budget=-1", json=columns_data)
+        self.assertEqual(response.status_code, 422)
+
+    def test_generate_ideas_reference_wireframes(self):
+        """Test the opt-in response shape with a shared wireframe template table."""
+        columns_data = [
+            {"name": "Sales", "data_type": "numerical", "description": "Total sales amount"},
+            {"name": "Region", "data_type": "categorical", "description": "Sales region"}
+        ]
+        inline = self.client.post("/generate-ideas/", json=columns_data).json()
+        response = self.client.post("/generate-ideas/?wireframe_format=reference", json=columns_data)
+        self.assertEqual(response.status_code, 200)
+        compact = response.json()
+        CompactSuggestionOutput(**compact)
+        self.assertNotIn("wireframes", inline)
+
+        # Every inline SVG can be rebuilt from the template table
+        for inline_chart, compact_chart in zip(inline["chart_suggestions"], compact["chart_suggestions"]):
+            reference = compact_chart["wireframe"]
+            rendered = compact["wireframes"][reference["template_id"]].replace("{title}", reference["title"])
+            self.assertEqual(rendered, inline_chart["wireframe"]["svg_data"])
+        self.assertIn("metric_card", compact["wireframes"])
+        self.assertLess(len(response.content), len(json.dumps(inline)))
+
+    def test_generate_ideas_category_and_tool_selection(self):
+        """Test the categories, formula_tools and include_wireframes query parameters."""
+        columns_data = [
+            {"name": "Sales", "data_type": "numerical", "description": "Total sales amount"},
+            {"name": "Region", "data_type": "categorical", "description": "Sales region"}
+        ]
+        response = self.client.post(
+            "/generate-ideas/?categories=chart&categories=metric_card&formula_tools=Pandas_Python&include_wireframes=false",
+            json=columns_data
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["feature_engineering_suggestions"], [])
+        self.assertTrue(all(cs["wireframe"] is None for cs in data["chart_suggestions"]))
+        tools = {f["tool"] for mc in data["metric_card_suggestions"] for f in mc["formulas"]}
+        self.assertEqual(tools, {"Pandas_Python"})
+
+        response = self.client.post("/generate-ideas/?formula_tools=Cobol", json=columns_data)
+        self.assertEqual(response.status_code, 422)
+
+    def test_generate_ideas_disabled_rules(self):
+        """Test that rules can be switched off per request and unknown rule ids are rejected."""
+        columns_data = [{"name": "Sales", "data_type": "numerical", "description": "Total sales amount"}]
+        response = self.client.post("/generate-ideas/?disabled_rules=numeric_distribution", json=columns_data)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Histogram", [c["chart_type"] for c in response.json()["chart_suggestions"]])
+
+        unknown = self.client.post("/generate-ideas/?disabled_rules=no_such_rule", json=columns_data)
+        self.assertEqual(unknown.status_code, 400)
+        self.assertIn("no_such_rule", unknown.json()["detail"])
+
+    def test_generate_ideas_busy_returns_503(self):
+        """Test that a saturated suggestion executor answers 503 with Retry-After."""
+        columns_data = [{"name": "Sales", "data_type": "numerical", "description": "Total sales amount"}]
+        with mock.patch.object(main.suggestion_executor, "run", side_effect=ExecutorSaturatedError("full")):
+            response = self.client.post("/generate-ideas/", json=columns_data)
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("retry-after", response.headers)
+
+    def test_generate_ideas_result_cache(self):
+        """Test that a repeated request is served from the result cache with an identical body."""
+        columns_data = [{"name": "Visits", "data_type": "numerical", "description": "Cache test visits"}]
+        before = self.client.get("/metrics").json()["result_cache"]
+        with mock.patch.object(main.suggestion_executor, "run", wraps=main.suggestion_executor.run) as run:
+            first = self.client.post("/generate-ideas/", json=columns_data)
+            second = self.client.post("/generate-ideas/", json=columns_data)
+        self.assertEqual(run.call_count, 1)
+        self.assertEqual(first.content, second.content)
+        after = self.client.get("/metrics").json()["result_cache"]
+        self.assertEqual(after["hits"] - before["hits"], 1)
+        self.assertEqual(after["misses"] - before["misses"], 1)
+
+    def test_generate_ideas_result_cache_ignores_option_order(self):
+        """Test that listing the same categories and formula tools in another order hits the same cache entry."""
+        columns_data = [{"name": "Orders", "data_type": "numerical", "description": "Option order test orders"}]
+        query = "categories=metric_card&categories=chart&formula_tools=SQL&formula_tools=Excel"
+        reordered = "formula_tools=Excel&categories=chart&formula_tools=SQL&categories=metric_card&categories=chart"
+        with mock.patch.object(main.suggestion_executor, "run", wraps=main.suggestion_executor.run) as run:
+            first = self.client.post(f"/generate-ideas/?{query}", json=columns_data)
+            second = self.client.post(f"/generate-ideas/?{reordered}", json=columns_data)
+            everything = self.client.post("/generate-ideas/?formula_tools=SQL&formula_tools=Pandas_Python&formula_tools=Excel", json=columns_data)
+            default = self.client.post("/generate-ideas/", json=columns_data)
+        self.assertEqual(run.call_count, 2)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first.headers["etag"], second.headers["etag"])
+        self.assertEqual(everything.headers["etag"], default.headers["etag"])
+
+    def test_generate_ideas_etag_conditional_request(self):
+        """Test that responses carry an ETag and a matching If-None-Match gets 304 (not 412) without generation."""
+        columns_data = [{"name": "Clicks", "data_type": "numerical", "description": "ETag test clicks"}]
+        first = self.client.post("/generate-ideas/", json=columns_data)
+        etag = first.headers["etag"]
+        self.assertTrue(etag.startswith('"') and etag.endswith('"'))
+
+        with mock.patch.object(main.suggestion_executor, "run") as run:
+            response = self.client.post("/generate-ideas/", json=columns_data, headers={"If-None-Match": f'"other", W/{etag}'})
+        run.assert_not_called()
+        self.assertEqual(response.status_code, 304) # Deliberate for this read-only POST, see main._etag_matches
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response.headers["etag"], etag)
+
+        # The same options listed in another order are the same representation
+        listed = self.client.post("/generate-ideas/?categories=chart&categories=metric_card", json=columns_data)
+        with mock.patch.object(main.suggestion_executor, "run") as run:
+            reordered = self.client.post(
+                "/generate-ideas/?categories=metric_card&categories=chart", json=columns_data,
+                headers={"If-None-Match": listed.headers["etag"]}
+            )
+        run.assert_not_called()
+        self.assertEqual(reordered.status_code, 304)
+
+        # Different options are a different representation
+        changed = self.client.post("/generate-ideas/?include_wireframes=false", json=columns_data, headers={"If-None-Match": etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers["etag"], etag)
+
+    def test_generate_ideas_stream(self):
+        """Test that /generate-ideas/stream returns one NDJSON line per suggestion."""
+        columns_data = [
+            {"name": "Sales", "data_type": "numerical", "description": "Total sales amount"},
+            {"name": "Region", "data_type": "categorical", "description": "Sales region"}
+        ]
+        full = self.client.post("/generate-ideas/", json=columns_data).json()
+        response = self.client.post("/generate-ideas/stream?include_wireframes=false", json=columns_data)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("application/x-ndjson"))
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual(
+            [line["suggestion"]["title"] for line in lines if line["type"] == "chart"],
+            [chart["title"] for chart in full["chart_suggestions"]]
+        )
+        self.assertEqual(len(lines), sum(len(full[key]) for key in
+                                         ("chart_suggestions", "feature_engineering_suggestions", "metric_card_suggestions")))
+
+        with mock.patch.object(main.suggestion_executor, "_reserve", side_effect=ExecutorSaturatedError("full")):
+            busy = self.client.post("/generate-ideas/stream", json=columns_data)
+        self.assertEqual(busy.status_code, 503)
+        self.assertIn("retry-after", busy.headers)
+
+    def test_generate_ideas_batch(self):
+        """Test that /generate-ideas/batch returns results by name and isolates a bad schema."""
+        sales = [{"name": "Sales", "data_type": "numerical", "description": "Total sales amount"}]
+        schemas = {"orders": sales, "broken": [{"name": "Sales", "data_type": "money", "description": "Sales"}]}
+        response = self.client.post("/generate-ideas/batch", json={"schemas": schemas})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual(list(results), ["orders", "broken"])
+        self.assertEqual(results["orders"]["status"], "ok")
+        self.assertEqual(results["orders"]["result"], self.client.post("/generate-ideas/", json=sales).json())
+        self.assertEqual(results["broken"]["status"], "error")
+
+        streamed = self.client.post("/generate-ideas/batch?stream=true", json={"schemas": schemas})
+        self.assertTrue(streamed.headers["content-type"].startswith("application/x-ndjson"))
+        lines = {line["name"]: line for line in map(json.loads, streamed.text.splitlines())}
+        self.assertEqual(lines["orders"]["status"], "ok")
+        self.assertEqual(lines["broken"]["status"], "error")
+
+        empty = self.client.post("/generate-ideas/batch", json={"schemas": {}})
+        self.assertEqual(empty.status_code, 400)
+
+    def test_generate_ideas_delta(self):
+        """Test that /generate-ideas/delta applies column changes to a schema sent earlier."""
+        columns_data = [
+            {"name": "Sales", "data_type": "numerical", "description": "Total sales amount"},
+            {"name": "Region", "data_type": "categorical", "description": "Sales region"}
+        ]
+        first = self.client.post("/generate-ideas/", json=columns_data)
+        schema_id = first.headers["x-schema-id"]
+
+        delta = {"schema_id": schema_id, "added": [{"name": "OrderDate", "data_type": "date", "description": "Order date"}]}
+        response = self.client.post("/generate-ideas/delta", json=delta)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["invalidated_columns"], ["OrderDate"])
+        titles = [c["title"] for c in data["suggestions"]["chart_suggestions"]]
+        self.assertIn("Trend of Sales over OrderDate", titles)
+        self.assertNotIn("Sales by Region", titles)
+
+        # The returned id matches a full request for the updated schema
+        full = self.client.post("/generate-ideas/", json=columns_data + delta["added"])
+        self.assertEqual(data["schema_id"], full.headers["x-schema-id"])
+
+        unknown = self.client.post("/generate-ideas/delta", json={"schema_id": "missing", "removed": ["Sales"]})
+        self.assertEqual(unknown.status_code, 404)
+        invalid = self.client.post("/generate-ideas/delta", json={"schema_id": schema_id, "removed": ["Nope"]})
+        self.assertEqual(invalid.status_code, 400)
+
+    def test_generate_ideas_rule_timings(self):
+        """Test that debug=timings attaches the per-rule breakdown and /metrics aggregates it."""
+        columns_data = [{"name": "Revenue", "data_type": "numerical", "description": "Timing test revenue"}]
+        before = self.client.get("/metrics").json()["rules"].get("numeric_distribution", {}).get("runs", 0)
+        response = self.client.post("/generate-ideas/?debug=timings", json=columns_data)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("etag", response.headers)
+        timings = {stat["rule_id"]: stat for stat in response.json()["debug"]["rule_timings"]}
+        self.assertEqual(timings["numeric_distribution"]["emitted"], 1)
+        self.assertNotIn("numeric_trend", timings) # No date column, so the rule never ran
+
+        after = self.client.get("/metrics").json()["rules"]["numeric_distribution"]["runs"]
+        self.assertEqual(after, before + 1)
+
     def test_generate_ideas_invalid_column_data_type(self):
         """Test /generate-ideas/ with an invalid data_type in one column."""
         columns_data = [
@@ -75,6 +296,45 @@ class TestMainAPI(unittest.TestCase):
         self.assertTrue(any(err["type"] == "missing" and "data_type" in err["loc"]
                             for err in response.json()["detail"]))
 
+    def test_upload_dataset_csv(self):
+        """Test that a CSV upload returns a column definition per header."""
+        data = b"Order ID,Sales,Order Date\n1,10.5,2024-01-01\n"
+        response = self.client.post("/upload-dataset/", files={"dataset": ("orders.csv", data, "text/csv")})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([column["name"] for column in response.json()], ["Order ID", "Sales", "Order Date"])
+
+    def test_upload_dataset_profile(self):
+        """Test that profile=true returns the inferred columns with a profile for each."""
+        data = b"Region,Sales\nnorth,10\nsouth,20\nnorth,\n"
+        response = self.client.post("/upload-dataset/?profile=true", files={"dataset": ("s.csv", data, "text/csv")})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual([column["name"] for column in body["columns"]], ["Region", "Sales"])
+        sales = body["profiles"][1]
+        self.assertEqual((sales["row_count"], sales["null_count"], sales["mean"]), (3, 1, 15.0))
+
+    def test_upload_dataset_profile_ignores_non_finite_numbers(self):
+        """Test that inf and overflowing literals are left out of the numeric statistics instead of failing the response."""
+        data = b"Sales\n10\ninf\n-Infinity\n1e309\n20\n"
+        response = self.client.post("/upload-dataset/?profile=true", files={"dataset": ("s.csv", data, "text/csv")})
+        self.assertEqual(response.status_code, 200)
+        sales = response.json()["profiles"][0]
+        self.assertEqual((sales["row_count"], sales["min"], sales["max"], sales["mean"]), (5, 10.0, 20.0, 15.0))
+        self.assertEqual(sales["variance"], 50.0)
+
+    def test_upload_dataset_parses_off_the_event_loop(self):
+        """Test that uploads are parsed in the upload pool and answer 503 when it is saturated."""
+        data = b"Sales\n10\n"
+        with mock.patch.object(main.upload_executor, "run", wraps=main.upload_executor.run) as run:
+            response = self.client.post("/upload-dataset/", files={"dataset": ("sales.csv", data, "text/csv")})
+        self.assertEqual(response.status_code, 200)
+        self.assertIs(run.call_args.args[0], main.dataset_parser.parse_file_to_column_definitions)
+
+        with mock.patch.object(main.upload_executor, "run", side_effect=ExecutorSaturatedError("full")):
+            busy = self.client.post("/upload-dataset/", files={"dataset": ("sales.csv", data, "text/csv")})
+        self.assertEqual(busy.status_code, 503)
+        self.assertIn("retry-after", busy.headers)
+
     def test_options_generate_ideas_cors_preflight(self):
         """Test the OPTIONS request for /generate-ideas/ (CORS preflight)."""
         headers = {
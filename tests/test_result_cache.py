@@ -0,0 +1,72 @@
+import unittest
+from app.result_cache import ResultCache, SchemaStore, schema_fingerprint
+from app.data_models import ColumnDefinition, SuggestionOptions
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestResultCache(unittest.TestCase):
+
+    def test_lru_eviction_bounded_in_bytes(self):
+        """Test that the least recently used entries are evicted once the byte budget is exceeded."""
+        cache = ResultCache(max_bytes=10, ttl_seconds=60)
+        cache.put("a", b"aaaa")
+        cache.put("b", b"bbbb")
+        self.assertEqual(cache.get("a"), b"aaaa") # 'a' is now the most recently used
+        cache.put("c", b"cccc")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), b"cccc")
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"]), (2, 1, 1))
+        self.assertEqual(stats["bytes"], 8)
+
+        cache.put("huge", b"x" * 11) # Larger than the cache, never stored
+        self.assertIsNone(cache.get("huge"))
+        self.assertEqual(cache.stats()["entries"], 2)
+
+    def test_ttl_expiry(self):
+        """Test that entries expire after their TTL."""
+        clock = FakeClock()
+        cache = ResultCache(max_bytes=100, ttl_seconds=5, clock=clock)
+        cache.put("k", b"value")
+        clock.now = 4.9
+        self.assertEqual(cache.get("k"), b"value")
+        clock.now = 5.0
+        self.assertIsNone(cache.get("k"))
+        self.assertEqual(cache.stats()["expirations"], 1)
+        self.assertEqual(cache.stats()["bytes"], 0)
+
+    def test_schema_fingerprint_is_canonical(self):
+        """Test that equivalent requests share a key while content, order and options changes do not."""
+        sales = {"name": "Sales", "data_type": "numerical", "description": "Total sales"}
+        region = {"name": "Region", "data_type": "categorical", "description": "Sales region"}
+        base = schema_fingerprint([ColumnDefinition(**sales), ColumnDefinition(**region)])
+        reordered_keys = schema_fingerprint([
+            ColumnDefinition(**dict(reversed(list(sales.items())))),
+            ColumnDefinition(**region, semantic_type=None)
+        ])
+        self.assertEqual(base, reordered_keys)
+        self.assertNotEqual(base, schema_fingerprint([ColumnDefinition(**region), ColumnDefinition(**sales)]))
+        self.assertNotEqual(base, schema_fingerprint([ColumnDefinition(**sales), ColumnDefinition(**region)],
+                                                     SuggestionOptions(include_wireframes=False)))
+
+    def test_schema_store_keeps_most_recent_schemas(self):
+        """Test that the schema store evicts the least recently used schema beyond its size."""
+        store = SchemaStore(max_entries=2)
+        options = SuggestionOptions()
+        columns = [ColumnDefinition(name="Sales", data_type="numerical", description="Total sales")]
+        store.put("a", columns, options)
+        store.put("b", columns, options)
+        self.assertEqual(store.get("a"), (columns, options)) # "a" is now the most recent
+        store.put("c", columns, options)
+        self.assertIsNone(store.get("b"))
+        self.assertIsNotNone(store.get("a"))
+        self.assertEqual(len(store), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
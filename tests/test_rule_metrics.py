@@ -0,0 +1,24 @@
+import unittest
+from app.rule_metrics import RuleMetrics
+
+class TestRuleMetrics(unittest.TestCase):
+
+    def test_aggregates_per_rule_and_orders_slowest_first(self):
+        """Test that runs, time, candidates and emitted counts add up per rule."""
+        metrics = RuleMetrics()
+        metrics.record([
+            {"rule_id": "numeric_scatter", "category": "chart", "ms": 4.0, "candidates": 10, "emitted": 10},
+            {"rule_id": "total_records", "category": "metric_card", "ms": 0.5, "candidates": 1, "emitted": 1},
+        ])
+        metrics.record([{"rule_id": "numeric_scatter", "category": "chart", "ms": 2.0, "candidates": 10, "emitted": 8}])
+        snapshot = metrics.snapshot()
+        self.assertEqual(list(snapshot), ["numeric_scatter", "total_records"])
+        self.assertEqual(snapshot["numeric_scatter"], {
+            "category": "chart", "runs": 2, "total_ms": 6.0, "max_ms": 4.0, "candidates": 20, "emitted": 18
+        })
+        metrics.clear()
+        self.assertEqual(metrics.snapshot(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,11 @@
+import json
 import unittest
-from app.suggestion_engine import generate_suggestions, _get_formulas
-from app.data_models import ColumnDefinition, ChartSuggestion, FeatureEngineeringSuggestion, MetricCardSuggestion, FormulaSuggestion, ChartWireframe
+from unittest import mock
+from app.suggestion_engine import (
+    generate_suggestions, generate_suggestions_json, generate_suggestions_json_with_stats, _cached_formulas, _rules_for, _SchemaView, RULE_IDS, generate_suggestions_for_delta, iter_suggestions_ndjson, merge_suggestions, apply_column_delta, _get_formulas, _classify_columns, _get_generic_svg_wireframe,
+    _KW_RATIO_NUMERATOR, _KW_RATIO_DENOMINATOR, _KW_PRE_SUMMED_NAME
+)
+from app.data_models import SuggestionOptions, SuggestionOutput, CompactSuggestionOutput, ColumnDefinition, ChartSuggestion, FeatureEngineeringSuggestion, MetricCardSuggestion, FormulaSuggestion, ChartWireframe
 
 class TestSuggestionEngine(unittest.TestCase):
 
@@ -131,6 +136,91 @@ class TestSuggestionEngine(unittest.TestCase):
         self.assertTrue(sql_group_by_sum_found, "SQL GROUP BY SUM formula not found for ID aggregation.")
 
 
+    def test_classify_columns_precomputes_keyword_flags(self):
+        """Test that the pre-pass records keyword classes and ID flags once per column."""
+        columns = [
+            ColumnDefinition(name="TotalRevenue", data_type="numerical", description="Revenue of the ORDER"),
+            ColumnDefinition(name="Units", data_type="numerical", description="Number of units sold"),
+            ColumnDefinition(name="CustomerID", data_type="categorical", description="Customer key")
+        ]
+        revenue, units, customer = _classify_columns(columns)
+        self.assertTrue(revenue.keywords & _KW_RATIO_NUMERATOR)
+        self.assertTrue(revenue.keywords & _KW_PRE_SUMMED_NAME)
+        self.assertFalse(revenue.keywords & _KW_RATIO_DENOMINATOR)
+        self.assertTrue(units.keywords & _KW_RATIO_DENOMINATOR)
+        self.assertEqual([f.is_id for f in (revenue, units, customer)], [False, False, True])
+
+    def test_ratio_and_product_pairs_follow_schema_order(self):
+        """Test bucketed ratio/product rules only pair keyword-matching columns in schema order."""
+        columns = [
+            ColumnDefinition(name="Price", data_type="numerical", description="Unit price of the item"),
+            ColumnDefinition(name="Rating", data_type="numerical", description="Customer rating"),
+            ColumnDefinition(name="Quantity", data_type="numerical", description="Quantity ordered"),
+            ColumnDefinition(name="Revenue", data_type="numerical", description="Revenue value")
+        ]
+        suggestions = generate_suggestions(columns)
+        fe_names = [fe.new_feature_name for fe in suggestions['feature_engineering_suggestions']]
+        self.assertIn("Price_Per_Quantity", fe_names)
+        self.assertIn("Total_Price_x_Quantity", fe_names)
+        # Revenue comes after Quantity, so no Revenue/Quantity pair is oriented that way
+        self.assertNotIn("Revenue_Per_Quantity", fe_names)
+        self.assertFalse(any("Rating" in name for name in fe_names))
+
+    def test_scatter_pair_budget_keeps_most_relevant_pairs(self):
+        """Test that a scatter budget caps Scatter Plots and ranks pairs by shared description words."""
+        columns = [
+            ColumnDefinition(name="Height", data_type="numerical", description="Patient height in centimeters"),
+            ColumnDefinition(name="Weight", data_type="numerical", description="Patient weight in kilograms"),
+            ColumnDefinition(name="Visits", data_type="numerical", description="Clinic visits"),
+            ColumnDefinition(name="Income", data_type="numerical", description="Household income", semantic_type="currency"),
+            ColumnDefinition(name="Spend", data_type="numerical", description="Monthly spend", semantic_type="currency")
+        ]
+        unbounded = generate_suggestions(columns)
+        self.assertEqual(sum(cs.chart_type == "Scatter Plot" for cs in unbounded['chart_suggestions']), 10)
+
+        budgeted = generate_suggestions(columns, SuggestionOptions(scatter_pair_budget=2))
+        scatter_titles = [cs.title for cs in budgeted['chart_suggestions'] if cs.chart_type == "Scatter Plot"]
+        self.assertEqual(scatter_titles, ["Relationship between Income and Spend", "Relationship between Height and Weight"])
+
+        none_allowed = generate_suggestions(columns, SuggestionOptions(scatter_pair_budget=0))
+        self.assertFalse(any(cs.chart_type == "Scatter Plot" for cs in none_allowed['chart_suggestions']))
+
+    def test_svg_wireframe_templates(self):
+        """Test that wireframes render the title into the requested template and fall back to a bar chart."""
+        svg = _get_generic_svg_wireframe("Histogram", "Distribution of Age")
+        self.assertIn(">Distribution of Age</text>", svg)
+        self.assertIn(">Bins</text>", svg)
+        self.assertNotIn("{title}", svg)
+        self.assertEqual(_get_generic_svg_wireframe("Unknown Chart", "T"), _get_generic_svg_wireframe("Bar Chart", "T"))
+
+    def test_options_select_categories_tools_and_wireframes(self):
+        """Test that unrequested categories, formula tools and wireframes are not built."""
+        columns = [
+            ColumnDefinition(name="Sales", data_type="numerical", description="Total sales amount"),
+            ColumnDefinition(name="Region", data_type="categorical", description="Sales region")
+        ]
+        options = SuggestionOptions(categories=["metric_card"], formula_tools=["SQL"], include_wireframes=False)
+        suggestions = generate_suggestions(columns, options)
+        self.assertEqual(suggestions['chart_suggestions'], [])
+        self.assertEqual(suggestions['feature_engineering_suggestions'], [])
+        self.assertTrue(suggestions['metric_card_suggestions'])
+        for mc in suggestions['metric_card_suggestions']:
+            self.assertIsNone(mc.wireframe)
+            self.assertTrue(mc.formulas)
+            self.assertTrue(all(f.tool == "SQL" for f in mc.formulas))
+
+        charts_only = generate_suggestions(columns, SuggestionOptions(categories=["chart"], formula_tools=[]))
+        self.assertTrue(charts_only['chart_suggestions'])
+        self.assertEqual(charts_only['metric_card_suggestions'], [])
+
+    def test_categorical_id_column_yields_single_unique_count(self):
+        """Test that a column that is both categorical and an ID gets one unique-count metric, not two."""
+        columns = [
+            ColumnDefinition(name="CustomerID", data_type="categorical", description="Unique identifier for customer")
+        ]
+        metric_titles = [mc.title for mc in generate_suggestions(columns)['metric_card_suggestions']]
+        self.assertEqual(metric_titles.count("Total Unique CustomerID"), 1)
+
     def test_get_formulas_excel_sum(self):
         """Test _get_formulas for Excel SUM."""
         formulas = _get_formulas("SUM", ["Sales"])
@@ -150,6 +240,148 @@ class TestSuggestionEngine(unittest.TestCase):
         pandas_formula = next(f for f in formulas if f.tool == "Pandas_Python")
         self.assertIn("df['OrderDate'] = pd.to_datetime(df['OrderDate'])\ndf['OrderDate_Year'] = df['OrderDate'].dt.year", pandas_formula.formula_string)
 
+    def test_get_formulas_is_memoized_and_immutable(self):
+        """Test that repeated formula requests share frozen FormulaSuggestion objects."""
+        first = _get_formulas("DIVIDE", ["Revenue", "Units"])
+        second = _get_formulas("DIVIDE", ["Revenue", "Units"])
+        self.assertIsNot(first, second)
+        self.assertTrue(all(a is b for a, b in zip(first, second)))
+        with self.assertRaises(Exception):
+            first[0].formula_string = "=A2*B2"
+        self.assertEqual(_get_formulas("NOT_AN_OPERATION", ["A"]), [])
+
+    def test_json_fast_path_matches_validated_output(self):
+        """Test that the unvalidated serialization path produces the same bytes as a validated model dump."""
+        columns = [
+            ColumnDefinition(name="Revenue", data_type="numerical", description="Total sales amount", semantic_type="currency"),
+            ColumnDefinition(name="OrderDate", data_type="date", description="Date of order"),
+            ColumnDefinition(name="Active", data_type="boolean", description="Is active"),
+        ]
+        for options in (SuggestionOptions(), SuggestionOptions(wireframe_format="reference")):
+            with self.subTest(wireframe_format=options.wireframe_format):
+                output_model = CompactSuggestionOutput if options.wireframe_format == "reference" else SuggestionOutput
+                validated = output_model(**generate_suggestions(columns, options)).model_dump_json().encode("utf-8")
+                self.assertEqual(generate_suggestions_json(columns, options), validated)
+
+    def test_json_path_builds_no_models(self):
+        """Test that JSON responses are encoded from the internal records without creating suggestion models."""
+        columns = [
+            ColumnDefinition(name="Revenue", data_type="numerical", description="Total sales amount"),
+            ColumnDefinition(name="Region", data_type="categorical", description="Sales region"),
+        ]
+        expected = generate_suggestions_json(columns)
+        model_names = ("ChartSuggestion", "FeatureEngineeringSuggestion", "MetricCardSuggestion", "FormulaSuggestion")
+        patches = [mock.patch(f"app.suggestion_engine.{name}", side_effect=AssertionError(name)) for name in model_names]
+        for patch in patches:
+            patch.start()
+        _cached_formulas.cache_clear()
+        try:
+            self.assertEqual(generate_suggestions_json(columns), expected)
+        finally:
+            for patch in patches:
+                patch.stop()
+
+    def test_rule_registry_dispatches_on_column_signature(self):
+        """Test that only rules whose column-type signature the schema satisfies are run."""
+        schema = _SchemaView([ColumnDefinition(name="Sales", data_type="numerical", description="Total sales")], None, True)
+        all_categories = frozenset(["chart", "feature_engineering", "metric_card"])
+        rule_ids = [rule.rule_id for rule in _rules_for(schema.available, all_categories, frozenset())]
+        self.assertIn("numeric_distribution", rule_ids)
+        self.assertIn("total_records", rule_ids)
+        self.assertNotIn("numeric_trend", rule_ids) # Needs a date column
+        self.assertNotIn("unique_counts", rule_ids) # Needs a categorical or ID column
+        self.assertEqual(len(set(RULE_IDS)), len(RULE_IDS))
+
+    def test_disabled_rules_are_skipped(self):
+        """Test that rules listed in disabled_rules produce no suggestions."""
+        columns = [
+            ColumnDefinition(name="Sales", data_type="numerical", description="Total sales"),
+            ColumnDefinition(name="Region", data_type="categorical", description="Sales region"),
+        ]
+        options = SuggestionOptions(disabled_rules=["numeric_by_category", "total_records"])
+        result = generate_suggestions(columns, options)
+        chart_types = {c.chart_type for c in result["chart_suggestions"]}
+        self.assertNotIn("Bar Chart (Aggregated)", chart_types)
+        self.assertIn("Histogram", chart_types)
+        self.assertNotIn("Total Records", [m.title for m in result["metric_card_suggestions"]])
+
+    def test_rule_stats_count_candidates_and_emitted(self):
+        """Test that every rule run reports its time, candidates and emitted suggestions."""
+        columns = [
+            ColumnDefinition(name="OrderID", data_type="categorical", description="Order identifier"),
+            ColumnDefinition(name="Revenue", data_type="numerical", description="Total sales amount"),
+        ]
+        body, rule_stats = generate_suggestions_json_with_stats(columns, attach_timings=True)
+        by_rule = {stat["rule_id"]: stat for stat in rule_stats}
+        # The categorical ID column is proposed twice for unique counts but emitted once
+        self.assertEqual(by_rule["unique_counts"]["candidates"], 2)
+        self.assertEqual(by_rule["unique_counts"]["emitted"], 1)
+        self.assertTrue(all(stat["ms"] >= 0 for stat in rule_stats))
+
+        data = json.loads(body)
+        self.assertEqual(data["debug"]["rule_timings"], rule_stats)
+        emitted = sum(len(data[key]) for key in ("chart_suggestions", "feature_engineering_suggestions", "metric_card_suggestions"))
+        self.assertEqual(emitted, sum(stat["emitted"] for stat in rule_stats))
+        self.assertEqual(json.loads(generate_suggestions_json(columns)), {k: v for k, v in data.items() if k != "debug"})
+
+    def test_delta_merge_matches_full_regeneration(self):
+        """Test that merging a column delta into previous suggestions gives the full regeneration's set."""
+        def keys(result):
+            return {name: sorted(s.model_dump_json() for s in result[name])
+                    for name in ("chart_suggestions", "feature_engineering_suggestions", "metric_card_suggestions")}
+
+        columns = [
+            ColumnDefinition(name="OrderID", data_type="categorical", description="Order identifier"),
+            ColumnDefinition(name="Revenue", data_type="numerical", description="Total sales amount", semantic_type="currency"),
+            ColumnDefinition(name="Units", data_type="numerical", description="Quantity sold"),
+            ColumnDefinition(name="Region", data_type="categorical", description="Sales region"),
+            ColumnDefinition(name="OrderDate", data_type="date", description="Date of order"),
+        ]
+        added = [ColumnDefinition(name="Price", data_type="numerical", description="Unit price")]
+        modified = [ColumnDefinition(name="Region", data_type="text", description="Free-form region notes")]
+        for removed in ([], ["OrderID"], ["Units"]):
+            with self.subTest(removed=removed):
+                previous = generate_suggestions(columns)
+                new_columns, invalidated, new = generate_suggestions_for_delta(columns, added, removed, modified)
+                self.assertEqual([c.name for c in new_columns], [c.name for c in columns if c.name not in removed] + ["Price"])
+                self.assertEqual(keys(merge_suggestions(previous, invalidated, new)), keys(generate_suggestions(new_columns)))
+                # Only suggestions touching a changed column are regenerated
+                for suggestion in new["chart_suggestions"]:
+                    self.assertTrue(set(suggestion.columns_used) & set(invalidated))
+
+    def test_ndjson_stream_matches_generate_suggestions(self):
+        """Test that the NDJSON stream yields the same suggestions, with each template before its first use."""
+        columns = [
+            ColumnDefinition(name="Revenue", data_type="numerical", description="Total sales amount"),
+            ColumnDefinition(name="Region", data_type="categorical", description="Sales region"),
+            ColumnDefinition(name="Active", data_type="boolean", description="Is active"),
+        ]
+        options = SuggestionOptions(wireframe_format="reference")
+        expected = generate_suggestions(columns, options)
+        lines = [json.loads(line) for line in iter_suggestions_ndjson(columns, options)]
+
+        templates = {}
+        streamed = {"chart": [], "feature_engineering": [], "metric_card": []}
+        for line in lines:
+            if line["type"] == "wireframe_template":
+                templates[line["template_id"]] = line["svg"]
+                continue
+            wireframe = line["suggestion"].get("wireframe")
+            if wireframe:
+                self.assertIn(wireframe["template_id"], templates)
+            streamed[line["type"]].append(line["suggestion"])
+        self.assertEqual(templates, expected["wireframes"])
+        for category, suggestions in streamed.items():
+            self.assertEqual(suggestions, [s.model_dump(mode="json") for s in expected[f"{category}_suggestions"]])
+
+    def test_apply_column_delta_rejects_unknown_and_duplicate_names(self):
+        """Test that deltas naming missing columns or re-adding existing ones are rejected."""
+        columns = [ColumnDefinition(name="Sales", data_type="numerical", description="Total sales")]
+        with self.assertRaises(ValueError):
+            apply_column_delta(columns, [], ["Missing"], [])
+        with self.assertRaises(ValueError):
+            apply_column_delta(columns, [ColumnDefinition(name="Sales", data_type="numerical", description="Again")], [], [])
+
     # Placeholder for testing the GROUP_BY_AVERAGE fix when implemented
     # def test_fe_grouped_average(self):
     #     columns = [